@@ -2,71 +2,23 @@ import sys
 import os
 import asyncio
 import time
-import re
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from common.utils import get_agent_card, send_task_to_agent, extract_agent_reply, log_message
+from common.tasks import pending_among
+from common.batching import BatchTuner
+from common.worker_pool import card_skills, wait_for_batch
+from common.run_journal import RunJournal, COMPLETED, FAILED
+from common.push import receiver_for
+from common.logs import bind_log_context
 
-from pydantic_ai.mcp import MCPServerStdio
-from pydantic_ai import Agent
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Check for OpenAI API key
-if not os.getenv("OPENAI_API_KEY"):
-    print("Error: OPENAI_API_KEY environment variable is not set.")
-    print("Please make sure you have a valid API key in your .env file.")
-    sys.exit(1)
-
-# URLs for our agent servers
-BACKEND_URL = "http://localhost:5003"
-
-# Desktop Commander MCP server for file operations
-desktop_commander = MCPServerStdio(
-    'npx', ['-y', '@wonderwhy-er/desktop-commander'],
-    env={}
-)
-
-# Local agent for analyzing tasks
-client_agent = Agent(
-    model="openai:gpt-4o-mini",
-    system_prompt="""You analyze tasks.md files to identify backend tasks that need to be completed.
-    You help coordinate the work of a backend development agent by identifying which tasks to work on next.
-    """,
-    mcp_servers=[desktop_commander]
-)
-
-def get_backend_tasks(project_path):
-    """Read tasks.md and identify uncompleted backend tasks."""
-    try:
-        tasks_file = os.path.join(project_path, 'tasks.md')
-        with open(tasks_file, 'r') as f:
-            content = f.read()
-
-        # Look for sections that might contain backend tasks
-        backend_section_pattern = r'#{1,3}\s+(?:Backend|Back[- ]?end|Server|API).*?\n(.*?)(?=#{1,3}|\Z)'
-        backend_sections = re.findall(backend_section_pattern, content, re.DOTALL | re.IGNORECASE)
-
-        if not backend_sections:
-            return "No backend section found in tasks.md"
-
-        # Find incomplete tasks in those sections
-        incomplete_tasks = []
-        for section in backend_sections:
-            task_pattern = r'- \[ \](.*?)(?=\n- |\n\n|\Z)'
-            tasks = re.findall(task_pattern, section, re.DOTALL)
-            incomplete_tasks.extend(tasks)
-
-        if not incomplete_tasks:
-            return "All backend tasks are completed!"
-
-        # Format the tasks
-        task_list = "\n".join(f"- {task.strip()}" for task in incomplete_tasks)
-        return f"Uncompleted backend tasks:\n\n{task_list}"
-    except Exception as e:
-        return f"Error reading tasks.md: {e}"
+# URLs for our agent servers (with agents/host.py --mode prefix: http://localhost:5000/<role>)
+BACKEND_URL = os.getenv("BACKEND_AGENT_URL", "http://localhost:5003")
 
 async def main():
     # Get project path from command line arguments or use current directory
@@ -78,6 +30,8 @@ async def main():
             return
 
     log_message(f"Using project path: {project_path}", "Backend Client")
+    # Everything this client logs carries the project
+    bind_log_context(project=project_path)
 
     # 1. Discover the backend agent
     log_message("Connecting to Backend Agent...", "Backend Client")
@@ -87,6 +41,10 @@ async def main():
         return
 
     log_message(f"Connected to {backend_card['name']} - {backend_card.get('description', '')}", "Backend Client")
+    # With PUSH_RECEIVER_PORT set, results are pushed back instead of holding the request open
+    receiver = receiver_for(backend_card)
+    # Backend tasks first, then tasks of the card's other skills when there are none left
+    skills = card_skills(backend_card, "backend")
 
     # Check if plan.md and tasks.md exist
     plan_file = os.path.join(project_path, 'plan.md')
@@ -96,45 +54,56 @@ async def main():
         log_message(f"Error: plan.md or tasks.md not found in {project_path}. Run the Planner Agent first.", "Backend Client")
         return
 
+    journal = RunJournal(project_path)
+    # Sizes the batches of tasks sent at once from how the previous ones went
+    tuner = BatchTuner(project_path, "backend")
+
     # Continuous loop to process backend tasks
     while True:
-        # Use the client agent to analyze the tasks file
-        async with client_agent.run_mcp_servers():
-            result = await client_agent.run(f"Read the {tasks_file} file and identify uncompleted backend tasks.")
-            next_task_analysis = result.data
-
-        # Check if there are any backend tasks to complete
-        backend_tasks = get_backend_tasks(project_path)
-        if "All backend tasks are completed" in backend_tasks:
-            log_message("All backend tasks are completed! 🎉", "Backend Client")
-            break
+        # Resume a task that was dispatched before a restart. It keeps its id, so a
+        # server that already finished it answers from its journal without rerunning it.
+        unfinished = journal.unfinished("backend")
+        if unfinished:
+            log_message(f"Resuming task {unfinished['task_id']} ({len(unfinished['items'])} items)", "Backend Client")
+            task_id = unfinished["task_id"]
+            task_prompt = unfinished["prompt"]
+            backend_response = send_task_to_agent(BACKEND_URL, task_prompt, task_id, project=project_path, receiver=receiver)
+            backend_reply = extract_agent_reply(backend_response)
+            journal.record_result(task_id, COMPLETED if backend_reply else FAILED, backend_reply)
+            if not backend_reply:
+                log_message("Failed to get response from Backend Agent.", "Backend Client")
+                break
+            print("\n" + backend_reply + "\n")
+            continue
 
         # Generate instructions for backend agent
-        task_prompt = f"""Please implement the next set of backend tasks from {tasks_file}.
+        def make_prompt(batch, skill):
+            backend_tasks = "\n".join(f"- {task['text']}" for task in batch)
+            return f"""Please implement these {skill} tasks from {tasks_file}.
 
 PROJECT_PATH: {project_path}
 
-Here are the pending backend tasks:
+Here are the pending {skill} tasks:
 {backend_tasks}
-
-IMPORTANT: For any npm or Node.js related commands (npm init, npm install, etc.), make sure to:
-- ALWAYS change to the project directory first: cd {project_path}
-- Run all npm commands within the project directory
-- Initialize any new Node.js projects with: cd {project_path} && npm init
-- Install dependencies with: cd {project_path} && npm install [package]
-- NEVER run npm commands in the current directory without changing to {project_path} first
-
-Please work on these tasks one by one. For each task:
-1. Create or modify the necessary files in the project path: {project_path}
-2. Implement the functionality described
-3. Mark the task as completed in {tasks_file} (change "[ ]" to "[x]")
-
-After completing each task, provide a summary of what you've done.
 """
 
-        log_message("Sending backend tasks to agent...", "Backend Client")
-        backend_response = send_task_to_agent(BACKEND_URL, task_prompt)
+        # Claim the next small related pending tasks, up to the tuned batch size. The
+        # dispatch is recorded before sending it so a crash can't lose track of it.
+        claim = wait_for_batch(project_path, "backend", skills, tuner.current_limit(), make_prompt, "Backend Client")
+        if claim is None:
+            log_message("All backend tasks are completed! 🎉", "Backend Client")
+            break
+        task_id, batch, task_prompt = claim
+        items = [task["text"] for task in batch]
+
+        log_message(f"Sending {len(items)} backend task(s) to agent...", "Backend Client")
+        started = time.time()
+        backend_response = send_task_to_agent(BACKEND_URL, task_prompt, task_id, project=project_path, receiver=receiver)
         backend_reply = extract_agent_reply(backend_response)
+        journal.record_result(task_id, COMPLETED if backend_reply else FAILED, backend_reply)
+        if backend_reply:
+            tuner.record(sum(task["weight"] for task in batch), time.time() - started,
+                         len(items) - len(pending_among(project_path, items)), len(items))
 
         if not backend_reply:
             log_message("Failed to get response from Backend Agent.", "Backend Client")
@@ -143,8 +112,5 @@ After completing each task, provide a summary of what you've done.
         log_message("Backend Agent has completed some tasks!", "Backend Client")
         print("\n" + backend_reply + "\n")
 
-        log_message("Waiting before checking for more tasks...", "Backend Client")
-        time.sleep(3)  # Short pause before next iteration
-
 if __name__ == "__main__":
     asyncio.run(main())
@@ -2,71 +2,23 @@ import sys
 import os
 import asyncio
 import time
-import re
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from common.utils import get_agent_card, send_task_to_agent, extract_agent_reply, log_message
+from common.tasks import pending_among
+from common.batching import BatchTuner
+from common.worker_pool import card_skills, wait_for_batch
+from common.run_journal import RunJournal, COMPLETED, FAILED
+from common.push import receiver_for
+from common.logs import bind_log_context
 
-from pydantic_ai.mcp import MCPServerStdio
-from pydantic_ai import Agent
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Check for OpenAI API key
-if not os.getenv("OPENAI_API_KEY"):
-    print("Error: OPENAI_API_KEY environment variable is not set.")
-    print("Please make sure you have a valid API key in your .env file.")
-    sys.exit(1)
-
-# URLs for our agent servers
-FRONTEND_URL = "http://localhost:5002"
-
-# Desktop Commander MCP server for file operations
-desktop_commander = MCPServerStdio(
-    'npx', ['-y', '@wonderwhy-er/desktop-commander'],
-    env={}
-)
-
-# Local agent for analyzing tasks
-client_agent = Agent(
-    model="openai:gpt-4o-mini",
-    system_prompt="""You analyze tasks.md files to identify frontend tasks that need to be completed.
-    You help coordinate the work of a frontend development agent by identifying which tasks to work on next.
-    """,
-    mcp_servers=[desktop_commander]
-)
-
-def get_frontend_tasks(project_path):
-    """Read tasks.md and identify uncompleted frontend tasks."""
-    try:
-        tasks_file = os.path.join(project_path, 'tasks.md')
-        with open(tasks_file, 'r') as f:
-            content = f.read()
-
-        # Look for sections that might contain frontend tasks
-        frontend_section_pattern = r'#{1,3}\s+(?:Frontend|Front[- ]?end|UI|User Interface).*?\n(.*?)(?=#{1,3}|\Z)'
-        frontend_sections = re.findall(frontend_section_pattern, content, re.DOTALL | re.IGNORECASE)
-
-        if not frontend_sections:
-            return "No frontend section found in tasks.md"
-
-        # Find incomplete tasks in those sections
-        incomplete_tasks = []
-        for section in frontend_sections:
-            task_pattern = r'- \[ \](.*?)(?=\n- |\n\n|\Z)'
-            tasks = re.findall(task_pattern, section, re.DOTALL)
-            incomplete_tasks.extend(tasks)
-
-        if not incomplete_tasks:
-            return "All frontend tasks are completed!"
-
-        # Format the tasks
-        task_list = "\n".join(f"- {task.strip()}" for task in incomplete_tasks)
-        return f"Uncompleted frontend tasks:\n\n{task_list}"
-    except Exception as e:
-        return f"Error reading tasks.md: {e}"
+# URLs for our agent servers (with agents/host.py --mode prefix: http://localhost:5000/<role>)
+FRONTEND_URL = os.getenv("FRONTEND_AGENT_URL", "http://localhost:5002")
 
 async def main():
     # Get project path from command line arguments or use current directory
@@ -78,6 +30,8 @@ async def main():
             return
 
     log_message(f"Using project path: {project_path}", "Frontend Client")
+    # Everything this client logs carries the project
+    bind_log_context(project=project_path)
 
     # 1. Discover the frontend agent
     log_message("Connecting to Frontend Agent...", "Frontend Client")
@@ -87,6 +41,10 @@ async def main():
         return
 
     log_message(f"Connected to {frontend_card['name']} - {frontend_card.get('description', '')}", "Frontend Client")
+    # With PUSH_RECEIVER_PORT set, results are pushed back instead of holding the request open
+    receiver = receiver_for(frontend_card)
+    # Frontend tasks first, then tasks of the card's other skills when there are none left
+    skills = card_skills(frontend_card, "frontend")
 
     # Check if plan.md and tasks.md exist
     plan_file = os.path.join(project_path, 'plan.md')
@@ -96,45 +54,56 @@ async def main():
         log_message(f"Error: plan.md or tasks.md not found in {project_path}. Run the Planner Agent first.", "Frontend Client")
         return
 
+    journal = RunJournal(project_path)
+    # Sizes the batches of tasks sent at once from how the previous ones went
+    tuner = BatchTuner(project_path, "frontend")
+
     # Continuous loop to process frontend tasks
     while True:
-        # Use the client agent to analyze the tasks file
-        async with client_agent.run_mcp_servers():
-            result = await client_agent.run(f"Read the {tasks_file} file and identify uncompleted frontend tasks.")
-            next_task_analysis = result.data
-
-        # Check if there are any frontend tasks to complete
-        frontend_tasks = get_frontend_tasks(project_path)
-        if "All frontend tasks are completed" in frontend_tasks:
-            log_message("All frontend tasks are completed! 🎉", "Frontend Client")
-            break
+        # Resume a task that was dispatched before a restart. It keeps its id, so a
+        # server that already finished it answers from its journal without rerunning it.
+        unfinished = journal.unfinished("frontend")
+        if unfinished:
+            log_message(f"Resuming task {unfinished['task_id']} ({len(unfinished['items'])} items)", "Frontend Client")
+            task_id = unfinished["task_id"]
+            task_prompt = unfinished["prompt"]
+            frontend_response = send_task_to_agent(FRONTEND_URL, task_prompt, task_id, project=project_path, receiver=receiver)
+            frontend_reply = extract_agent_reply(frontend_response)
+            journal.record_result(task_id, COMPLETED if frontend_reply else FAILED, frontend_reply)
+            if not frontend_reply:
+                log_message("Failed to get response from Frontend Agent.", "Frontend Client")
+                break
+            print("\n" + frontend_reply + "\n")
+            continue
 
         # Generate instructions for frontend agent
-        task_prompt = f"""Please implement the next set of frontend tasks from {tasks_file}.
+        def make_prompt(batch, skill):
+            frontend_tasks = "\n".join(f"- {task['text']}" for task in batch)
+            return f"""Please implement these {skill} tasks from {tasks_file}.
 
 PROJECT_PATH: {project_path}
 
-Here are the pending frontend tasks:
+Here are the pending {skill} tasks:
 {frontend_tasks}
-
-IMPORTANT: For any npm or Node.js related commands (npm init, npm install, etc.), make sure to:
-- ALWAYS change to the project directory first: cd {project_path}
-- Run all npm commands within the project directory
-- Initialize any new Node.js projects with: cd {project_path} && npm init
-- Install dependencies with: cd {project_path} && npm install [package]
-- NEVER run npm commands in the current directory without changing to {project_path} first
-
-Please work on these tasks one by one. For each task:
-1. Create or modify the necessary files in the project path: {project_path}
-2. Implement the functionality described
-3. Mark the task as completed in {tasks_file} (change "[ ]" to "[x]")
-
-After completing each task, provide a summary of what you've done.
 """
 
-        log_message("Sending frontend tasks to agent...", "Frontend Client")
-        frontend_response = send_task_to_agent(FRONTEND_URL, task_prompt)
+        # Claim the next small related pending tasks, up to the tuned batch size. The
+        # dispatch is recorded before sending it so a crash can't lose track of it.
+        claim = wait_for_batch(project_path, "frontend", skills, tuner.current_limit(), make_prompt, "Frontend Client")
+        if claim is None:
+            log_message("All frontend tasks are completed! 🎉", "Frontend Client")
+            break
+        task_id, batch, task_prompt = claim
+        items = [task["text"] for task in batch]
+
+        log_message(f"Sending {len(items)} frontend task(s) to agent...", "Frontend Client")
+        started = time.time()
+        frontend_response = send_task_to_agent(FRONTEND_URL, task_prompt, task_id, project=project_path, receiver=receiver)
         frontend_reply = extract_agent_reply(frontend_response)
+        journal.record_result(task_id, COMPLETED if frontend_reply else FAILED, frontend_reply)
+        if frontend_reply:
+            tuner.record(sum(task["weight"] for task in batch), time.time() - started,
+                         len(items) - len(pending_among(project_path, items)), len(items))
 
         if not frontend_reply:
             log_message("Failed to get response from Frontend Agent.", "Frontend Client")
@@ -143,8 +112,5 @@ After completing each task, provide a summary of what you've done.
         log_message("Frontend Agent has completed some tasks!", "Frontend Client")
         print("\n" + frontend_reply + "\n")
 
-        log_message("Waiting before checking for more tasks...", "Frontend Client")
-        time.sleep(3)  # Short pause before next iteration
-
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,42 @@
+from dotenv import load_dotenv
+import argparse
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Check for OpenAI API key
+if not os.getenv("OPENAI_API_KEY"):
+    print("Error: OPENAI_API_KEY environment variable is not set.")
+    print("Please make sure you have a valid API key in your .env file.")
+    sys.exit(1)
+
+from common.host import serve, DEFAULT_HOST_PORT
+from common.roles import ROLES
+from common.profiling import PROFILE_MODES
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve several agent roles from one process.")
+    parser.add_argument("--roles", default=os.getenv("HOST_ROLES", ",".join(ROLES)),
+                        help="comma separated roles to serve (default: all)")
+    parser.add_argument("--mode", choices=["ports", "prefix"], default=os.getenv("HOST_MODE", "ports"),
+                        help="one port per role (as the standalone servers) or one port with /<role> prefixes")
+    parser.add_argument("--port", type=int, default=int(os.getenv("HOST_PORT", DEFAULT_HOST_PORT)),
+                        help="port for --mode prefix")
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="profile the first tasks with cProfile or stack sampling, written to PROFILE_DIR")
+    parser.add_argument("--profile-tasks", type=int, help="number of tasks to profile (default: until stopped)")
+    parser.add_argument("--profile-seconds", type=float, help="seconds to profile (default: until stopped)")
+    args = parser.parse_args()
+    profile = None
+    if args.profile:
+        profile = {"mode": args.profile, "tasks": args.profile_tasks, "seconds": args.profile_seconds}
+    serve([role.strip() for role in args.roles.split(",") if role.strip()], mode=args.mode, port=args.port,
+          profile=profile)
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,19 @@ import sys
 import os
 import asyncio
 import time
+import uuid
+import queue
+import threading
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from common.utils import get_agent_card, send_task_to_agent, extract_agent_reply, log_message
+from common.utils import get_agent_card, send_task_to_agent, stream_task_to_agent, extract_agent_reply, log_message
+from common.run_journal import RunJournal, COMPLETED, FAILED
+from common.budget import TaskBudget
+from common.push import receiver_for
+from common.batching import BatchTuner, split_batches, task_weight
+from common.tasks import pending_among
+from common.worker_pool import card_skills
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -16,10 +25,115 @@ if not os.getenv("OPENAI_API_KEY"):
     print("Please make sure you have a valid API key in your .env file.")
     sys.exit(1)
 
-# URLs for our agent servers
-PLANNER_URL = "http://localhost:5001"
-FRONTEND_URL = "http://localhost:5002"
-BACKEND_URL = "http://localhost:5003"
+# URLs for our agent servers (with agents/host.py --mode prefix: http://localhost:5000/<role>)
+PLANNER_URL = os.getenv("PLANNER_AGENT_URL", "http://localhost:5001")
+FRONTEND_URL = os.getenv("FRONTEND_AGENT_URL", "http://localhost:5002")
+BACKEND_URL = os.getenv("BACKEND_AGENT_URL", "http://localhost:5003")
+
+# Deadline for planning plus the early tasks it starts, which get what is left of it
+PIPELINE_TIMEOUT = float(os.getenv("PIPELINE_TIMEOUT", "900"))
+
+def dispatch_early_tasks(role, url, project_path, pending, budget, receiver=None):
+    """Send the early tasks routed to one agent as soon as the planner emits them.
+
+    Runs in its own thread until it receives None; tasks come as (skill,
+    text). Tasks that arrive while a dispatch is running are sent together
+    in the next one, by skill and split up to the role's tuned batch size
+    (see common/batching.py).
+    """
+    journal = RunJournal(project_path)
+    tuner = BatchTuner(project_path, role)
+    tasks_file = os.path.join(project_path, 'tasks.md')
+    finished = False
+    while not finished:
+        queued = [pending.get()]
+        while True:
+            try:
+                queued.append(pending.get_nowait())
+            except queue.Empty:
+                break
+        if None in queued:
+            finished = True
+            queued = [task for task in queued if task is not None]
+
+        by_skill = {}
+        for skill, text in queued:
+            by_skill.setdefault(skill, []).append(text)
+        batches = [(skill, batch) for skill, texts in by_skill.items()
+                   for batch in split_batches(texts, tuner.current_limit(), section=f"{skill.capitalize()} Tasks")]
+        for skill, batch in batches:
+            task_list = "\n".join(f"- {task}" for task in batch)
+            task_prompt = f"""Please implement these {skill} setup tasks from {tasks_file} now, the rest of the plan is still being written.
+
+PROJECT_PATH: {project_path}
+
+Here are the tasks:
+{task_list}
+"""
+            task_id = str(uuid.uuid4())
+            journal.record_dispatch(task_id, role, batch, task_prompt)
+            log_message(f"Starting {len(batch)} early {skill} task(s) on the {role} agent while planning continues", "Client")
+            started = time.time()
+            response = send_task_to_agent(url, task_prompt, task_id, project=project_path, budget=budget.child(),
+                                          receiver=receiver)
+            budget.charge_metadata((response or {}).get("metadata"))
+            reply = extract_agent_reply(response)
+            journal.record_result(task_id, COMPLETED if reply else FAILED, reply)
+            log_message(f"Early {role} task(s) {'finished' if reply else 'failed'}", "Client")
+            if reply:
+                tuner.record(sum(task_weight(task) for task in batch), time.time() - started,
+                             len(batch) - len(pending_among(project_path, batch)), len(batch))
+
+def stream_planning(full_message, task_id, project_path, budget):
+    """Send the planning task with tasks/sendSubscribe and start early tasks as they are emitted.
+
+    Early tasks are subtasks of the planning request and share its budget.
+    Each goes to the agent that ranks its skill highest on its card, so
+    infrastructure tasks go to whichever agent takes them.
+    Returns the planner's reply, after the early tasks have finished.
+    """
+    urls = {"frontend": FRONTEND_URL, "backend": BACKEND_URL}
+    cards = {}
+    dispatchers = {}
+
+    def agent_for(skill):
+        for role, url in urls.items():
+            if not cards.get(role):
+                cards[role] = get_agent_card(url)
+        ranked = [(card_skills(card, role).index(skill), role) for role, card in cards.items()
+                  if card and skill in card_skills(card, role)]
+        return min(ranked)[1] if ranked else None
+
+    planner_reply = None
+    for event in stream_task_to_agent(PLANNER_URL, full_message, task_id, project=project_path, budget=budget):
+        if event.get("final"):
+            planner_reply = extract_agent_reply(event)
+            break
+        for part in event.get("artifact", {}).get("parts", []):
+            task = part.get("data", {})
+            if not task.get("early") or not task.get("role"):
+                continue
+            skill = task["role"]
+            role = agent_for(skill)
+            if role is None:
+                log_message(f"No reachable agent takes {skill} tasks, leaving '{task['task']}' for later", "Client")
+                continue
+            if role not in dispatchers:
+                pending = queue.Queue()
+                thread = threading.Thread(target=dispatch_early_tasks, daemon=True,
+                                          args=(role, urls[role], project_path, pending, budget,
+                                                receiver_for(cards[role])))
+                thread.start()
+                dispatchers[role] = (pending, thread)
+            dispatchers[role][0].put((skill, task["task"]))
+
+    for pending, thread in dispatchers.values():
+        pending.put(None)
+    if dispatchers:
+        log_message("Waiting for the early tasks to finish...", "Client")
+    for pending, thread in dispatchers.values():
+        thread.join()
+    return planner_reply
 
 async def main():
     # Accept user input for project description
@@ -62,8 +176,28 @@ async def main():
     log_message(f"Sending project description to Planner Agent (Path: {project_path})...", "Client")
     # Format the message to include the project path
     full_message = f"PROJECT_PATH: {project_path}\n\nPROJECT_DESCRIPTION: {user_input}"
-    planner_response = send_task_to_agent(PLANNER_URL, full_message)
-    planner_reply = extract_agent_reply(planner_response)
+
+    # Resume an interrupted planning run for the same request with its original
+    # task id, so a planner that already finished it answers without re-planning
+    journal = RunJournal(project_path)
+    task_id = str(uuid.uuid4())
+    for record in reversed(journal.tasks("planner")):
+        if record["prompt"] == full_message and record["status"] != FAILED:
+            task_id = record["task_id"]
+            log_message(f"Resuming planning task {task_id} ({record['status']})", "Client")
+            break
+    else:
+        journal.record_dispatch(task_id, "planner", [], full_message)
+
+    # With a streaming planner, setup tasks start on the frontend/backend agents while it plans
+    budget = TaskBudget.from_env(timeout=PIPELINE_TIMEOUT)
+    if planner_card.get("capabilities", {}).get("streaming"):
+        planner_reply = stream_planning(full_message, task_id, project_path, budget)
+    else:
+        planner_response = send_task_to_agent(PLANNER_URL, full_message, task_id, project=project_path, budget=budget,
+                                              receiver=receiver_for(planner_card))
+        planner_reply = extract_agent_reply(planner_response)
+    journal.record_result(task_id, COMPLETED if planner_reply else FAILED, planner_reply)
 
     if not planner_reply:
         log_message("Failed to get response from Planner Agent.", "Client")
@@ -0,0 +1,88 @@
+"""Compare per-call latency of the native toolset against Desktop Commander over MCP.
+
+Usage: python benchmarks/toolset_latency.py [--calls 200] [--dir /tmp] [--skip-mcp]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import native_tools
+
+# (tool name, arguments) for the small operations the agents make most often
+def operations(workdir):
+    target = os.path.join(workdir, "bench.txt")
+    return [
+        ("write_file", {"path": target, "content": "hello\n" * 50}),
+        ("read_file", {"path": target}),
+        ("edit_block", {"file_path": target, "old_string": "hello\nhello", "new_string": "hello\nhello",
+                        "expected_replacements": 25}),
+        ("list_directory", {"path": workdir}),
+    ]
+
+def summarize(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f"mean {statistics.mean(samples) * 1000:7.3f} ms  p50 {statistics.median(samples) * 1000:7.3f} ms  p95 {p95 * 1000:7.3f} ms"
+
+async def bench(call, ops, calls):
+    results = {}
+    for name, args in ops:
+        await call(name, args)  # warm-up
+        samples = []
+        for _ in range(calls):
+            started = time.perf_counter()
+            await call(name, args)
+            samples.append(time.perf_counter() - started)
+        results[name] = samples
+    return results
+
+async def bench_native(ops, calls, workdir):
+    ctx = SimpleNamespace(deps=workdir)
+    tools = {tool.__name__: tool for tool in native_tools.NATIVE_TOOLS}
+
+    async def call(name, args):
+        return await tools[name](ctx, **args)
+
+    return await bench(call, ops, calls)
+
+async def bench_mcp(ops, calls):
+    from pydantic_ai.mcp import MCPServerStdio
+    server = MCPServerStdio('npx', ['-y', '@wonderwhy-er/desktop-commander'], env=dict(os.environ))
+    async with server:
+        async def call(name, args):
+            return await server.call_tool(name, args)
+
+        return await bench(call, ops, calls)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--calls", type=int, default=200, help="calls per operation")
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="directory to work in (must be allowed by config)")
+    parser.add_argument("--skip-mcp", action="store_true", help="only measure the native toolset")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="toolset-bench-", dir=args.dir)
+    try:
+        ops = operations(workdir)
+        runs = [("native", await bench_native(ops, args.calls, workdir))]
+        if not args.skip_mcp:
+            if shutil.which("npx"):
+                runs.append(("mcp", await bench_mcp(ops, args.calls)))
+            else:
+                print("npx not found, skipping the Desktop Commander measurements")
+        for name, _ in ops:
+            print(name)
+            for toolset, results in runs:
+                print(f"  {toolset:<7} {summarize(results[name])}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -18,6 +18,7 @@ if not os.getenv("OPENAI_API_KEY"):
 
 from pydantic_ai.mcp import MCPServerStdio
 from pydantic_ai import Agent
+from common.models import model_for
 
 # Desktop Commander MCP server for file operations
 desktop_commander = MCPServerStdio(
@@ -27,7 +28,7 @@ desktop_commander = MCPServerStdio(
 
 # Create a client agent that can read files and assign tasks
 client_agent = Agent(
-    model="openai:gpt-4o-mini",
+    model=model_for("executor", "analysis"),
     system_prompt="""You are a task management agent. Your job is to:
     1. Read the tasks.md file
     2. Identify which tasks are not yet completed (those marked with "[ ]")
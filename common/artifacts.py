@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+import re
+from urllib.parse import quote
+
+from common.context_pack import CACHE_DIR_NAME
+
+# Task results are stored as artifacts under <project>/.a2a/artifacts/<task id>/
+# and task responses only carry references to them, which the client fetches
+# from GET tasks/<task id>/artifacts/<name> when it needs the content.
+ARTIFACT_DIR_NAME = "artifacts"
+
+# Content types of the artifacts a task can have
+ARTIFACT_TYPES = {
+    "reply": "text/plain",
+    "changed_files": "application/json",  # paths the model's write tool calls named
+    "changes": "application/json",  # added/modified/deleted files, from snapshots before and after
+    "verification": "application/json",  # build/test report, stored after the reply (see common/verify.py)
+}
+
+SAFE_NAME = re.compile(r'^[A-Za-z0-9._-]+$')
+
+def task_dir_name(task_id):
+    """Directory of a task's artifacts: the id itself if it is a plain file name, else a hash of it."""
+    task_id = str(task_id)
+    if SAFE_NAME.match(task_id) and not task_id.startswith('.'):
+        return task_id
+    return "id-" + hashlib.sha256(task_id.encode('utf-8')).hexdigest()[:32]
+
+def artifact_path(project_path, task_id, name):
+    """Path of a stored artifact, or None if name isn't an artifact type."""
+    if name not in ARTIFACT_TYPES:
+        return None
+    return os.path.join(project_path, CACHE_DIR_NAME, ARTIFACT_DIR_NAME, task_dir_name(task_id), name)
+
+def artifact_ref(project_path, task_id, name, size):
+    """A2A artifact pointing at a stored artifact. The URI is relative to the agent's base URL."""
+    return {
+        "name": name,
+        "parts": [{
+            "type": "file",
+            "file": {
+                "name": name,
+                "mimeType": ARTIFACT_TYPES[name],
+                "uri": f"tasks/{quote(str(task_id), safe='')}/artifacts/{name}?project={quote(project_path)}",
+            },
+        }],
+        "metadata": {"size": size},
+    }
+
+def store_artifact(project_path, task_id, name, content):
+    """Store an artifact of a task (text, or JSON for anything else) and return its reference."""
+    path = artifact_path(project_path, task_id, name)
+    if path is None:
+        raise ValueError(f"Unknown artifact type '{name}'")
+    data = (content if isinstance(content, str) else json.dumps(content)).encode('utf-8')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = path + ".tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_file, path)
+    return artifact_ref(project_path, task_id, name, len(data))
+
+def task_artifacts(project_path, task_id):
+    """References to the stored artifacts of a task."""
+    refs = []
+    for name in ARTIFACT_TYPES:
+        path = artifact_path(project_path, task_id, name)
+        if path and os.path.exists(path):
+            refs.append(artifact_ref(project_path, task_id, name, os.path.getsize(path)))
+    return refs
@@ -0,0 +1,179 @@
+import json
+import os
+import re
+import threading
+
+from common.utils import log_message, estimate_tokens
+from common.context_pack import CACHE_DIR_NAME
+from common.search_index import tokenize
+
+# Adaptive batching of the tasks a client sends in one A2A task. Every request
+# pays a fixed overhead (model round trips, context pack, MCP), so small
+# related tasks are grouped; a task too large for the batch budget goes on its
+# own. The budget is measured in weight units (about one short task each) and
+# tuned per project and role from how the previous batches went:
+#   - a fit of batch duration against batch weight, exponentially weighted
+#     towards recent batches, caps the budget so a batch takes about
+#     BATCH_TARGET_SECONDS
+#   - the budget grows by one unit after a batch that got its tasks done and
+#     is halved after one that left more than 1 - BATCH_MIN_COMPLETION of
+#     them unchecked, so it settles at the largest size that still completes
+BATCH_INITIAL_UNITS = float(os.getenv("BATCH_INITIAL_UNITS", "4"))
+BATCH_MIN_UNITS = 1.0
+BATCH_MAX_UNITS = float(os.getenv("BATCH_MAX_UNITS", "20"))
+BATCH_TARGET_SECONDS = float(os.getenv("BATCH_TARGET_SECONDS", "180"))
+BATCH_MIN_COMPLETION = 0.8
+
+# Weight of recent batches in the latency fit
+DECAY = 0.8
+# Batches needed before the latency fit is trusted
+MIN_SAMPLES = 3
+
+# Estimated tokens of task description per weight unit
+TOKENS_PER_UNIT = 25
+
+# Relatedness of a candidate task to a batch
+SAME_SECTION_SCORE = 2.0
+SHARED_FILE_SCORE = 3.0
+MIN_RELATED_SCORE = 1.0
+
+FILE_PATTERN = re.compile(r'[\w@./-]*\w\.(?:[A-Za-z]{1,5})\b|[\w@.-]+/[\w@./-]+')
+STATE_FILE_NAME = "batching-{role}.json"
+
+_lock = threading.Lock()
+
+def task_weight(text):
+    """Estimated size of a task in weight units."""
+    return max(1.0, estimate_tokens(text) / TOKENS_PER_UNIT)
+
+def mentioned_files(text):
+    """File names and paths mentioned in a task description."""
+    return {match.strip("./").lower() for match in FILE_PATTERN.findall(text) if not match.startswith("http")}
+
+def _describe(task):
+    return dict(task, weight=task_weight(task["text"]), files=mentioned_files(task["text"]), terms=set(tokenize(task["text"])))
+
+def relatedness(task, batch):
+    """How much a task belongs with the tasks already in a batch."""
+    score = 0.0
+    if any(task["section"] == other["section"] for other in batch):
+        score += SAME_SECTION_SCORE
+    score += SHARED_FILE_SCORE * len(task["files"] & set().union(*(other["files"] for other in batch)))
+    batch_terms = set().union(*(other["terms"] for other in batch))
+    if task["terms"] and batch_terms:
+        score += len(task["terms"] & batch_terms) / len(task["terms"] | batch_terms)
+    return score
+
+def plan_batch(tasks, limit):
+    """Pick the next batch from pending tasks (dicts with "text" and "section").
+
+    The oldest pending task always goes first so nothing starves; the most
+    related of the others join it while the batch stays within limit units.
+    Returns the batch in tasks.md order, each task with its "weight".
+    """
+    if not tasks:
+        return []
+    candidates = [dict(_describe(task), index=i) for i, task in enumerate(tasks)]
+    batch = [candidates.pop(0)]
+    weight = batch[0]["weight"]
+    while candidates:
+        scores = [relatedness(task, batch) for task in candidates]
+        # Most related first, earlier in tasks.md on ties
+        ranked = sorted(range(len(candidates)), key=lambda i: (-scores[i], i))
+        chosen = next((i for i in ranked
+                       if scores[i] >= MIN_RELATED_SCORE and weight + candidates[i]["weight"] <= limit), None)
+        if chosen is None:
+            break
+        weight += candidates[chosen]["weight"]
+        batch.append(candidates.pop(chosen))
+    return [dict(tasks[task["index"]], weight=task["weight"]) for task in sorted(batch, key=lambda task: task["index"])]
+
+def split_batches(texts, limit, section=None):
+    """Split task texts into batches of at most limit units (a larger task gets a batch of its own)."""
+    batches = []
+    remaining = [{"text": text, "section": section, "id": i} for i, text in enumerate(texts)]
+    while remaining:
+        batch = plan_batch(remaining, limit)
+        chosen = {task["id"] for task in batch}
+        remaining = [task for task in remaining if task["id"] not in chosen]
+        batches.append([task["text"] for task in batch])
+    return batches
+
+class BatchTuner:
+    """Batch size budget of one role in one project, tuned from the batches sent so far.
+
+    Kept in .a2a/batching-<role>.json so a restarted client picks up where it left off.
+    """
+
+    def __init__(self, project_path, role):
+        self.project_path = project_path
+        self.role = role
+        self.state_file = os.path.join(project_path, CACHE_DIR_NAME, STATE_FILE_NAME.format(role=role))
+        self.limit = BATCH_INITIAL_UNITS
+        # Exponentially weighted sums for the duration ~ overhead + per_unit * weight fit
+        self.sums = {"n": 0.0, "x": 0.0, "y": 0.0, "xx": 0.0, "xy": 0.0}
+        self.samples = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+            self.limit, self.sums, self.samples = state["limit"], state["sums"], state["samples"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+        with _lock:
+            os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+            tmp_file = f"{self.state_file}.tmp-{threading.get_ident()}"
+            with open(tmp_file, 'w') as f:
+                json.dump({"limit": self.limit, "sums": self.sums, "samples": self.samples}, f)
+            os.replace(tmp_file, self.state_file)
+
+    def latency_model(self):
+        """(overhead seconds, seconds per unit) of a batch, or None until there's enough data."""
+        s = self.sums
+        denominator = s["n"] * s["xx"] - s["x"] ** 2
+        if self.samples < MIN_SAMPLES or s["n"] <= 0:
+            return None
+        if denominator <= 1e-9:
+            # All batches had the same weight, no way to tell the overhead apart
+            return 0.0, s["y"] / s["x"]
+        per_unit = (s["n"] * s["xy"] - s["x"] * s["y"]) / denominator
+        overhead = (s["y"] - per_unit * s["x"]) / s["n"]
+        if per_unit <= 0:
+            return 0.0, s["y"] / s["x"]
+        return max(overhead, 0.0), per_unit
+
+    def current_limit(self):
+        """Units the next batch may hold."""
+        limit = self.limit
+        model = self.latency_model()
+        if model is not None:
+            overhead, per_unit = model
+            limit = min(limit, (BATCH_TARGET_SECONDS - overhead) / per_unit)
+        return max(BATCH_MIN_UNITS, min(limit, BATCH_MAX_UNITS))
+
+    def record(self, weight, seconds, completed, total):
+        """Learn from a finished batch: its weight, how long it took and how many of its tasks got done."""
+        for key in self.sums:
+            self.sums[key] *= DECAY
+        self.sums["n"] += 1
+        self.sums["x"] += weight
+        self.sums["y"] += seconds
+        self.sums["xx"] += weight * weight
+        self.sums["xy"] += weight * seconds
+        self.samples += 1
+
+        completion = completed / total if total else 1.0
+        if completion < BATCH_MIN_COMPLETION:
+            self.limit = max(BATCH_MIN_UNITS, self.limit / 2)
+        else:
+            self.limit = min(BATCH_MAX_UNITS, self.limit + 1)
+        self._save()
+        per_minute = completed / seconds * 60 if seconds > 0 else 0.0
+        log_message(f"Batch of {total} task(s) ({weight:.1f} units) took {seconds:.0f}s, {completed} done "
+                    f"({per_minute:.1f} tasks/min); next batch up to {self.current_limit():.1f} units",
+                    f"{self.role.capitalize()} Client", event="batch", tasks=total, completed=completed,
+                    units=round(weight, 2), duration_ms=round(seconds * 1000), next_units=round(self.current_limit(), 2))
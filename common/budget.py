@@ -0,0 +1,151 @@
+import asyncio
+import os
+import time
+
+from pydantic_ai import Agent
+from pydantic_ai.exceptions import UsageLimitExceeded
+from pydantic_ai.messages import ToolCallPart
+from pydantic_ai.usage import UsageLimits
+
+# Defaults for tasks sent without a budget. Unset token and tool-call budgets mean no limit.
+TASK_TIMEOUT = float(os.getenv("TASK_TIMEOUT", "300"))
+TASK_TOKEN_BUDGET = os.getenv("TASK_TOKEN_BUDGET")
+TASK_TOOL_CALL_BUDGET = os.getenv("TASK_TOOL_CALL_BUDGET")
+
+# Seconds a client keeps waiting past the deadline for the server's own answer
+DEADLINE_GRACE = 10
+
+class BudgetExceeded(Exception):
+    """A task ran past its deadline or over its token or tool-call budget."""
+
+class TaskBudget:
+    """Deadline and token/tool-call budget of one A2A task.
+
+    Travels in the task metadata as {"deadline": <epoch seconds>,
+    "budget": {"tokens": n, "tool_calls": n}}. The server charges every
+    model run of the task to it and stops the run as soon as any limit is
+    hit; subtasks get what is left (see child).
+    """
+
+    def __init__(self, deadline=None, tokens=None, tool_calls=None):
+        self.deadline = deadline
+        self.tokens = tokens
+        self.tool_calls = tool_calls
+        self.tokens_used = 0
+        self.tool_calls_used = 0
+
+    @classmethod
+    def from_env(cls, timeout=None):
+        """A fresh budget from TASK_TIMEOUT, TASK_TOKEN_BUDGET and TASK_TOOL_CALL_BUDGET."""
+        timeout = TASK_TIMEOUT if timeout is None else timeout
+        return cls(
+            deadline=time.time() + timeout,
+            tokens=int(TASK_TOKEN_BUDGET) if TASK_TOKEN_BUDGET else None,
+            tool_calls=int(TASK_TOOL_CALL_BUDGET) if TASK_TOOL_CALL_BUDGET else None,
+        )
+
+    @classmethod
+    def from_metadata(cls, metadata):
+        """Budget of an incoming task, with the defaults for anything it doesn't set."""
+        metadata = metadata or {}
+        limits = metadata.get("budget") or {}
+        default = cls.from_env()
+        return cls(
+            deadline=metadata.get("deadline", default.deadline),
+            tokens=limits.get("tokens", default.tokens),
+            tool_calls=limits.get("tool_calls", default.tool_calls),
+        )
+
+    def remaining_seconds(self):
+        return None if self.deadline is None else self.deadline - time.time()
+
+    def remaining_tokens(self):
+        return None if self.tokens is None else self.tokens - self.tokens_used
+
+    def remaining_tool_calls(self):
+        return None if self.tool_calls is None else self.tool_calls - self.tool_calls_used
+
+    def check(self):
+        """Raise BudgetExceeded if the deadline passed or a budget is used up."""
+        if self.deadline is not None and self.remaining_seconds() <= 0:
+            raise BudgetExceeded("deadline passed")
+        if self.tokens is not None and self.remaining_tokens() <= 0:
+            raise BudgetExceeded(f"token budget of {self.tokens} used up")
+        if self.tool_calls is not None and self.remaining_tool_calls() < 0:
+            raise BudgetExceeded(f"tool-call budget of {self.tool_calls} used up")
+
+    def child(self):
+        """Budget for a subtask: the same deadline and whatever tokens and tool calls are left."""
+        return TaskBudget(self.deadline, self.remaining_tokens(), self.remaining_tool_calls())
+
+    def metadata(self):
+        """Task metadata carrying this budget."""
+        metadata = {}
+        if self.deadline is not None:
+            metadata["deadline"] = self.deadline
+        limits = {}
+        if self.tokens is not None:
+            limits["tokens"] = max(self.remaining_tokens(), 0)
+        if self.tool_calls is not None:
+            limits["tool_calls"] = max(self.remaining_tool_calls(), 0)
+        if limits:
+            metadata["budget"] = limits
+        return metadata
+
+    def usage_metadata(self):
+        """What this task consumed, reported back in the task response."""
+        return {"tokens": self.tokens_used, "tool_calls": self.tool_calls_used}
+
+    def charge_metadata(self, metadata):
+        """Charge what a finished (sub)task reported in its response metadata."""
+        usage = (metadata or {}).get("usage") or {}
+        self.tokens_used += usage.get("tokens", 0)
+        self.tool_calls_used += usage.get("tool_calls", 0)
+
+    def http_timeout(self):
+        """Seconds a client should wait for the response of a task with this budget."""
+        remaining = self.remaining_seconds()
+        return None if remaining is None else max(remaining, 0) + DEADLINE_GRACE
+
+async def run_within_budget(agent, prompt, budget, **kwargs):
+    """agent.run that is cancelled at the budget's deadline or token/tool-call limit.
+
+    Tool calls are counted when the model asks for them, so a call over the
+    budget is never executed. Everything the run used is charged to the
+    budget, also when it is stopped.
+    """
+    budget.check()
+    kwargs.setdefault("usage_limits", UsageLimits(total_tokens_limit=budget.remaining_tokens()))
+    agent_run = None
+
+    async def run():
+        nonlocal agent_run
+        async with agent.iter(prompt, **kwargs) as agent_run:
+            async for node in agent_run:
+                if Agent.is_call_tools_node(node):
+                    for part in node.model_response.parts:
+                        if isinstance(part, ToolCallPart):
+                            budget.tool_calls_used += 1
+                    budget.check()
+            return agent_run.result
+
+    try:
+        result = await asyncio.wait_for(run(), budget.remaining_seconds())
+    except asyncio.TimeoutError:
+        error = BudgetExceeded("deadline passed")
+    except UsageLimitExceeded as e:
+        error = BudgetExceeded(str(e))
+    except BudgetExceeded as e:
+        error = e
+    else:
+        error = None
+    finally:
+        if agent_run is not None:
+            budget.tokens_used += agent_run.usage().total_tokens or 0
+    if error is not None:
+        # What the stopped run used and asked for, for the usage ledger and tool call events
+        error.usage = agent_run.usage() if agent_run is not None else None
+        history = len(kwargs.get("message_history") or [])
+        error.new_messages = agent_run.ctx.state.message_history[history:] if agent_run is not None else []
+        raise error
+    return result
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import re
+import threading
+
+from common.tasks import parse_tasks, tasks_for_role, section_matches_role, read_tasks_file
+from common.utils import estimate_tokens
+
+# Directory inside each project where the agents keep their caches
+CACHE_DIR_NAME = ".a2a"
+
+# Directories that never help an agent understand the project layout
+IGNORED_DIRS = {".git", ".a2a", "node_modules", "__pycache__", "venv", ".venv", "dist", "build", ".next", ".cache"}
+
+# Plan sections worth keeping in every digest
+PLAN_SECTION_KEYWORDS = ("overview", "architecture", "technolog", "stack", "structure", "approach", "design")
+
+# Size limits for the different parts of the digest
+MAX_PLAN_SECTION_CHARS = 1200
+MAX_PLAN_CHARS = 5000
+MAX_PENDING_TASKS = 40
+MAX_TREE_ENTRIES = 150
+MAX_TREE_DEPTH = 4
+MAX_CACHED_PACKS = 256
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _read(path):
+    if not os.path.exists(path):
+        return ""
+    with open(path, 'r') as f:
+        return f.read()
+
+def _split_sections(markdown):
+    """Split markdown into (heading, body) pairs."""
+    sections = []
+    heading, body = "", []
+    for line in markdown.split('\n'):
+        match = re.match(r'^#{1,6}\s+(.*)$', line)
+        if match:
+            if heading or any(l.strip() for l in body):
+                sections.append((heading, "\n".join(body).strip()))
+            heading, body = match.group(1).strip(), []
+        else:
+            body.append(line)
+    if heading or any(l.strip() for l in body):
+        sections.append((heading, "\n".join(body).strip()))
+    return sections
+
+def _truncate(text, limit):
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit('\n', 1)[0] + "\n..."
+
+def summarize_plan(plan_content, role):
+    """Keep the architecture/stack sections of plan.md plus anything about the role."""
+    kept = []
+    total = 0
+    for heading, body in _split_sections(plan_content):
+        lowered = heading.lower()
+        relevant = any(keyword in lowered for keyword in PLAN_SECTION_KEYWORDS) or section_matches_role(heading, role)
+        if not relevant or not body:
+            continue
+        chunk = f"### {heading}\n{_truncate(body, MAX_PLAN_SECTION_CHARS)}"
+        if total + len(chunk) > MAX_PLAN_CHARS:
+            break
+        kept.append(chunk)
+        total += len(chunk)
+    if not kept:
+        # No recognizable headings, fall back to the start of the plan
+        return _truncate(plan_content.strip(), MAX_PLAN_CHARS)
+    return "\n\n".join(kept)
+
+def file_tree(project_path, max_entries=MAX_TREE_ENTRIES, max_depth=MAX_TREE_DEPTH):
+    """Return a compact, sorted listing of the project files."""
+    entries = []
+    root_depth = project_path.rstrip(os.sep).count(os.sep)
+    for root, dirs, files in os.walk(project_path):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_DIRS and not d.startswith('.'))
+        depth = root.count(os.sep) - root_depth
+        if depth >= max_depth:
+            dirs[:] = []
+        rel_root = os.path.relpath(root, project_path)
+        for name in sorted(files):
+            entries.append(name if rel_root == "." else os.path.join(rel_root, name))
+            if len(entries) >= max_entries:
+                entries.append("... (truncated)")
+                return entries
+    return entries
+
+def _render(role, plan_content, tasks_content, tree):
+    tasks = parse_tasks(tasks_content)
+    role_tasks = tasks_for_role(tasks, role)
+    pending = [task for task in role_tasks if not task["done"]]
+    # Tasks outside any role section (setup, infrastructure) are shown too
+    shared = [task for task in tasks if not task["done"] and not any(
+        section_matches_role(task["section"], other) for other in ("frontend", "backend"))]
+
+    lines = [f"## Project context ({role})", "", summarize_plan(plan_content, role), ""]
+    done_count = len(role_tasks) - len(pending)
+    lines.append(f"### Pending {role} tasks ({done_count}/{len(role_tasks)} done)")
+    lines.extend(f"- [ ] {task['text']}" for task in pending[:MAX_PENDING_TASKS])
+    if len(pending) > MAX_PENDING_TASKS:
+        lines.append(f"- ... {len(pending) - MAX_PENDING_TASKS} more")
+    if shared:
+        lines.append("")
+        lines.append("### Pending shared/setup tasks")
+        lines.extend(f"- [ ] {task['text']}" for task in shared[:MAX_PENDING_TASKS])
+    lines.append("")
+    lines.append("### Project files")
+    lines.extend(tree or ["(empty)"])
+    return "\n".join(lines)
+
+def build_context_pack(project_path, role):
+    """Return a role-specific digest of plan.md, tasks.md and the file tree.
+
+    Digests are cached in memory and under .a2a/context/ keyed by a hash of
+    the inputs, so unchanged projects are never re-parsed.
+    """
+    plan_content = _read(os.path.join(project_path, 'plan.md'))
+    tasks_content = read_tasks_file(project_path)
+    tree = file_tree(project_path)
+
+    digest = hashlib.sha256()
+    for part in (role, plan_content, tasks_content, "\n".join(tree)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    key = digest.hexdigest()[:16]
+
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+
+    cache_file = os.path.join(project_path, CACHE_DIR_NAME, "context", f"{role}-{key}.md")
+    if os.path.exists(cache_file):
+        pack = _read(cache_file)
+    else:
+        pack = _render(role, plan_content, tasks_content, tree)
+        try:
+            cache_dir = os.path.dirname(cache_file)
+            os.makedirs(cache_dir, exist_ok=True)
+            # Only the latest digest per role is worth keeping on disk
+            for name in os.listdir(cache_dir):
+                if name.startswith(f"{role}-"):
+                    os.remove(os.path.join(cache_dir, name))
+            with open(cache_file, 'w') as f:
+                f.write(pack)
+        except OSError:
+            pass
+
+    with _cache_lock:
+        if len(_cache) >= MAX_CACHED_PACKS:
+            _cache.clear()
+        _cache[key] = pack
+    return pack
+
+def context_pack_stats(pack):
+    """Return a short description of a context pack's size for logging."""
+    return f"{len(pack)} chars, ~{estimate_tokens(pack)} tokens"
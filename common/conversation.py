@@ -0,0 +1,197 @@
+import os
+import threading
+from dataclasses import replace
+
+from pydantic_ai.messages import (
+    ModelMessagesTypeAdapter,
+    ModelRequest,
+    ModelResponse,
+    RetryPromptPart,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from common.context_pack import CACHE_DIR_NAME
+from common.utils import estimate_tokens, log_message
+
+# Once the stored history passes this many (estimated) tokens it is compacted.
+# Compaction shrinks it well below the budget so the prefix then stays stable,
+# and cacheable by the provider, for several tasks in a row.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "24000"))
+COMPACT_TARGET_RATIO = 0.5
+
+# Tool output and prompts (with their now stale context packs) from older
+# runs are cut down to this many characters
+MAX_OLD_TOOL_OUTPUT_CHARS = 400
+MAX_OLD_PROMPT_CHARS = 600
+# Runs (one per A2A task) that are always kept verbatim
+KEEP_RECENT_RUNS = 2
+
+_histories = {}
+_stats = {}
+_lock = threading.Lock()
+
+def _part_text(part):
+    if isinstance(part, (SystemPromptPart, TextPart)):
+        return part.content
+    if isinstance(part, UserPromptPart):
+        return part.content if isinstance(part.content, str) else " ".join(str(c) for c in part.content)
+    if isinstance(part, ToolReturnPart):
+        return part.model_response_str()
+    if isinstance(part, ToolCallPart):
+        return part.args_as_json_str()
+    if isinstance(part, RetryPromptPart):
+        return part.model_response()
+    return ""
+
+def history_tokens(messages):
+    """Estimate the number of tokens a message history will cost as input."""
+    return sum(estimate_tokens(_part_text(part)) for message in messages for part in message.parts)
+
+def _split_runs(messages):
+    """Split a history into runs, each starting with a request that carries a user prompt."""
+    runs = []
+    for message in messages:
+        starts_run = isinstance(message, ModelRequest) and any(isinstance(p, UserPromptPart) for p in message.parts)
+        if starts_run or not runs:
+            runs.append([])
+        runs[-1].append(message)
+    return runs
+
+def _clip(text, limit):
+    if len(text) <= limit:
+        return text
+    return text[:limit] + f"\n[... {len(text) - limit} chars truncated]"
+
+def _truncate_old_parts(message):
+    if not isinstance(message, ModelRequest):
+        return message
+    parts = []
+    for part in message.parts:
+        if isinstance(part, ToolReturnPart):
+            part = replace(part, content=_clip(part.model_response_str(), MAX_OLD_TOOL_OUTPUT_CHARS))
+        elif isinstance(part, UserPromptPart) and isinstance(part.content, str):
+            part = replace(part, content=_clip(part.content, MAX_OLD_PROMPT_CHARS))
+        parts.append(part)
+    return replace(message, parts=parts)
+
+def _run_summary(run):
+    """Keep only the final reply of a dropped run."""
+    for message in reversed(run):
+        if isinstance(message, ModelResponse):
+            texts = [part.content for part in message.parts if isinstance(part, TextPart)]
+            if texts:
+                return " ".join(texts)[:MAX_OLD_TOOL_OUTPUT_CHARS]
+    return ""
+
+def compact_history(messages, budget=HISTORY_TOKEN_BUDGET):
+    """Shrink a history that is over budget.
+
+    Tool output and prompts from all but the most recent runs are truncated
+    first. If that isn't enough, the oldest runs are dropped and replaced by
+    a short summary of their final replies. The system prompt is always kept at the
+    front so the prefix sent to the provider stays the same.
+    """
+    if history_tokens(messages) <= budget:
+        return messages
+    target = int(budget * COMPACT_TARGET_RATIO)
+    runs = _split_runs(messages)
+    system_parts = [part for part in runs[0][0].parts if isinstance(part, SystemPromptPart)] if runs else []
+
+    old, recent = runs[:-KEEP_RECENT_RUNS], runs[-KEEP_RECENT_RUNS:]
+    old = [[_truncate_old_parts(message) for message in run] for run in old]
+
+    summaries = []
+    while old and history_tokens([m for run in old + recent for m in run]) > target:
+        summary = _run_summary(old.pop(0))
+        if summary:
+            summaries.append(summary)
+
+    compacted = [message for run in old + recent for message in run]
+    # Drop the system parts wherever they ended up and put them back in front
+    compacted = [
+        replace(message, parts=[p for p in message.parts if not isinstance(p, SystemPromptPart)])
+        if isinstance(message, ModelRequest) else message
+        for message in compacted
+    ]
+    header = list(system_parts)
+    if summaries:
+        header.append(UserPromptPart("Summary of earlier tasks in this project:\n" + "\n".join(f"- {s}" for s in summaries)))
+    if header:
+        if compacted and isinstance(compacted[0], ModelRequest):
+            compacted[0] = replace(compacted[0], parts=header + compacted[0].parts)
+        else:
+            compacted.insert(0, ModelRequest(parts=header))
+    return [message for message in compacted if message.parts]
+
+def _history_file(project_path, role):
+    return os.path.join(project_path, CACHE_DIR_NAME, "history", f"{role}.json")
+
+def get_history(project_path, role):
+    """Return the stored conversation for a project/role, loading it from disk on first use."""
+    key = (os.path.abspath(project_path), role)
+    with _lock:
+        if key not in _histories:
+            messages = []
+            history_file = _history_file(project_path, role)
+            if os.path.exists(history_file):
+                try:
+                    with open(history_file, 'rb') as f:
+                        messages = ModelMessagesTypeAdapter.validate_json(f.read())
+                except (OSError, ValueError) as e:
+                    log_message(f"Discarding unreadable history {history_file}: {e}", "Conversation")
+            _histories[key] = messages
+        return list(_histories[key])
+
+def append_run(project_path, role, new_messages, budget=HISTORY_TOKEN_BUDGET):
+    """Append a finished run to the stored conversation, compacting it when over budget.
+
+    New messages are appended to the current history rather than to the
+    snapshot the run started from, so concurrent tasks don't drop each other.
+    """
+    key = (os.path.abspath(project_path), role)
+    with _lock:
+        messages = _histories.get(key, []) + list(new_messages)
+        before = history_tokens(messages)
+        messages = compact_history(messages, budget)
+        after = history_tokens(messages)
+        _histories[key] = messages
+    if after < before:
+        log_message(f"Compacted {role} history from ~{before} to ~{after} tokens", "Conversation")
+    history_file = _history_file(project_path, role)
+    try:
+        os.makedirs(os.path.dirname(history_file), exist_ok=True)
+        with open(history_file + ".tmp", 'wb') as f:
+            f.write(ModelMessagesTypeAdapter.dump_json(messages))
+        os.replace(history_file + ".tmp", history_file)
+    except OSError as e:
+        log_message(f"Could not persist history {history_file}: {e}", "Conversation")
+
+def reset_history(project_path, role):
+    """Forget the stored conversation for a project/role."""
+    key = (os.path.abspath(project_path), role)
+    with _lock:
+        _histories.pop(key, None)
+    history_file = _history_file(project_path, role)
+    if os.path.exists(history_file):
+        os.remove(history_file)
+
+def record_usage(project_path, role, usage):
+    """Accumulate usage for a project/role and return a report line including the cache-hit rate."""
+    key = (os.path.abspath(project_path), role)
+    cached = (usage.details or {}).get('cached_tokens', 0)
+    with _lock:
+        totals = _stats.setdefault(key, {"runs": 0, "requests": 0, "input": 0, "cached": 0, "output": 0})
+        totals["runs"] += 1
+        totals["requests"] += usage.requests
+        totals["input"] += usage.request_tokens or 0
+        totals["cached"] += cached
+        totals["output"] += usage.response_tokens or 0
+        totals = dict(totals)
+    run_rate = cached / usage.request_tokens if usage.request_tokens else 0.0
+    total_rate = totals["cached"] / totals["input"] if totals["input"] else 0.0
+    return (f"cache hit {run_rate:.0%} this run, {total_rate:.0%} over {totals['runs']} runs "
+            f"({totals['input']} input / {totals['output']} output tokens total)")
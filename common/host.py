@@ -0,0 +1,500 @@
+import asyncio
+import atexit
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from flask import Blueprint, Flask, Response, jsonify, request
+from pydantic_ai.mcp import MCPServerStdio
+
+from common.utils import log_message, make_task_response
+from common.logs import log_context, bind_log_context
+from common.profiling import (PROFILE_LOOP_LAG, LoopLagMonitor, profiled_task, profile_status, start_profile,
+                              stop_profile)
+from common.prompts import system_prompt, log_prompt_size
+from common.roles import ROLES, RUNNERS, agent_card, build_agent, parse_task_text
+from common.native_tools import load_policy, toolset_for
+from common.tool_calls import MCP_SESSIONS_PER_PROJECT, MCPSessionPool
+from common.scheduler import ProjectScheduler
+from common.task_events import subscribe, unsubscribe
+from common.verify import VERIFY_ENABLED, verify_project
+from common.push import TaskNotifier, valid_config
+from common.snapshots import take_snapshot, diff_snapshots, change_count, record_task_changes
+from common.artifacts import ARTIFACT_TYPES, artifact_path, store_artifact, task_artifacts
+from common.budget import TaskBudget, BudgetExceeded
+from common.run_journal import (RunJournal, JOURNAL_DB_NAME, COMPLETED, FAILED, CANCELED, claim_task, release_task,
+                                changed_files_from_messages)
+
+# One process can serve any number of roles and projects. Everything runs on
+# a single event loop in a background thread, which also owns the scheduler
+# and a pool of Desktop Commander sessions per project, started in the project
+# directory (see common/tool_calls.py). Model clients (see resolve_model) and
+# the in-process caches are shared; the caches are keyed by project.
+DEFAULT_HOST_PORT = 5000
+
+# Responses smaller than this (bytes) aren't worth compressing
+GZIP_MIN_BYTES = 1024
+
+# Bearer token required by the /host admin endpoints that change state, if set
+ADMIN_TOKEN = os.getenv("HOST_ADMIN_TOKEN")
+
+# Projects whose Desktop Commander sessions are kept open while idle
+MAX_PROJECT_SESSIONS = int(os.getenv("HOST_MAX_PROJECT_SESSIONS", "16"))
+
+_loop = None
+_loop_lock = threading.Lock()
+_agents = {}
+_mcp_sessions = OrderedDict()  # project -> {"server", "started", "stop", "task"}
+scheduler = ProjectScheduler()
+_verifications = set()
+
+def host_loop():
+    """Return the shared event loop, starting its thread on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="agent-host-loop", daemon=True).start()
+            if PROFILE_LOOP_LAG:
+                LoopLagMonitor(_loop).start()
+        return _loop
+
+def run_on_host(coro):
+    """Run a coroutine on the shared event loop from any thread and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, host_loop()).result()
+
+@dataclass
+class ProjectMCPServer(MCPServerStdio):
+    """MCP stdio server started in a working directory."""
+
+    cwd: str = None
+
+    @asynccontextmanager
+    async def client_streams(self):
+        from mcp.client.stdio import StdioServerParameters, stdio_client
+
+        server = StdioServerParameters(command=self.command, args=list(self.args), env=self.env, cwd=self.cwd)
+        async with stdio_client(server=server) as (read_stream, write_stream):
+            yield read_stream, write_stream
+
+async def _own_session(project_path, session):
+    # The session is entered and exited by this task, as the MCP client requires
+    try:
+        async with session["server"]:
+            session["started"].set_result(None)
+            await session["stop"].wait()
+    except Exception as e:
+        if not session["started"].done():
+            session["started"].set_exception(e)
+        else:
+            log_message(f"Desktop Commander session for {project_path} ended: {e}", "AgentHost")
+    finally:
+        if _mcp_sessions.get(project_path) is session:
+            del _mcp_sessions[project_path]
+            _drop_agents(project_path)
+
+def _drop_agents(project_path):
+    for key in [key for key in _agents if key[1] == project_path]:
+        del _agents[key]
+
+def _evict_idle_sessions():
+    active = scheduler.active_projects()
+    for project_path in list(_mcp_sessions):
+        if len(_mcp_sessions) <= MAX_PROJECT_SESSIONS:
+            break
+        if project_path not in active:
+            _mcp_sessions.pop(project_path)["stop"].set()
+            _drop_agents(project_path)
+
+async def project_mcp_server(project_path):
+    """Return the running Desktop Commander sessions of a project, starting them if needed."""
+    session = _mcp_sessions.get(project_path)
+    if session is None:
+        session = {
+            "server": MCPSessionPool(
+                project_path,
+                lambda: ProjectMCPServer('npx', ['-y', '@wonderwhy-er/desktop-commander'], env={}, cwd=project_path),
+                MCP_SESSIONS_PER_PROJECT,
+            ),
+            "started": asyncio.get_running_loop().create_future(),
+            "stop": asyncio.Event(),
+        }
+        _mcp_sessions[project_path] = session
+        session["task"] = asyncio.create_task(_own_session(project_path, session))
+        _evict_idle_sessions()
+    else:
+        _mcp_sessions.move_to_end(project_path)
+    await asyncio.shield(session["started"])
+    return session["server"]
+
+async def _stop_mcp_sessions():
+    sessions = list(_mcp_sessions.values())
+    for session in sessions:
+        session["stop"].set()
+    await asyncio.gather(*(session["task"] for session in sessions), return_exceptions=True)
+
+@atexit.register
+def _shutdown():
+    if _loop is not None and _loop.is_running():
+        try:
+            asyncio.run_coroutine_threadsafe(_stop_mcp_sessions(), _loop).result(timeout=10)
+        except Exception:
+            pass
+
+async def get_agent(role, project_path=None):
+    """Return the agent of a role for a project, building it on first use.
+
+    With Desktop Commander each project gets its own agent bound to the
+    project's MCP session; with the native toolset one agent serves all.
+    """
+    if toolset_for(role) == "native" or project_path is None:
+        key = (role, None)
+        if key not in _agents:
+            _agents[key] = build_agent(role, [])
+        return _agents[key]
+    server = await project_mcp_server(project_path)
+    key = (role, project_path)
+    if key not in _agents:
+        _agents[key] = build_agent(role, [server])
+    return _agents[key]
+
+async def _run_role(role, project_path, task_id, task_text, budget):
+    """Run a task of a role and return (run result, change set of the project during the run)."""
+    agent_name = ROLES[role]["agent_name"]
+    if scheduler.queued(project_path):
+        log_message(f"Queued behind {scheduler.queued(project_path)} task(s) of {project_path}", agent_name,
+                    event="queued", queued=scheduler.queued(project_path))
+    # The deadline also covers the time spent waiting in the project's queue
+    try:
+        async with asyncio.timeout(budget.remaining_seconds()):
+            async with scheduler.slot(project_path, role):
+                agent = await get_agent(role, project_path)
+                # Also brings the manifest up to date for the runner's "changed since" summary
+                before = await asyncio.to_thread(take_snapshot, project_path)
+                result = await RUNNERS[ROLES[role]["runner"]](role, agent, project_path, task_text, budget)
+                after = await asyncio.to_thread(take_snapshot, project_path)
+                changes = diff_snapshots(before, after)
+                await asyncio.to_thread(record_task_changes, project_path, role, task_id, after, changes)
+                log_message(f"Task changed {change_count(changes)} file(s)", agent_name, event="changes",
+                            **{kind: len(paths) for kind, paths in changes.items()})
+                return result, changes
+    except TimeoutError:
+        raise BudgetExceeded("deadline passed")
+
+async def _verify_task(role, project_path, task_id):
+    """Build and test what a task produced and store the report as its verification artifact.
+
+    Runs after the task was answered, outside its deadline and project slot:
+    a slow npm install shouldn't cost a finished, paid-for model run. Failures
+    come back as fix tasks in tasks.md.
+    """
+    with log_context(role=role, task_id=task_id, project=project_path):
+        try:
+            report = await verify_project(project_path, role)
+        except Exception as e:
+            log_message(f"Verification of task {task_id} failed: {e}", ROLES[role]["agent_name"])
+            return
+        await asyncio.to_thread(store_artifact, project_path, task_id, "verification", report)
+
+def start_verification(role, project_path, task_id):
+    """Start verifying a finished task in the background of the host loop."""
+    future = asyncio.run_coroutine_threadsafe(_verify_task(role, project_path, task_id), host_loop())
+    _verifications.add(future)
+    future.add_done_callback(_verifications.discard)
+
+def handle_task(role, task_request, events=None):
+    """Handle one tasks/send request for a role. Returns (response body, HTTP status).
+
+    If an events queue is given, the run's live events are put on it.
+    """
+    # Everything logged for the task, down to its tool calls, carries its role, id and project
+    with log_context(role=role):
+        return _handle_task(role, task_request, events)
+
+def _handle_task(role, task_request, events):
+    agent_name = ROLES[role]["agent_name"]
+    if not task_request:
+        return {"error": "Invalid request"}, 400
+
+    task_id = task_request.get("id") or str(uuid.uuid4())
+    # Extract user's message text from the request
+    try:
+        user_text = task_request["message"]["parts"][0]["text"]
+    except Exception as e:
+        return {"error": "Bad message format"}, 400
+
+    bind_log_context(task_id=task_id)
+    log_message(f"Received {role} task", agent_name)
+    project_path, task_text = parse_task_text(role, user_text, (task_request.get("metadata") or {}).get("project"))
+    if not project_path:
+        return {"error": "No project given: set metadata.project to the project path"}, 400
+    bind_log_context(project=project_path)
+
+    # Answer resent tasks from the run journal instead of running the model again
+    journal = RunJournal(project_path)
+    previous = journal.get(task_id)
+    if previous and previous["status"] == COMPLETED:
+        log_message(f"Task {task_id} was already completed, answering from the run journal", agent_name)
+        return _completed_response(project_path, task_id, previous), 200
+
+    owner, done = claim_task(task_id)
+    if not owner:
+        log_message(f"Task {task_id} is already running, waiting for it to finish", agent_name)
+        done.wait()
+        previous = journal.get(task_id)
+        if previous and previous["status"] == COMPLETED:
+            return _completed_response(project_path, task_id, previous), 200
+        return {"error": "Task failed"}, 500
+
+    # Deadline and token/tool-call budget set by the sender, enforced inside the model run
+    budget = TaskBudget.from_metadata(task_request.get("metadata"))
+    started = time.perf_counter()
+    if events is not None:
+        subscribe(task_id, events)
+    try:
+        journal.mark_working(task_id, role, user_text)
+        if events is not None:
+            events.put({"id": task_id, "status": {"state": "working"}, "final": False})
+        budget.check()
+        result, changes = run_on_host(_run_role(role, project_path, task_id, task_text, budget))
+        response_text = result.data
+        changed_files = changed_files_from_messages(result.all_messages(), project_path)
+        artifacts = [store_artifact(project_path, task_id, "reply", response_text),
+                     store_artifact(project_path, task_id, "changed_files", sorted(changed_files)),
+                     store_artifact(project_path, task_id, "changes", changes)]
+        journal.record_result(task_id, COMPLETED, response_text, usage=result.usage(), changed_files=changed_files)
+        if VERIFY_ENABLED and ROLES[role]["runner"] == "implement":
+            start_verification(role, project_path, task_id)
+    except BudgetExceeded as e:
+        # Stopped cleanly: the sender has given up or the budget is spent, don't keep working
+        log_message(f"Task {task_id} canceled: {e}", agent_name, event="task", state=CANCELED,
+                    duration_ms=round((time.perf_counter() - started) * 1000), **budget.usage_metadata())
+        journal.record_result(task_id, CANCELED, str(e))
+        return make_task_response(task_id, f"Task canceled: {e}", state=CANCELED,
+                                  metadata={"usage": budget.usage_metadata()}), 200
+    except Exception as e:
+        journal.record_result(task_id, FAILED, str(e))
+        log_message(f"Task {task_id} failed: {e}", agent_name, event="task", state=FAILED,
+                    duration_ms=round((time.perf_counter() - started) * 1000), **budget.usage_metadata())
+        raise
+    finally:
+        if events is not None:
+            unsubscribe(task_id, events)
+        release_task(task_id)
+
+    log_message(f"Task {task_id} completed in {time.perf_counter() - started:.1f}s", agent_name, event="task",
+                state=COMPLETED, duration_ms=round((time.perf_counter() - started) * 1000), **budget.usage_metadata())
+    # Formulate A2A response Task
+    return make_task_response(task_id, response_text, metadata={"usage": budget.usage_metadata()},
+                              artifacts=artifacts), 200
+
+def _completed_response(project_path, task_id, record):
+    # Tasks finished before replies were stored as artifacts only have the text in the journal
+    artifacts = task_artifacts(project_path, task_id) or [store_artifact(project_path, task_id, "reply", record["result"] or "")]
+    return make_task_response(task_id, record["result"] or "", artifacts=artifacts)
+
+def _final_event(task_id, body, status):
+    if status == 200:
+        return dict(body, id=task_id, final=True)
+    return {"id": task_id, "status": {"state": "failed", "message": {"role": "agent", "parts": [{"type": "text", "text": body["error"]}]}},
+            "final": True}
+
+def _run_with_events(role, task_id, task_request, events):
+    try:
+        with profiled_task():
+            body, status = handle_task(role, task_request, events)
+    except Exception as e:
+        body, status = {"error": str(e)}, 500
+    events.put(_final_event(task_id, body, status))
+
+def stream_task(role, task_request):
+    """Run a task and yield its A2A events as server-sent events, ending with the final status."""
+    events = queue.Queue()
+    task_id = (task_request or {}).get("id") or str(uuid.uuid4())
+    if task_request is not None:
+        task_request = dict(task_request, id=task_id)
+
+    threading.Thread(target=_run_with_events, args=(role, task_id, task_request, events), daemon=True).start()
+    while True:
+        event = events.get()
+        yield f"data: {json.dumps(event)}\n\n"
+        if event.get("final"):
+            break
+
+def push_task(role, task_request):
+    """Accept a task sent with a pushNotification config and run it in the background.
+
+    Its status transitions, events and final result are POSTed to the
+    callback (see common/push.py). Returns (response body, HTTP status).
+    """
+    config = task_request.get("pushNotification")
+    if not valid_config(config):
+        return {"error": "pushNotification needs an http(s) url and a token"}, 400
+    task_request = dict(task_request, id=task_request.get("id") or str(uuid.uuid4()))
+    notifier = TaskNotifier(task_request["id"], config)
+    threading.Thread(target=_run_with_events, args=(role, task_request["id"], task_request, notifier), daemon=True).start()
+    return {"id": task_request["id"], "status": {"state": "submitted"}}, 200
+
+def compressed(data, mimetype, status=200):
+    """Response with the data gzipped if the client accepts it and it's large enough."""
+    response = Response(data, status=status, mimetype=mimetype)
+    response.vary.add("Accept-Encoding")
+    if len(data) >= GZIP_MIN_BYTES and "gzip" in request.accept_encodings:
+        response.set_data(gzip.compress(data, compresslevel=5))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+def json_response(body, status, agent_name):
+    """Serialize a task response, logging its size and how long serializing and compressing took."""
+    start = time.perf_counter()
+    data = json.dumps(body).encode('utf-8')
+    response = compressed(data, "application/json", status)
+    serialize_ms = (time.perf_counter() - start) * 1000
+    log_message(f"Response {body.get('id', '')}: {len(data)} bytes, {response.content_length} sent, "
+                f"{serialize_ms:.1f} ms to serialize", agent_name, event="response", task_id=body.get("id"),
+                bytes=len(data), sent_bytes=response.content_length, serialize_ms=round(serialize_ms, 2))
+    return response
+
+def role_blueprint(role, base_url, url_prefix=None):
+    """Flask blueprint with the A2A endpoints of one role."""
+    blueprint = Blueprint(role, __name__, url_prefix=url_prefix)
+    card = agent_card(role, base_url)
+
+    # Endpoint to serve the Agent Card
+    @blueprint.get("/.well-known/agent.json")
+    def get_agent_card():
+        return jsonify(card)
+
+    # Endpoint to handle task requests
+    @blueprint.post("/tasks/send")
+    def handle_task_request():
+        task_request = request.get_json(silent=True)
+        # With a callback registered, answer right away and push the result when it's done
+        if task_request and task_request.get("pushNotification"):
+            body, status = push_task(role, task_request)
+            return json_response(body, status, ROLES[role]["agent_name"])
+        with profiled_task():
+            body, status = handle_task(role, task_request)
+            return json_response(body, status, ROLES[role]["agent_name"])
+
+    # Stored results of a task (see common/artifacts.py), fetched by clients when they need them
+    @blueprint.get("/tasks/<path:task_id>/artifacts/<name>")
+    def get_task_artifact(task_id, name):
+        project_path = os.path.realpath(request.args.get("project", ""))
+        path = artifact_path(project_path, task_id, name) if _served_project(project_path) else None
+        if path is None or not os.path.exists(path):
+            return jsonify({"error": "Artifact not found"}), 404
+        with open(path, 'rb') as f:
+            return compressed(f.read(), ARTIFACT_TYPES[name])
+
+    # Same as tasks/send, streaming the task's events (e.g. the planner's tasks) as they happen
+    @blueprint.post("/tasks/sendSubscribe")
+    def handle_task_subscription():
+        return Response(stream_task(role, request.get_json(silent=True)), mimetype="text/event-stream")
+
+    return blueprint
+
+def _served_project(project_path):
+    """Whether project_path is a project this host ran tasks for, inside the allowed directories."""
+    allowed = load_policy()["allowed"]
+    if allowed and not any(project_path == d or project_path.startswith(d.rstrip(os.sep) + os.sep) for d in allowed):
+        return False
+    return os.path.exists(os.path.join(project_path, ".a2a", JOURNAL_DB_NAME))
+
+def _admin_allowed():
+    # Admin endpoints are open unless HOST_ADMIN_TOKEN is set
+    return not ADMIN_TOKEN or request.headers.get("Authorization") == f"Bearer {ADMIN_TOKEN}"
+
+def create_app(roles, base_url, prefixed=True):
+    """Flask app serving the given roles, each under /<role> if prefixed."""
+    app = Flask(__name__)
+
+    # Running and queued task runs per project
+    @app.get("/host/projects")
+    def get_project_stats():
+        async def stats():
+            return scheduler.stats()
+        return jsonify(run_on_host(stats()))
+
+    # Profile the next tasks or seconds: {"mode": "cprofile"|"sample", "tasks": n, "seconds": t} (see common/profiling.py)
+    @app.post("/host/profile")
+    def post_profile():
+        if not _admin_allowed():
+            return jsonify({"error": "Unauthorized"}), 401
+        options = request.get_json(silent=True) or {}
+        try:
+            return jsonify(start_profile(options.get("mode", "sample"), host_loop(), tasks=options.get("tasks"),
+                                         seconds=options.get("seconds")))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 409
+
+    # The running profile, or the summary and files of the last one
+    @app.get("/host/profile")
+    def get_profile():
+        if not _admin_allowed():
+            return jsonify({"error": "Unauthorized"}), 401
+        return jsonify(profile_status())
+
+    # Stop the running profile now and write its files
+    @app.delete("/host/profile")
+    def delete_profile():
+        if not _admin_allowed():
+            return jsonify({"error": "Unauthorized"}), 401
+        summary = stop_profile()
+        return jsonify(summary) if summary else (jsonify({"error": "No profile running"}), 404)
+
+    for role in roles:
+        url_prefix = f"/{role}" if prefixed else None
+        app.register_blueprint(role_blueprint(role, f"{base_url}/{role}" if prefixed else base_url, url_prefix))
+    return app
+
+def serve(roles, mode="ports", host="0.0.0.0", port=DEFAULT_HOST_PORT, profile=None):
+    """Serve roles from this process.
+
+    mode "ports" gives each role its own port from ROLES (the URLs the
+    clients use by default), mode "prefix" serves them all on one port
+    under /<role>. profile ({"mode", "tasks", "seconds"}) profiles the
+    first tasks or seconds, see common/profiling.py.
+    """
+    from werkzeug.serving import make_server
+
+    unknown = [role for role in roles if role not in ROLES]
+    if unknown:
+        raise ValueError(f"Unknown roles: {', '.join(unknown)}")
+
+    for role in roles:
+        agent_name = ROLES[role]["agent_name"]
+        log_message(f"File/terminal toolset: {toolset_for(role)}", agent_name)
+        log_prompt_size("System", system_prompt(role), agent_name)
+
+    if mode == "prefix":
+        servers = [(make_server(host, port, create_app(roles, f"http://localhost:{port}"), threaded=True),
+                    f"http://localhost:{port}/{{{','.join(roles)}}}")]
+    else:
+        servers = [(make_server(host, ROLES[role]["port"], create_app([role], f"http://localhost:{ROLES[role]['port']}", prefixed=False), threaded=True),
+                    f"http://localhost:{ROLES[role]['port']}")
+                   for role in roles]
+
+    if profile:
+        start_profile(profile["mode"], host_loop(), tasks=profile.get("tasks"), seconds=profile.get("seconds"))
+
+    threads = []
+    for server, url in servers:
+        log_message(f"Serving on {url}", "AgentHost")
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        threads.append(thread)
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        for server, _ in servers:
+            server.shutdown()
+        stop_profile()
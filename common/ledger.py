@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from common.logs import current_log_context, service_name
+from common.run_journal import RunJournal, COMPLETED, FAILED, CANCELED
+from common.tasks import parse_tasks, read_tasks_file
+
+# Usage ledger: every model run of the servers and clients (see run_stage in
+# common/models.py) is recorded in the project's .a2a/ledger.sqlite with its
+# task, role, stage and model, the requests, input/cached/output tokens and
+# tool calls it took, its latency and estimated cost, and a hash and preview
+# of its prompt. Runs stopped by their budget are recorded with what they
+# used until then. Report it with:
+#   python -m common.ledger <project> [<project>...] [--top N] [--json]
+LEDGER_DB_NAME = "ledger.sqlite"
+
+# Turn the ledger off (the event="stage" logs stay)
+USAGE_LEDGER = os.getenv("USAGE_LEDGER", "1").lower() in ("1", "true", "yes")
+
+# Characters of each prompt kept in the ledger, enough to recognize it in the report
+PROMPT_PREVIEW_CHARS = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS model_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    service TEXT,
+    task_id TEXT,
+    role TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    model TEXT NOT NULL,
+    status TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    tool_calls INTEGER NOT NULL DEFAULT 0,
+    tool_ms INTEGER NOT NULL DEFAULT 0,
+    latency_ms INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    prompt_hash TEXT,
+    prompt_chars INTEGER NOT NULL DEFAULT 0,
+    prompt_preview TEXT
+);
+CREATE INDEX IF NOT EXISTS model_runs_task ON model_runs (task_id);
+CREATE INDEX IF NOT EXISTS model_runs_role ON model_runs (role, ts);
+"""
+
+class UsageLedger:
+    """Token, tool-call and cost record of every model run on a project."""
+
+    def __init__(self, project_path):
+        self.project_path = project_path
+        self.db_file = os.path.join(project_path, ".a2a", LEDGER_DB_NAME)
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record(self, run):
+        """Add one model run, a dict with the model_runs columns."""
+        columns = ", ".join(run)
+        with self._connect() as conn:
+            conn.execute(f"INSERT INTO model_runs ({columns}) VALUES ({', '.join('?' * len(run))})",
+                         tuple(run.values()))
+
+    def runs(self, since=None):
+        """Return the recorded runs, oldest first, optionally from since (epoch seconds)."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM model_runs WHERE ts >= ? ORDER BY ts", (since or 0,)).fetchall()
+        return [dict(row) for row in rows]
+
+def usage_row(role, stage, model, seconds, usage, tools, prompt, status, cost):
+    """Ledger row for one model run, with the task and project of the current log context."""
+    context = current_log_context()
+    prompt = prompt if isinstance(prompt, str) else str(prompt)
+    return {
+        "ts": time.time(),
+        "service": service_name(),
+        "task_id": context.get("task_id"),
+        "role": role,
+        "stage": stage,
+        "model": model,
+        "status": status,
+        "requests": usage.requests if usage else 0,
+        "input_tokens": (usage.request_tokens or 0) if usage else 0,
+        "cached_tokens": (usage.details or {}).get("cached_tokens", 0) if usage else 0,
+        "output_tokens": (usage.response_tokens or 0) if usage else 0,
+        "tool_calls": tools["tool_calls"],
+        "tool_ms": tools["tool_ms"],
+        "latency_ms": round(seconds * 1000),
+        "cost": cost,
+        "prompt_hash": hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16],
+        "prompt_chars": len(prompt),
+        "prompt_preview": " ".join(prompt.split())[:PROMPT_PREVIEW_CHARS],
+    }
+
+async def record_model_run(role, stage, model, seconds, usage, tools, prompt, status=COMPLETED, cost=0.0):
+    """Record a model run in the ledger of the project it ran for (the log context's project).
+
+    Runs outside a project (no project in the log context) aren't recorded.
+    """
+    project_path = current_log_context().get("project")
+    if not USAGE_LEDGER or not project_path:
+        return
+    row = usage_row(role, stage, model, seconds, usage, tools, prompt, status, cost)
+    await asyncio.to_thread(lambda: UsageLedger(project_path).record(row))
+
+def _totals(runs):
+    totals = {"runs": len(runs), "failed": 0, "canceled": 0, "requests": 0, "input_tokens": 0, "cached_tokens": 0,
+              "output_tokens": 0, "tool_calls": 0, "latency_ms": 0, "cost": 0.0}
+    for run in runs:
+        for key in ("requests", "input_tokens", "cached_tokens", "output_tokens", "tool_calls", "latency_ms", "cost"):
+            totals[key] += run[key]
+        if run["status"] in (FAILED, CANCELED):
+            totals[run["status"]] += 1
+    return totals
+
+def usage_report(project_path, top=10, since=None):
+    """Aggregate a project's ledger.
+
+    Returns per-role totals with throughput (checklist items done per hour
+    of activity, output tokens per second of model time) and cost per
+    completed item, per role/stage/model totals, and the top most
+    expensive prompts.
+    """
+    runs = UsageLedger(project_path).runs(since)
+    done = {task["text"] for task in parse_tasks(read_tasks_file(project_path)) if task["done"]}
+    roles = []
+    for role in sorted({run["role"] for run in runs}):
+        role_runs = [run for run in runs if run["role"] == role]
+        totals = _totals(role_runs)
+        # Checklist items of the role's completed tasks that are checked in tasks.md
+        items = {item for record in RunJournal(project_path).tasks(role)
+                 if record["status"] == COMPLETED and record["created"] >= (since or 0)
+                 for item in record["items"] if item in done}
+        active_hours = (role_runs[-1]["ts"] - min(run["ts"] - run["latency_ms"] / 1000 for run in role_runs)) / 3600
+        totals.update(
+            role=role,
+            tasks=len({run["task_id"] for run in role_runs if run["task_id"]}),
+            items_done=len(items),
+            cost_per_item=totals["cost"] / len(items) if items else None,
+            items_per_hour=len(items) / active_hours if items and active_hours > 0 else None,
+            output_tokens_per_second=totals["output_tokens"] * 1000 / totals["latency_ms"] if totals["latency_ms"] else None,
+        )
+        roles.append(totals)
+
+    stages = {}
+    for run in runs:
+        stages.setdefault((run["role"], run["stage"], run["model"]), []).append(run)
+    by_stage = [dict(_totals(stage_runs), role=role, stage=stage, model=model)
+                for (role, stage, model), stage_runs in sorted(stages.items())]
+
+    prompts = {}
+    for run in runs:
+        prompts.setdefault(run["prompt_hash"], []).append(run)
+    by_prompt = []
+    for prompt_hash, prompt_runs in prompts.items():
+        totals = _totals(prompt_runs)
+        last = prompt_runs[-1]
+        by_prompt.append(dict(totals, prompt_hash=prompt_hash, role=last["role"], stage=last["stage"],
+                              task_id=last["task_id"], prompt_chars=last["prompt_chars"],
+                              prompt_preview=last["prompt_preview"]))
+    by_prompt.sort(key=lambda prompt: (prompt["cost"], prompt["input_tokens"] + prompt["output_tokens"]), reverse=True)
+
+    return {"project": project_path, "totals": _totals(runs), "roles": roles, "stages": by_stage,
+            "prompts": by_prompt[:top]}
+
+def _money(value):
+    return "-" if value is None else f"${value:.4f}"
+
+def _number(value, digits=1):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+def format_report(report):
+    """Plain text version of a usage_report."""
+    totals = report["totals"]
+    lines = [f"# {report['project']}",
+             f"{totals['runs']} model run(s) ({totals['failed']} failed, {totals['canceled']} stopped by budget), "
+             f"{totals['requests']} request(s), {totals['input_tokens']} input tokens ({totals['cached_tokens']} cached), "
+             f"{totals['output_tokens']} output tokens, {totals['tool_calls']} tool call(s), "
+             f"{totals['latency_ms'] / 1000:.0f}s of model time, {_money(totals['cost'])}", ""]
+    if not totals["runs"]:
+        return "\n".join(lines)
+
+    lines.append(f"{'role':<10} {'runs':>5} {'tasks':>5} {'items':>5} {'cost':>10} {'cost/item':>10} "
+                 f"{'items/h':>7} {'out tok/s':>9} {'tools':>6}")
+    for role in report["roles"]:
+        lines.append(f"{role['role']:<10} {role['runs']:>5} {role['tasks']:>5} {role['items_done']:>5} "
+                     f"{_money(role['cost']):>10} {_money(role['cost_per_item']):>10} "
+                     f"{_number(role['items_per_hour']):>7} {_number(role['output_tokens_per_second']):>9} "
+                     f"{role['tool_calls']:>6}")
+    lines.append("")
+
+    lines.append(f"{'role':<10} {'stage':<15} {'model':<25} {'runs':>5} {'input':>9} {'cached':>9} {'output':>8} "
+                 f"{'avg s':>6} {'cost':>10}")
+    for stage in report["stages"]:
+        lines.append(f"{stage['role']:<10} {stage['stage']:<15} {stage['model']:<25} {stage['runs']:>5} "
+                     f"{stage['input_tokens']:>9} {stage['cached_tokens']:>9} {stage['output_tokens']:>8} "
+                     f"{stage['latency_ms'] / 1000 / stage['runs']:>6.1f} {_money(stage['cost']):>10}")
+    lines.append("")
+
+    lines.append("Most expensive prompts:")
+    for prompt in report["prompts"]:
+        task = f", task {prompt['task_id']}" if prompt["task_id"] else ""
+        lines.append(f"  {_money(prompt['cost'])} {prompt['prompt_hash']} {prompt['role']}/{prompt['stage']}, "
+                     f"{prompt['runs']} run(s), {prompt['input_tokens']} input / {prompt['output_tokens']} output "
+                     f"tokens, {prompt['tool_calls']} tool call(s), {prompt['prompt_chars']} chars{task}")
+        lines.append(f"      {prompt['prompt_preview']}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report the token usage and cost recorded in projects' usage ledgers.")
+    parser.add_argument("projects", nargs="+", help="project paths")
+    parser.add_argument("--top", type=int, default=10, help="number of most expensive prompts to list")
+    parser.add_argument("--since", type=float, help="only runs of the last SINCE hours")
+    parser.add_argument("--json", action="store_true", help="print the reports as JSON")
+    args = parser.parse_args(argv)
+    since = time.time() - args.since * 3600 if args.since else None
+    reports = []
+    for project_path in args.projects:
+        if not os.path.exists(os.path.join(project_path, ".a2a", LEDGER_DB_NAME)):
+            print(f"No usage ledger in {project_path}", file=sys.stderr)
+            continue
+        reports.append(usage_report(project_path, top=args.top, since=since))
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print("\n\n".join(format_report(report) for report in reports))
+
+if __name__ == "__main__":
+    main()
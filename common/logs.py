@@ -0,0 +1,147 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# Logging for servers and clients. Records go through a queue to a listener
+# thread that does all the I/O, so callers (the host's event loop included)
+# never wait on the terminal or the disk. Each record carries the task id,
+# project and role of the task it was logged for (see log_context) plus any
+# fields passed to log_message, and is written:
+#   - to the terminal, as "[time] [agent] message" or as JSON (LOG_FORMAT=json)
+#   - as JSON lines to LOG_DIR/<service>.jsonl if LOG_DIR is set, rotated at
+#     LOG_MAX_BYTES with LOG_BACKUPS old files kept
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_DIR = os.getenv("LOG_DIR")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "5"))
+
+# Fraction of the events of each high-volume kind that are logged, e.g. "tool_call=0.1,stage=1"
+LOG_SAMPLE_RATES = {
+    kind.strip(): float(rate)
+    for kind, rate in (item.split("=", 1) for item in os.getenv("LOG_SAMPLE_RATES", "tool_call=0.1").split(",") if "=" in item)
+}
+
+# Record attributes of the logging module, everything else on a record is a field of ours
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_context = contextvars.ContextVar("log_context", default={})
+_logger = logging.getLogger("a2a")
+_listener = None
+_setup_lock = threading.Lock()
+
+def service_name():
+    """Name of this process in log files: agents/frontend/client.py -> frontend-client."""
+    script = os.path.abspath(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+    name = os.path.splitext(os.path.basename(script))[0] or "python"
+    if name in ("client", "server"):
+        return f"{os.path.basename(os.path.dirname(script))}-{name}"
+    return name
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the context and fields flattened in."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "service": service_name(),
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RESERVED})
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    """The classic "[2025-01-01 12:00:00] [agent] message" terminal format."""
+
+    def format(self, record):
+        prefix = f"[{datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S')}]"
+        if getattr(record, "agent", None):
+            prefix += f" [{record.agent}]"
+        return f"{prefix} {record.getMessage()}"
+
+def _handlers():
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    handlers = [console]
+    if LOG_DIR:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        log_file = logging.handlers.RotatingFileHandler(
+            os.path.join(LOG_DIR, f"{service_name()}.jsonl"), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+            encoding="utf-8")
+        log_file.setFormatter(JsonFormatter())
+        handlers.append(log_file)
+    return handlers
+
+def setup_logging():
+    """Start the background writer. Called on the first log, safe to call again."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        records = queue.SimpleQueue()
+        _logger.addHandler(logging.handlers.QueueHandler(records))
+        _logger.setLevel(LOG_LEVEL)
+        _logger.propagate = False
+        _listener = logging.handlers.QueueListener(records, *_handlers(), respect_handler_level=True)
+        _listener.start()
+        atexit.register(flush_logs)
+
+def flush_logs():
+    """Write out everything still queued and stop the writer."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            for handler in list(_logger.handlers):
+                _logger.removeHandler(handler)
+
+@contextmanager
+def log_context(**fields):
+    """Add fields (task_id, project, role...) to every record logged inside the block.
+
+    Contexts follow asyncio tasks and asyncio.to_thread, so a task's model
+    run and tools log with its fields too.
+    """
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+def bind_log_context(**fields):
+    """Add fields to the current log context, until the enclosing log_context ends."""
+    _context.set({**_context.get(), **fields})
+
+def current_log_context():
+    """The fields (task_id, project, role...) of the current log context."""
+    return dict(_context.get())
+
+def log(message, agent_name=None, level=logging.INFO, **fields):
+    """Queue a record with the current context and the given fields."""
+    if _listener is None:
+        setup_logging()
+    extra = {**_context.get(), **fields}
+    if agent_name:
+        extra["agent"] = agent_name
+    _logger.log(level, message, extra={key: value for key, value in extra.items() if key not in _RESERVED})
+
+def log_event(event, message, agent_name=None, **fields):
+    """Log a structured event, keeping only the sampled share of high-volume kinds."""
+    rate = LOG_SAMPLE_RATES.get(event, 1.0)
+    if rate < 1.0:
+        if random.random() >= rate:
+            return
+        fields["sample_rate"] = rate
+    log(message, agent_name, event=event, **fields)
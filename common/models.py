@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+
+from common.utils import log_message
+from common.tool_calls import timed_tools, log_tool_calls
+from common.ledger import record_model_run
+from common.run_journal import FAILED, CANCELED
+
+# Model routing is configured through environment variables (see .env.example):
+#
+#   MODEL_CHEAP / MODEL_DEFAULT / MODEL_STRONG   the three tiers
+#   MODEL_<STAGE>                                override for one stage, e.g. MODEL_ANALYSIS
+#   MODEL_<ROLE>_<STAGE>                         override for one role and stage, e.g. MODEL_BACKEND_IMPLEMENT
+#   MODEL_CASCADE=1                              implement with the cheap tier first and
+#                                                escalate to the strong tier if validation fails
+#                                                (not for stages with a model override)
+#
+# Local models can be used with the "ollama:<name>" prefix.
+CHEAP_MODEL = os.getenv("MODEL_CHEAP", "openai:gpt-4o-mini")
+DEFAULT_MODEL = os.getenv("MODEL_DEFAULT", "openai:gpt-4o-mini")
+STRONG_MODEL = os.getenv("MODEL_STRONG", "openai:gpt-4o")
+CASCADE_ENABLED = os.getenv("MODEL_CASCADE", "0").lower() in ("1", "true", "yes")
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1")
+
+# Which tier each stage uses unless overridden
+STAGE_TIERS = {
+    "analysis": "cheap",
+    "plan": "default",
+    "implement": "default",
+}
+
+# USD per million tokens: (input, cached input, output)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "o3-mini": (1.10, 0.55, 4.40),
+    "o4-mini": (1.10, 0.275, 4.40),
+}
+
+_tiers = {"cheap": CHEAP_MODEL, "default": DEFAULT_MODEL, "strong": STRONG_MODEL}
+_resolved = {}
+_providers = {}
+_lock = threading.Lock()
+
+def model_override(role, stage):
+    """Return the MODEL_<ROLE>_<STAGE> or MODEL_<STAGE> model set for a role and stage, or None."""
+    for key in (f"MODEL_{role}_{stage}".upper(), f"MODEL_{stage}".upper()):
+        if os.getenv(key):
+            return os.getenv(key)
+    return None
+
+def model_name(role, stage):
+    """Return the configured model name for a role and stage."""
+    return model_override(role, stage) or _tiers[STAGE_TIERS.get(stage, "default")]
+
+def resolve_model(name):
+    """Turn a configured model name into something Agent.run accepts.
+
+    OpenAI and Ollama models are built once per process on one provider per
+    base URL, so every agent in a process shares the same API client.
+    """
+    provider_name, _, model = name.partition(":")
+    if provider_name not in ("openai", "ollama"):
+        return name
+    with _lock:
+        if name not in _resolved:
+            from pydantic_ai.models.openai import OpenAIModel
+            from pydantic_ai.providers.openai import OpenAIProvider
+            base_url = OLLAMA_BASE_URL if provider_name == "ollama" else None
+            if base_url not in _providers:
+                _providers[base_url] = OpenAIProvider(base_url=base_url)
+            _resolved[name] = OpenAIModel(model, provider=_providers[base_url])
+        return _resolved[name]
+
+def model_for(role, stage):
+    """Return the model to use for a role and stage."""
+    return resolve_model(model_name(role, stage))
+
+def estimate_cost(name, usage):
+    """Estimate the USD cost of a run from its usage. Unknown and local models cost 0."""
+    prices = MODEL_PRICES.get(name.split(":", 1)[-1])
+    if prices is None or name.startswith("ollama:"):
+        return 0.0
+    input_price, cached_price, output_price = prices
+    cached = (usage.details or {}).get('cached_tokens', 0)
+    uncached = max((usage.request_tokens or 0) - cached, 0)
+    return (uncached * input_price + cached * cached_price + (usage.response_tokens or 0) * output_price) / 1_000_000
+
+def record_stage(role, stage, name, seconds, usage):
+    """Log latency and cost of one stage run. Returns the cost."""
+    cost = estimate_cost(name, usage)
+    log_message(f"Stage {stage} on {name}: {seconds:.1f}s, {usage.total_tokens or 0} tokens, ${cost:.4f}", role,
+                event="stage", stage=stage, model=name, duration_ms=round(seconds * 1000),
+                tokens=usage.total_tokens or 0, cost=round(cost, 6))
+    return cost
+
+async def run_stage(agent, role, stage, prompt, model=None, budget=None, **kwargs):
+    """Run an agent on the model routed for (role, stage), recording latency and cost.
+
+    With a TaskBudget the run is stopped at its deadline or token/tool-call limit.
+    Every run, also a failed one, is added to the project's usage ledger.
+    """
+    name = model or model_name(role, stage)
+    started = time.perf_counter()
+    try:
+        with timed_tools(role) as tools:
+            if budget is not None:
+                from common.budget import run_within_budget
+                result = await run_within_budget(agent, prompt, budget, model=resolve_model(name), **kwargs)
+            else:
+                result = await agent.run(prompt, model=resolve_model(name), **kwargs)
+    except Exception as e:
+        from common.budget import BudgetExceeded
+        # A run stopped by its budget carries what it used until then
+        usage = getattr(e, "usage", None)
+        tools = dict(tools.summary(), tool_calls=log_tool_calls(getattr(e, "new_messages", [])))
+        await record_model_run(role, stage, name, time.perf_counter() - started, usage, tools, prompt,
+                               status=CANCELED if isinstance(e, BudgetExceeded) else FAILED,
+                               cost=estimate_cost(name, usage) if usage is not None else 0.0)
+        raise
+    seconds = time.perf_counter() - started
+    cost = record_stage(role, stage, name, seconds, result.usage())
+    # Counted from the messages, the timer only sees the project-scoped tools
+    tools = dict(tools.summary(), tool_calls=log_tool_calls(result.new_messages()))
+    await record_model_run(role, stage, name, seconds, result.usage(), tools, prompt, cost=cost)
+    return result
+
+ESCALATION_NOTE = """A previous attempt with a smaller model did not pass validation:
+{reason}
+Check the current state of the files, fix anything that is wrong and finish the remaining tasks."""
+
+async def run_cascade(agent, role, stage, prompt, validate, **kwargs):
+    """Run a stage with the cheap model first and escalate to the strong one if needed.
+
+    validate(result) returns None when the result is acceptable, or a short
+    reason why it isn't. Without MODEL_CASCADE, or with a model set for the
+    role and stage (see model_override), this is a plain run_stage.
+    A budget passed in kwargs covers both attempts.
+    Returns the final result and the list of models that were tried.
+    """
+    if not CASCADE_ENABLED or model_override(role, stage):
+        return await run_stage(agent, role, stage, prompt, **kwargs), [model_name(role, stage)]
+    result = await run_stage(agent, role, stage, prompt, model=CHEAP_MODEL, **kwargs)
+    reason = validate(result)
+    if reason is None:
+        return result, [CHEAP_MODEL]
+    log_message(f"Escalating {stage} to {STRONG_MODEL}: {reason}", role)
+    # The strong model continues from the cheap attempt so it can see what was already done; the
+    # task prompt is already in that history, so only the note is sent (and paid for) again
+    kwargs["message_history"] = result.all_messages()
+    escalated = await run_stage(agent, role, stage, ESCALATION_NOTE.format(reason=reason), model=STRONG_MODEL, **kwargs)
+    return escalated, [CHEAP_MODEL, STRONG_MODEL]
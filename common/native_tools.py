@@ -0,0 +1,330 @@
+import asyncio
+import fnmatch
+import json
+import os
+import re
+import shlex
+import threading
+
+from common.context_pack import IGNORED_DIRS
+from common.tool_calls import ordered_tool
+
+# In-process equivalents of the Desktop Commander operations the agents use
+# most. Tool names and arguments mirror Desktop Commander, so prompts and the
+# run journal work the same with either toolset.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Select per role with TOOLSET_<ROLE>=native|mcp, or for every role with TOOLSET
+DEFAULT_TOOLSET = os.getenv("TOOLSET", "mcp")
+
+SHELL_WORKERS = int(os.getenv("NATIVE_SHELL_WORKERS", "4"))
+DEFAULT_COMMAND_TIMEOUT = 120
+MAX_OUTPUT_CHARS = 20000
+MAX_SEARCH_RESULTS = 200
+
+# Where one shell command ends and another starts: lists, pipelines, background
+# jobs, newlines, subshells and command substitutions
+COMMAND_SEPARATOR_PATTERN = re.compile(r'\|\||&&|\$\(|[;|&\n`()]')
+
+# Commands that run the command given in their arguments
+SHELLS = {"sh", "bash", "zsh", "dash", "ksh"}
+COMMAND_WRAPPERS = {"env", "nohup", "exec", "command", "time", "nice", "xargs", "timeout", "stdbuf"}
+
+_policy = None
+_policy_lock = threading.Lock()
+_shell_slots = {}
+
+def toolset_for(role):
+    """Return "native" or "mcp" for a role."""
+    return os.getenv(f"TOOLSET_{role.upper()}", DEFAULT_TOOLSET).lower()
+
+def load_policy():
+    """Load allowedDirectories/blockedCommands from config.json (or config.example.json)."""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            config_file = os.getenv("TOOL_CONFIG")
+            if not config_file:
+                config_file = os.path.join(REPO_ROOT, "config.json")
+                if not os.path.exists(config_file):
+                    config_file = os.path.join(REPO_ROOT, "config.example.json")
+            with open(config_file, 'r') as f:
+                config = json.load(f)
+            _policy = {
+                "allowed": [os.path.realpath(os.path.expanduser(d)) for d in config.get("allowedDirectories", [])],
+                "blocked": config.get("blockedCommands", []),
+                "shell": config.get("defaultShell", "/bin/sh"),
+            }
+        return _policy
+
+def _resolve(ctx, path):
+    """Resolve a path against the project and check it against allowedDirectories."""
+    path = os.path.expanduser(path)
+    if not os.path.isabs(path):
+        path = os.path.join(ctx.deps, path)
+    real = os.path.realpath(path)
+    allowed = load_policy()["allowed"]
+    if allowed and not any(real == d or real.startswith(d.rstrip(os.sep) + os.sep) for d in allowed):
+        raise PermissionError(f"Access denied: {path} is outside the allowed directories")
+    return real
+
+def _short_flags(words):
+    return {flag for word in words if re.match(r'^-[A-Za-z]+$', word) for flag in word[1:]}
+
+def _matches_blocked(words, blocked_words):
+    # rm -fr x and rm -r -f x match "rm -rf": short flags are compared as a set
+    if os.path.basename(words[0]) != blocked_words[0]:
+        return False
+    flags = _short_flags(words[1:])
+    for word in blocked_words[1:]:
+        if re.match(r'^-[A-Za-z]+$', word):
+            if not set(word[1:]) <= flags:
+                return False
+        elif word not in words[1:]:
+            return False
+    return True
+
+def blocked_command(command):
+    """Return the blockedCommands entry a command violates, or None.
+
+    A best-effort guard against the model running what the policy forbids,
+    not a sandbox: every command of a list, pipeline, subshell or command
+    substitution is checked, also behind sh -c, env and similar wrappers,
+    but a shell offers endless other ways (aliases, scripts, variables)
+    around a list of names.
+    """
+    for segment in COMMAND_SEPARATOR_PATTERN.split(command):
+        try:
+            words = shlex.split(segment)
+        except ValueError:
+            words = segment.split()
+        # Leading VAR=value assignments aren't the command
+        while words and re.match(r'^[A-Za-z_][A-Za-z0-9_]*=', words[0]):
+            words = words[1:]
+        if not words:
+            continue
+        for blocked in load_policy()["blocked"]:
+            if blocked.split() and _matches_blocked(words, blocked.split()):
+                return blocked
+        name = os.path.basename(words[0])
+        if name in SHELLS and "-c" in words[1:-1]:
+            inner = blocked_command(words[words.index("-c") + 1])
+        elif name in COMMAND_WRAPPERS:
+            # Where the wrapped command starts depends on the wrapper's options, try every word
+            inner = next(filter(None, (blocked_command(shlex.join(words[i:])) for i in range(1, len(words)))), None)
+        else:
+            inner = None
+        if inner:
+            return inner
+    return None
+
+def _error(e):
+    return f"Error: {e}"
+
+def _read_file(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+def _write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_file, path)
+    except OSError:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+async def read_file(ctx, path: str) -> str:
+    """Read the complete contents of a file.
+
+    Args:
+        path: Absolute path, or a path relative to the project directory.
+    """
+    try:
+        return await asyncio.to_thread(_read_file, _resolve(ctx, path))
+    except Exception as e:
+        return _error(e)
+
+async def read_multiple_files(ctx, paths: list[str]) -> str:
+    """Read several files at once. Each file's content is preceded by its path.
+
+    Args:
+        paths: Absolute paths, or paths relative to the project directory.
+    """
+    async def read_one(path):
+        try:
+            return f"{path}:\n{await asyncio.to_thread(_read_file, _resolve(ctx, path))}"
+        except Exception as e:
+            return f"{path}: {_error(e)}"
+    return "\n---\n".join(await asyncio.gather(*(read_one(path) for path in paths)))
+
+async def write_file(ctx, path: str, content: str) -> str:
+    """Create a new file or completely overwrite an existing one.
+
+    Args:
+        path: Absolute path, or a path relative to the project directory.
+        content: The full new content of the file.
+    """
+    try:
+        await asyncio.to_thread(_write_file, _resolve(ctx, path), content)
+        return f"Successfully wrote to {path}"
+    except Exception as e:
+        return _error(e)
+
+def _edit_block(path, old_string, new_string, expected_replacements):
+    content = _read_file(path)
+    count = content.count(old_string)
+    if count == 0:
+        return f"Error: the text to replace was not found in {path}"
+    if count != expected_replacements:
+        return f"Error: expected {expected_replacements} occurrence(s) but found {count} in {path}"
+    _write_file(path, content.replace(old_string, new_string))
+    return f"Successfully applied {count} edit(s) to {path}"
+
+async def edit_block(ctx, file_path: str, old_string: str, new_string: str, expected_replacements: int = 1) -> str:
+    """Replace a block of text in a file, for small targeted edits.
+
+    Args:
+        file_path: Absolute path, or a path relative to the project directory.
+        old_string: The exact text to replace.
+        new_string: The replacement text.
+        expected_replacements: How many occurrences of old_string must be replaced.
+    """
+    try:
+        return await asyncio.to_thread(_edit_block, _resolve(ctx, file_path), old_string, new_string, expected_replacements)
+    except Exception as e:
+        return _error(e)
+
+def _list_directory(path):
+    entries = []
+    for entry in sorted(os.scandir(path), key=lambda e: e.name):
+        entries.append(f"[DIR] {entry.name}" if entry.is_dir() else f"[FILE] {entry.name}")
+    return "\n".join(entries) or "(empty directory)"
+
+async def list_directory(ctx, path: str) -> str:
+    """List the files and directories in a directory.
+
+    Args:
+        path: Absolute path, or a path relative to the project directory.
+    """
+    try:
+        return await asyncio.to_thread(_list_directory, _resolve(ctx, path))
+    except Exception as e:
+        return _error(e)
+
+async def create_directory(ctx, path: str) -> str:
+    """Create a directory, including any missing parent directories.
+
+    Args:
+        path: Absolute path, or a path relative to the project directory.
+    """
+    try:
+        await asyncio.to_thread(os.makedirs, _resolve(ctx, path), exist_ok=True)
+        return f"Successfully created directory {path}"
+    except Exception as e:
+        return _error(e)
+
+async def move_file(ctx, source: str, destination: str) -> str:
+    """Move or rename a file or directory.
+
+    Args:
+        source: Absolute path, or a path relative to the project directory.
+        destination: Absolute path, or a path relative to the project directory.
+    """
+    try:
+        await asyncio.to_thread(os.replace, _resolve(ctx, source), _resolve(ctx, destination))
+        return f"Successfully moved {source} to {destination}"
+    except Exception as e:
+        return _error(e)
+
+def _search_files(root, pattern):
+    matches = []
+    glob = pattern if any(c in pattern for c in "*?[") else f"*{pattern}*"
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+        for name in dirs + files:
+            if fnmatch.fnmatch(name.lower(), glob.lower()):
+                matches.append(os.path.join(directory, name))
+                if len(matches) >= MAX_SEARCH_RESULTS:
+                    return "\n".join(matches + ["... (truncated)"])
+    return "\n".join(matches) or "No matches found"
+
+async def search_files(ctx, path: str, pattern: str) -> str:
+    """Find files and directories whose name matches a pattern (substring or glob).
+
+    Args:
+        path: Directory to search in.
+        pattern: Part of the name, or a glob such as "*.test.js".
+    """
+    try:
+        return await asyncio.to_thread(_search_files, _resolve(ctx, path), pattern)
+    except Exception as e:
+        return _error(e)
+
+async def get_file_info(ctx, path: str) -> str:
+    """Get size, type and modification time of a file or directory.
+
+    Args:
+        path: Absolute path, or a path relative to the project directory.
+    """
+    try:
+        path = _resolve(ctx, path)
+        stat = await asyncio.to_thread(os.stat, path)
+        kind = "directory" if os.path.isdir(path) else "file"
+        return f"type: {kind}\nsize: {stat.st_size}\nmodified: {stat.st_mtime}"
+    except Exception as e:
+        return _error(e)
+
+def _shell_slot():
+    # Semaphores are bound to the event loop they are used on
+    loop = asyncio.get_running_loop()
+    if loop not in _shell_slots:
+        _shell_slots[loop] = asyncio.Semaphore(SHELL_WORKERS)
+    return _shell_slots[loop]
+
+async def execute_command(ctx, command: str, timeout_seconds: int = DEFAULT_COMMAND_TIMEOUT) -> str:
+    """Run a shell command in the project directory and return its output.
+
+    Args:
+        command: The command line to run.
+        timeout_seconds: Kill the command if it runs longer than this.
+    """
+    blocked = blocked_command(command)
+    if blocked:
+        return f"Error: command blocked by policy ({blocked})"
+    try:
+        cwd = _resolve(ctx, ctx.deps)
+    except PermissionError as e:
+        return _error(e)
+    async with _shell_slot():
+        process = await asyncio.create_subprocess_exec(
+            load_policy()["shell"], "-c", command, cwd=cwd,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        )
+        try:
+            output, _ = await asyncio.wait_for(process.communicate(), timeout_seconds)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return f"Error: command timed out after {timeout_seconds}s"
+    text = output.decode('utf-8', errors='replace')
+    if len(text) > MAX_OUTPUT_CHARS:
+        text = text[:MAX_OUTPUT_CHARS // 2] + "\n... (output truncated) ...\n" + text[-MAX_OUTPUT_CHARS // 2:]
+    return f"exit code: {process.returncode}\n{text}"
+
+NATIVE_TOOLS = [
+    read_file, read_multiple_files, write_file, edit_block, list_directory,
+    create_directory, move_file, search_files, get_file_info, execute_command,
+]
+
+def register_native_tools(agent):
+    """Register the native filesystem/shell tools on an agent whose deps are the project path.
+
+    Calls on the same path run in the order the model made them (see common/tool_calls.py).
+    """
+    for tool in NATIVE_TOOLS:
+        agent.tool(ordered_tool(tool))
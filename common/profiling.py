@@ -0,0 +1,289 @@
+import asyncio
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from common.utils import log_message
+from common.logs import service_name
+
+# On-demand profiling of an agent server for its next N tasks or T seconds,
+# started from POST /host/profile or agents/host.py --profile:
+#   - "cprofile" profiles the request threads of the tasks and the host's
+#     event loop thread, written as a .pstats file (snakeviz, flameprof,
+#     gprof2dot)
+#   - "sample" takes the stack of every thread each PROFILE_SAMPLE_INTERVAL
+#     seconds, written as collapsed stacks (flamegraph.pl, speedscope)
+# Both also run the event loop lag monitor, which reports whatever keeps the
+# host loop from running for more than PROFILE_LAG_THRESHOLD seconds (a sync
+# HTTP call, a print to a blocked terminal) with its stack. Files go to
+# PROFILE_DIR. Without a profile running, each task pays one check.
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MODES = ("cprofile", "sample")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_LAG_THRESHOLD = float(os.getenv("PROFILE_LAG_THRESHOLD", "0.1"))
+
+# Keep the lag monitor on even without a profile (it wakes the loop every PROFILE_LAG_THRESHOLD / 2)
+PROFILE_LOOP_LAG = os.getenv("PROFILE_LOOP_LAG", "0").lower() in ("1", "true", "yes")
+
+# Frames kept of the stack of a blocked loop, and lag reports kept per profile
+MAX_STACK_FRAMES = 20
+MAX_LAG_REPORTS = 50
+
+_session = None
+_session_lock = threading.Lock()
+_last_summary = None
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _stack(frame):
+    """Frames of a stack, outermost first."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    return frames[::-1]
+
+class LoopLagMonitor:
+    """Reports the times an event loop is blocked for longer than a threshold.
+
+    A callback on the loop stamps a heartbeat every threshold / 2; a watchdog
+    thread that sees the heartbeat go stale grabs the loop thread's stack,
+    which is the code blocking it, and reports it when the loop runs again.
+    """
+
+    def __init__(self, loop, threshold=PROFILE_LAG_THRESHOLD):
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = threshold / 2
+        self.reports = []
+        self._loop_thread = None
+        self._last_beat = time.monotonic()
+        self._stopped = threading.Event()
+        self._handle = None
+        self._thread = None
+
+    def start(self):
+        self.loop.call_soon_threadsafe(self._beat)
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        if self._handle is not None:
+            self.loop.call_soon_threadsafe(self._handle.cancel)
+
+    def _beat(self):
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        if not self._stopped.is_set():
+            self._handle = self.loop.call_later(self.interval, self._beat)
+
+    def _watch(self):
+        stall = None
+        while not self._stopped.wait(self.interval / 2):
+            lag = time.monotonic() - self._last_beat - self.interval
+            if lag > self.threshold:
+                if stall is None:
+                    frame = sys._current_frames().get(self._loop_thread)
+                    stall = {"stack": traceback.format_list(traceback.extract_stack(frame)[-MAX_STACK_FRAMES:])
+                             if frame is not None else []}
+                stall["seconds"] = round(lag, 3)
+            elif stall is not None:
+                self._report(stall)
+                stall = None
+        if stall is not None:
+            self._report(stall)
+
+    def _report(self, stall):
+        if len(self.reports) < MAX_LAG_REPORTS:
+            self.reports.append(stall)
+        where = stall["stack"][-1].strip().splitlines()[0] if stall["stack"] else "unknown"
+        log_message(f"Event loop blocked for {stall['seconds']:.2f}s at {where}", "AgentHost", event="loop_lag",
+                    seconds=stall["seconds"], stack="".join(stall["stack"]))
+
+class StackSampler:
+    """Samples the stacks of all threads at an interval, counting them as collapsed stacks."""
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels = [names.get(ident, str(ident))] + [_frame_label(f) for f in _stack(frame)]
+                self.counts[";".join(label.replace(";", ",") for label in labels)] += 1
+            self.samples += 1
+
+    def write(self, path):
+        """Write the samples in the collapsed "frame;frame;frame count" format of flame graph tools."""
+        with open(path, 'w') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+class ProfileSession:
+    """One profile of a server, over its next N tasks, the next T seconds, or until stopped."""
+
+    def __init__(self, mode, loop, tasks=None, seconds=None):
+        self.mode = mode
+        self.loop = loop
+        self.tasks = tasks
+        self.seconds = seconds
+        self.started = time.time()
+        self.tasks_started = 0
+        self.tasks_finished = 0
+        self.task_profiles = []
+        self.loop_profile = None
+        self.sampler = None
+        self.lag_monitor = LoopLagMonitor(loop)
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def start(self):
+        if self.mode == "cprofile":
+            # A profiler only sees the thread it was enabled on
+            self.loop_profile = cProfile.Profile()
+            self.loop.call_soon_threadsafe(self.loop_profile.enable)
+        else:
+            self.sampler = StackSampler().start()
+        self.lag_monitor.start()
+        if self.seconds:
+            self._timer = threading.Timer(self.seconds, stop_profile)
+            self._timer.daemon = True
+            self._timer.start()
+
+    @contextmanager
+    def task(self):
+        """Profile one task handled in the calling thread, if the session still takes tasks."""
+        with self._lock:
+            counted = self.tasks is None or self.tasks_started < self.tasks
+            if counted:
+                self.tasks_started += 1
+        profile = cProfile.Profile() if counted and self.mode == "cprofile" else None
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+ allows a single active profiler, the loop thread's
+                profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            if counted:
+                with self._lock:
+                    if profile is not None:
+                        self.task_profiles.append(profile)
+                    self.tasks_finished += 1
+                    done = self.tasks is not None and self.tasks_finished >= self.tasks
+                if done:
+                    threading.Thread(target=stop_profile, daemon=True).start()
+
+    def stop(self):
+        """Stop profiling and write the output files. Returns the session summary."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self.lag_monitor.stop()
+        base = os.path.join(PROFILE_DIR, f"{service_name()}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{self.mode}")
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        files = []
+        if self.loop_profile is not None:
+            async def disable():
+                self.loop_profile.disable()
+            asyncio.run_coroutine_threadsafe(disable(), self.loop).result(timeout=10)
+            stats = pstats.Stats(self.loop_profile)
+            for profile in self.task_profiles:
+                stats.add(profile)
+            stats.dump_stats(f"{base}.pstats")
+            files.append(f"{base}.pstats")
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler.write(f"{base}.folded")
+            files.append(f"{base}.folded")
+        summary = self.status()
+        summary.update(files=files, loop_lag=self.lag_monitor.reports)
+        with open(f"{base}.json", 'w') as f:
+            json.dump(summary, f, indent=2)
+        files.append(f"{base}.json")
+        log_message(f"Profile finished after {summary['elapsed']:.0f}s and {self.tasks_finished} task(s), "
+                    f"{len(self.lag_monitor.reports)} loop stall(s): {', '.join(files)}", "AgentHost", event="profile",
+                    mode=self.mode, tasks=self.tasks_finished, stalls=len(self.lag_monitor.reports), files=files)
+        return summary
+
+    def status(self):
+        return {"mode": self.mode, "running": True, "tasks": self.tasks, "seconds": self.seconds,
+                "tasks_profiled": self.tasks_finished, "elapsed": round(time.time() - self.started, 1),
+                "samples": self.sampler.samples if self.sampler else None}
+
+def start_profile(mode, loop, tasks=None, seconds=None):
+    """Start profiling the next tasks tasks and/or seconds seconds. Returns its status.
+
+    Raises ValueError for an unknown mode or while another profile is running.
+    """
+    global _session
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode '{mode}', use one of: {', '.join(PROFILE_MODES)}")
+    with _session_lock:
+        if _session is not None:
+            raise ValueError("A profile is already running")
+        _session = ProfileSession(mode, loop, tasks=tasks, seconds=seconds)
+        _session.start()
+    log_message(f"Profiling ({mode}) the next {f'{tasks} task(s)' if tasks else ''}"
+                f"{' or ' if tasks and seconds else ''}{f'{seconds:g}s' if seconds else ''}"
+                f"{'' if tasks or seconds else 'tasks until stopped'}", "AgentHost")
+    return _session.status()
+
+def stop_profile():
+    """Stop the running profile and write its files. Returns its summary, or None if none was running."""
+    global _session, _last_summary
+    with _session_lock:
+        session, _session = _session, None
+    if session is None:
+        return None
+    _last_summary = dict(session.stop(), running=False)
+    return _last_summary
+
+def profile_status():
+    """Status of the running profile, or the summary of the last one."""
+    session = _session
+    if session is not None:
+        return session.status()
+    return _last_summary or {"running": False}
+
+@contextmanager
+def profiled_task():
+    """Profile the task handled inside the block if a profile is running."""
+    session = _session
+    if session is None:
+        yield
+        return
+    with session.task():
+        yield
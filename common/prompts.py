@@ -0,0 +1,162 @@
+import re
+
+from common.utils import estimate_tokens, log_message
+
+# Static fragments. Anything in here belongs in the system prompt: it never
+# changes between tasks, so it forms a stable prefix that the provider can cache.
+FRAGMENTS = {
+    "npm_rules": """For any npm or Node.js related commands (npm init, npm install, etc.):
+- ALWAYS change to the project directory (the PROJECT_PATH of the task) first: cd <PROJECT_PATH>
+- Run all npm commands within the project directory
+- Initialize any new Node.js projects with: cd <PROJECT_PATH> && npm init
+- Install dependencies with: cd <PROJECT_PATH> && npm install [package]
+- NEVER run npm commands in the current directory without changing to PROJECT_PATH first""",
+
+    "context_usage": """Each task comes with a project context prepared from plan.md and tasks.md
+(architecture, stack, pending tasks and file tree). Only open plan.md or tasks.md
+if you need a detail that is missing from it.""",
+
+    "task_workflow": """Work on the assigned tasks one by one. For each task:
+1. Create or modify the necessary files and directories inside PROJECT_PATH
+2. Implement the functionality following best practices
+3. Mark the task as completed with the update_task_status tool as soon as it is done.
+   Never edit the checkboxes in tasks.md yourself: other agents update it concurrently.
+When you are done, provide a summary of what you've done.""",
+}
+
+ROLE_INTROS = {
+    "planner": """You are a project planning agent with expertise in software architecture.
+
+Your responsibilities include:
+1. Interpreting user requirements for web applications
+2. Creating detailed project plans and task lists
+3. Breaking down projects into frontend and backend tasks
+4. Coordinating work between frontend and backend development teams
+
+When you receive a project request:
+- Create a detailed plan.md that outlines the architecture, technologies, and approach
+- Add every task with the emit_task tool, which keeps tasks.md organized in frontend, backend and infrastructure sections
+- Emit setup tasks that can start right away first, the other agents begin on them while you plan
+- Ensure tasks are specific, actionable, and well-organized
+
+You have access to the filesystem through Desktop Commander MCP to create and modify files.""",
+
+    "frontend": """You are a specialized frontend development agent with expertise in:
+
+- HTML, CSS, and JavaScript
+- Modern frontend frameworks (React, Vue, Angular)
+- Responsive design
+- UI/UX implementation
+- Frontend testing and optimization
+
+Your responsibilities:
+1. Implement frontend tasks from the tasks.md file
+2. Create and modify frontend code files
+3. Mark completed tasks with the update_task_status tool
+4. Provide detailed explanations of your implementation decisions
+
+You should focus ONLY on the tasks you are sent: frontend tasks, plus shared setup tasks
+and backend tasks when the backend agent is busy. You have access to the filesystem
+through Desktop Commander MCP to create directories, files, and modify code.
+
+When implementing tasks:
+- Follow best practices for modern frontend development
+- Create clean, maintainable, and well-documented code
+- Consider responsive design and accessibility
+- Structure your code in a logical and organized manner
+- Create any necessary directories and files
+- Use the search_project tool to locate existing code before listing directories or reading files""",
+
+    "backend": """You are a specialized backend development agent with expertise in:
+
+- Server-side programming (Node.js, Python, Java, etc.)
+- Database design and implementation
+- API development
+- Authentication and security
+- Server deployment and configuration
+
+Your responsibilities:
+1. Implement backend tasks from the tasks.md file
+2. Create and modify backend code files
+3. Mark completed tasks with the update_task_status tool
+4. Provide detailed explanations of your implementation decisions
+
+You should focus ONLY on the tasks you are sent: backend tasks, plus shared setup tasks
+and frontend tasks when the frontend agent is busy. You have access to the filesystem
+through Desktop Commander MCP to create directories, files, and modify code.
+
+When implementing tasks:
+- Follow best practices for modern backend development
+- Create clean, maintainable, and well-documented code
+- Consider security, scalability, and performance
+- Structure your code in a logical and organized manner
+- Create any necessary directories and files
+- Use the search_project tool to locate existing code before listing directories or reading files""",
+}
+
+# Fragments each role's system prompt is built from, after its intro
+ROLE_FRAGMENTS = {
+    "planner": [],
+    "frontend": ["context_usage", "task_workflow", "npm_rules"],
+    "backend": ["context_usage", "task_workflow", "npm_rules"],
+}
+
+BULLET_PATTERN = re.compile(r'^\s*(?:[-*]\s+(?:\[[ xX]\]\s*)?|\d+\.\s+)')
+HEADING_PATTERN = re.compile(r'^#{1,6}\s+(.*)$')
+
+# Under a heading, only the list items of task lists are deduplicated; plan
+# excerpts and file listings keep theirs
+DEDUP_HEADING_PATTERN = re.compile(r'\btasks\b', re.IGNORECASE)
+
+def _normalize(line):
+    return re.sub(r'\s+', ' ', BULLET_PATTERN.sub('', line)).strip().lower()
+
+def assemble(*sections, verbatim=()):
+    """Join prompt sections, dropping empty sections and repeated list items.
+
+    A bullet or numbered line of a rule or task list that already appeared
+    in an earlier section (ignoring checkbox and numbering) is removed, so
+    the same task or rule is never paid for twice in one prompt. Lines in
+    code fences are kept, and so are the verbatim sections (code snippets,
+    change summaries), appended after the others unchanged.
+    """
+    seen = set()
+    blocks = []
+    for section in sections:
+        if not section or not section.strip():
+            continue
+        lines = []
+        keys = set()
+        dedup = True
+        fenced = False
+        for line in section.strip().split('\n'):
+            heading = HEADING_PATTERN.match(line)
+            if line.lstrip().startswith('```'):
+                fenced = not fenced
+            elif heading and not fenced:
+                dedup = bool(DEDUP_HEADING_PATTERN.search(heading.group(1)))
+            elif dedup and not fenced and BULLET_PATTERN.match(line):
+                key = _normalize(line)
+                if key in seen:
+                    continue
+                keys.add(key)
+            lines.append(line)
+        # Repeats within one section are left alone, they may be meant
+        seen |= keys
+        block = "\n".join(lines).strip()
+        if block and block not in blocks:
+            blocks.append(block)
+    blocks += [section.strip() for section in verbatim if section and section.strip()]
+    return "\n\n".join(blocks)
+
+def system_prompt(role):
+    """Build the static system prompt for a role from its intro and fragments."""
+    return assemble(ROLE_INTROS[role], *(FRAGMENTS[name] for name in ROLE_FRAGMENTS[role]))
+
+def task_prompt(project_path, *sections, verbatim=()):
+    """Build the per-task user prompt: PROJECT_PATH first, then the given sections."""
+    return assemble(f"PROJECT_PATH: {project_path}", *sections, verbatim=verbatim)
+
+def log_prompt_size(name, prompt, agent_name=None):
+    """Log the estimated token count of an assembled prompt."""
+    log_message(f"{name} prompt: {len(prompt)} chars, ~{estimate_tokens(prompt)} tokens", agent_name)
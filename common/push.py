@@ -0,0 +1,203 @@
+import hashlib
+import hmac
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+import zlib
+
+import requests
+
+from common.utils import log_message
+
+# A2A push notifications. A task sent with
+#   "pushNotification": {"url": <callback>, "token": <secret>}
+# is accepted right away and its status transitions (working, then the final
+# completed/canceled/failed status with the reply) and artifact events are
+# POSTed to the callback instead of being returned on the open request.
+# Every POST is signed with HMAC-SHA256 over "<timestamp>.<body>" keyed by the
+# task's token, so the token itself never travels with the notifications.
+
+# Delivery attempts per notification, with exponential backoff starting at PUSH_RETRY_DELAY seconds
+PUSH_MAX_ATTEMPTS = int(os.getenv("PUSH_MAX_ATTEMPTS", "5"))
+PUSH_RETRY_DELAY = float(os.getenv("PUSH_RETRY_DELAY", "1"))
+PUSH_TIMEOUT = 10
+
+# Delivery threads. Notifications of one task always go through the same one, in order
+PUSH_WORKERS = int(os.getenv("PUSH_WORKERS", "4"))
+
+# Notifications older than this (seconds) are rejected by the receiver, against replays
+MAX_SIGNATURE_AGE = 300
+
+# Local receiver for the clients: port to listen on (0 picks a free one) and the
+# host the agents reach it at. Push notifications are off while unset.
+PUSH_RECEIVER_PORT = os.getenv("PUSH_RECEIVER_PORT")
+PUSH_RECEIVER_HOST = os.getenv("PUSH_RECEIVER_HOST", "127.0.0.1")
+
+TIMESTAMP_HEADER = "X-A2A-Timestamp"
+SIGNATURE_HEADER = "X-A2A-Signature"
+
+def sign(token, timestamp, body):
+    """Signature header value of a notification body."""
+    digest = hmac.new(token.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+def verify(token, timestamp, body, signature):
+    """Check a notification's signature and that it isn't older than MAX_SIGNATURE_AGE."""
+    try:
+        if abs(time.time() - float(timestamp)) > MAX_SIGNATURE_AGE:
+            return False
+    except (TypeError, ValueError):
+        return False
+    return hmac.compare_digest(sign(token, timestamp, body), signature or "")
+
+def _should_retry(response):
+    return response.status_code == 429 or response.status_code >= 500
+
+def _deliver(config, event):
+    body = json.dumps(event).encode()
+    for attempt in range(PUSH_MAX_ATTEMPTS):
+        timestamp = str(time.time())
+        headers = {"Content-Type": "application/json", TIMESTAMP_HEADER: timestamp,
+                   SIGNATURE_HEADER: sign(config["token"], timestamp, body)}
+        try:
+            response = requests.post(config["url"], data=body, headers=headers, timeout=PUSH_TIMEOUT)
+            if not _should_retry(response):
+                if response.status_code >= 400:
+                    log_message(f"Push notification for task {event['id']} rejected: {response.status_code}", "Push")
+                return
+            error = f"HTTP {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+        if attempt + 1 < PUSH_MAX_ATTEMPTS:
+            time.sleep(PUSH_RETRY_DELAY * 2 ** attempt)
+    log_message(f"Giving up on push notification for task {event['id']} after {PUSH_MAX_ATTEMPTS} attempts: {error}", "Push")
+
+_workers = []
+_workers_lock = threading.Lock()
+
+def _work(deliveries):
+    while True:
+        config, event = deliveries.get()
+        try:
+            _deliver(config, event)
+        except Exception as e:
+            log_message(f"Push notification for task {event.get('id')} failed: {e}", "Push")
+
+def _worker_for(task_id):
+    with _workers_lock:
+        if not _workers:
+            for i in range(PUSH_WORKERS):
+                deliveries = queue.Queue()
+                threading.Thread(target=_work, args=(deliveries,), name=f"push-{i}", daemon=True).start()
+                _workers.append(deliveries)
+    return _workers[zlib.crc32(task_id.encode()) % len(_workers)]
+
+class TaskNotifier:
+    """Event sink of one task that POSTs every event to its callback, in order.
+
+    Has the put() of a queue, so it can take the place of the events queue of
+    a streamed task (see common/host.py).
+    """
+
+    def __init__(self, task_id, config):
+        self.task_id = task_id
+        self.config = config
+
+    def put(self, event):
+        _worker_for(self.task_id).put((self.config, dict(event, id=self.task_id)))
+
+def valid_config(config):
+    """Whether a pushNotification config from a task request can be used."""
+    return (isinstance(config, dict) and isinstance(config.get("url"), str)
+            and config["url"].startswith(("http://", "https://")) and bool(config.get("token")))
+
+class PushReceiver:
+    """Local HTTP endpoint collecting the push notifications of the tasks a client sent.
+
+    Waiting tasks cost a dict entry rather than an open connection, so one
+    receiver can follow thousands of tasks. Notifications that aren't signed
+    with the receiver's token, or are for tasks it doesn't expect, are refused.
+    """
+
+    def __init__(self, host=PUSH_RECEIVER_HOST, port=0, on_event=None):
+        self.host = host
+        self.port = port
+        self.on_event = on_event
+        self.token = secrets.token_hex(32)
+        self._expected = set()
+        self._final = {}
+        self._condition = threading.Condition()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/push"
+
+    def start(self):
+        """Start listening in a background thread. Returns self."""
+        from flask import Flask, request
+        from werkzeug.serving import make_server
+
+        app = Flask(__name__)
+
+        @app.post("/push")
+        def receive():
+            body = request.get_data()
+            if not verify(self.token, request.headers.get(TIMESTAMP_HEADER), body,
+                          request.headers.get(SIGNATURE_HEADER)):
+                return {"error": "Bad signature"}, 401
+            event = json.loads(body)
+            with self._condition:
+                if event.get("id") not in self._expected:
+                    return {"error": "Unknown task"}, 404
+                if event.get("final"):
+                    self._expected.discard(event["id"])
+                    self._final[event["id"]] = event
+                    self._condition.notify_all()
+            if self.on_event:
+                self.on_event(event)
+            return {"ok": True}
+
+        self._server = make_server(self.host, self.port, app, threaded=True)
+        self.port = self._server.server_port
+        threading.Thread(target=self._server.serve_forever, name="push-receiver", daemon=True).start()
+        log_message(f"Receiving push notifications on {self.url}", "Push")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+    def expect(self, task_id):
+        """Register a task and return the pushNotification config to send it with."""
+        with self._condition:
+            self._expected.add(task_id)
+        return {"url": self.url, "token": self.token}
+
+    def wait(self, task_id, timeout=None):
+        """Wait for the final event of a task. Returns None on timeout."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: task_id in self._final, timeout):
+                self._expected.discard(task_id)
+                return None
+            return self._final.pop(task_id)
+
+_receiver = None
+_receiver_lock = threading.Lock()
+
+def receiver_for(card):
+    """Shared receiver of this client for an agent that supports push notifications.
+
+    None when PUSH_RECEIVER_PORT is unset or the agent card doesn't advertise
+    pushNotifications, in which case tasks are sent the blocking way.
+    """
+    global _receiver
+    if PUSH_RECEIVER_PORT is None or not (card or {}).get("capabilities", {}).get("pushNotifications"):
+        return None
+    with _receiver_lock:
+        if _receiver is None:
+            _receiver = PushReceiver(port=int(PUSH_RECEIVER_PORT)).start()
+        return _receiver
@@ -0,0 +1,222 @@
+import asyncio
+import os
+
+from common.utils import log_message, ensure_file_exists, describe_usage
+from common.context_pack import build_context_pack, context_pack_stats
+from common.search_index import register_search_tool, relevant_snippets
+from common.tasks import (parse_tasks, tasks_for_role, read_tasks_file, requested_tasks, pending_among,
+                          register_task_tool, register_emit_task_tool, compact_task_journal)
+from common.conversation import get_history, append_run, record_usage
+from common.prompts import system_prompt, task_prompt, assemble, log_prompt_size
+from common.models import model_for, run_stage, run_cascade
+from common.native_tools import toolset_for, register_native_tools
+from common.task_events import publish
+from common.snapshots import changes_summary
+
+# Every agent role the host can serve. A role is its A2A card, the port it
+# listens on when served on its own, the model stage it runs and the runner
+# that turns a task into a model run. System prompts live in common/prompts.py.
+ROLES = {
+    "planner": {
+        "agent_name": "PlannerAgent",
+        "description": "A project planning agent that creates detailed plans and tasks for web applications.",
+        "port": 5001,
+        "stage": "plan",
+        "runner": "plan",
+        "skills": ["planning"],
+    },
+    "frontend": {
+        "agent_name": "FrontendAgent",
+        "description": "A specialized frontend development agent that implements web application UI/UX.",
+        "port": 5002,
+        "stage": "implement",
+        "runner": "implement",
+        "skills": ["frontend", "infrastructure", "backend"],
+    },
+    "backend": {
+        "agent_name": "BackendAgent",
+        "description": "A specialized backend development agent that implements server-side functionality.",
+        "port": 5003,
+        "stage": "implement",
+        "runner": "implement",
+        "skills": ["backend", "infrastructure", "frontend"],
+    },
+}
+
+# Skills advertised on the agent cards. The tasks of each tasks.md section need
+# one (see task_skill); an agent takes tasks of its first skill and, when there
+# are none left, steals tasks needing its other skills, in order (see
+# common/worker_pool.py). Override per role with AGENT_SKILLS_<ROLE>=a,b,c.
+SKILL_DESCRIPTIONS = {
+    "planning": "Turns a project request into plan.md and a task list",
+    "frontend": "UI, pages, components and styling",
+    "backend": "Server, API, data and business logic",
+    "infrastructure": "Project setup, tooling, configuration and deployment",
+}
+
+# Task prompt of the planner, filled in with the request and project paths
+PLANNING_TEMPLATE = """Based on the following project request, create a detailed project plan and task list:
+
+USER REQUEST:
+{project_description}
+
+First, analyze the requirements thoroughly. Then:
+
+1. Emit the setup tasks that don't depend on the rest of the plan right away with
+   the emit_task tool and early=true (project scaffolding, dependency installation),
+   so the frontend and backend agents can start on them while you keep planning.
+
+2. Create or update {plan_file} with a comprehensive project plan including:
+   - Project overview
+   - Architecture design
+   - Technology stack
+   - Implementation approach
+   - Timeline/milestones
+
+3. Emit the remaining specific tasks one by one with the emit_task tool, giving
+   each one to the frontend or backend agent, or to infrastructure for setup,
+   tooling and deployment tasks either of them can take. The tool adds them to
+   {tasks_file} under its Frontend, Backend and Infrastructure Tasks sections with
+   a checkbox, do not write the task list into {tasks_file} yourself.
+
+The frontend and backend agents already know to run npm and Node.js commands from inside
+{project_path}, so there is no need to repeat those instructions in the tasks.
+
+Be thorough and detailed in your planning. Think about what would be needed for a complete implementation."""
+
+def role_skills(role):
+    """Skills of a role, most preferred first."""
+    configured = os.getenv(f"AGENT_SKILLS_{role.upper()}")
+    if configured:
+        return [skill.strip().lower() for skill in configured.split(",") if skill.strip()]
+    return ROLES[role]["skills"]
+
+def agent_card(role, url):
+    """Build the A2A agent card of a role served at the given base URL."""
+    spec = ROLES[role]
+    return {
+        "name": spec["agent_name"],
+        "description": spec["description"],
+        "url": url,  # base URL where this agent is hosted
+        "version": "1.0",
+        "capabilities": {
+            "streaming": True,  # tasks/sendSubscribe
+            "pushNotifications": True  # tasks/send with a pushNotification callback
+        },
+        "skills": [{"id": skill, "name": skill.capitalize(), "description": SKILL_DESCRIPTIONS.get(skill, "")}
+                   for skill in role_skills(role)],
+    }
+
+def build_agent(role, mcp_servers):
+    """Create the pydantic_ai agent of a role, using the given (shared) MCP servers."""
+    from pydantic_ai import Agent
+
+    spec = ROLES[role]
+    native = toolset_for(role) == "native"
+    agent = Agent(
+        model=model_for(role, spec["stage"]),
+        system_prompt=system_prompt(role),
+        deps_type=str,  # the project path
+        mcp_servers=[] if native else mcp_servers
+    )
+    if native:
+        register_native_tools(agent)
+    if spec["runner"] == "implement":
+        register_search_tool(agent)
+        register_task_tool(agent, role, role_skills(role))
+    else:
+        # New tasks are streamed to the task's subscribers as they are emitted
+        register_emit_task_tool(agent, lambda project_path, event: publish("task", event))
+    return agent
+
+def parse_task_text(role, user_text, project=None):
+    """Return (project_path, task text) from a task message.
+
+    The project comes from the task metadata. Older clients only name it in
+    a PROJECT_PATH line of the message, which is used as a fallback. The
+    project path is None if neither is given.
+    """
+    agent_name = ROLES[role]["agent_name"]
+    project_path = project
+    if not project_path and "PROJECT_PATH:" in user_text:
+        try:
+            path_line = [line for line in user_text.split('\n') if "PROJECT_PATH:" in line][0]
+            project_path = path_line.split("PROJECT_PATH:", 1)[1].strip()
+        except Exception as e:
+            log_message(f"Error parsing project path: {str(e)}", agent_name)
+    if project_path:
+        project_path = os.path.realpath(os.path.expanduser(project_path))
+        log_message(f"Using project path: {project_path}", agent_name)
+
+    if ROLES[role]["runner"] == "plan":
+        # Format expected: "PROJECT_PATH: /path/to/project\n\nPROJECT_DESCRIPTION: Project description"
+        if "PROJECT_DESCRIPTION:" in user_text:
+            return project_path, user_text.split("PROJECT_DESCRIPTION:", 1)[1].strip()
+        return project_path, user_text
+    # The PROJECT_PATH line is re-added by task_prompt, the static rules live in the system prompt
+    return project_path, "\n".join(line for line in user_text.split('\n') if "PROJECT_PATH:" not in line)
+
+async def run_plan(role, agent, project_path, project_description, budget=None):
+    """Run the planner on one project request and return the run result."""
+    plan_file = os.path.join(project_path, "plan.md")
+    tasks_file = os.path.join(project_path, "tasks.md")
+
+    ensure_file_exists(plan_file, "# Project Plan\n\n")
+    ensure_file_exists(tasks_file, "# Project Tasks\n\n")
+
+    prompt = assemble(PLANNING_TEMPLATE.format(project_description=project_description, plan_file=plan_file,
+                                               tasks_file=tasks_file, project_path=project_path))
+    log_prompt_size("Planning", prompt, ROLES[role]["agent_name"])
+    return await run_stage(agent, role, ROLES[role]["stage"], prompt, budget=budget, deps=project_path)
+
+def _prepare_implementation(role, project_path, task_text):
+    agent_name = ROLES[role]["agent_name"]
+    # Digest of plan.md/tasks.md so the agent doesn't spend tool calls re-reading them
+    context_pack = build_context_pack(project_path, role)
+    log_message(f"Context pack ready ({context_pack_stats(context_pack)})", agent_name)
+
+    # Attach the files most relevant to the pending tasks from the local search index
+    pending = [task["text"] for task in tasks_for_role(parse_tasks(read_tasks_file(project_path)), role) if not task["done"]]
+    snippets = relevant_snippets(project_path, "\n".join(pending) or task_text)
+    # What the last task and anyone after it changed, so the agent doesn't rediscover the tree
+    changes = changes_summary(project_path, role)
+
+    # Snippets and changes are passed through as they are, their repeated lines are source
+    prompt = task_prompt(project_path, task_text, context_pack,
+                         verbatim=[f"### Relevant existing code\n{snippets}" if snippets else "", changes])
+    log_prompt_size("Task", prompt, agent_name)
+    # Continue the conversation from earlier tasks in this project instead of starting cold
+    return prompt, get_history(project_path, role)
+
+def _finish_implementation(role, project_path, new_messages):
+    append_run(project_path, role, new_messages)
+    # Fold this task's checkbox updates into tasks.md in one atomic write
+    compact_task_journal(project_path)
+
+async def run_implementation(role, agent, project_path, task_text, budget=None):
+    """Run a frontend/backend agent on one task and return the run result."""
+    agent_name = ROLES[role]["agent_name"]
+    # File and index work runs off the event loop, which all hosted roles share
+    prompt, history = await asyncio.to_thread(_prepare_implementation, role, project_path, task_text)
+
+    # A run only passes validation if every task it was given is checked off in tasks.md
+    requested = requested_tasks(task_text)
+
+    def validate(result):
+        remaining = pending_among(project_path, requested)
+        if remaining:
+            return f"{len(remaining)} of {len(requested)} assigned tasks are still unchecked in tasks.md"
+        return None
+
+    result, models_used = await run_cascade(agent, role, ROLES[role]["stage"], prompt, validate,
+                                            budget=budget, deps=project_path, message_history=history)
+    # all_messages() also covers the cheap attempt when the cascade escalated
+    await asyncio.to_thread(_finish_implementation, role, project_path, result.all_messages()[len(history):])
+    log_message(f"Task finished on {' -> '.join(models_used)}: {describe_usage(result.usage())}", agent_name)
+    log_message(f"Prompt cache: {record_usage(project_path, role, result.usage())}", agent_name)
+    return result
+
+RUNNERS = {
+    "plan": run_plan,
+    "implement": run_implementation,
+}
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+
+# Lives next to the other per-project state so every client and server
+# working on the project shares it
+JOURNAL_DB_NAME = "runs.sqlite"
+
+# Desktop Commander / native tools that modify files, and the argument holding the path
+WRITE_TOOLS = {
+    "write_file": "path",
+    "edit_block": "file_path",
+    "create_directory": "path",
+    "move_file": "destination",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    role TEXT NOT NULL,
+    status TEXT NOT NULL,
+    items TEXT NOT NULL DEFAULT '[]',
+    prompt TEXT,
+    prompt_hash TEXT,
+    result TEXT,
+    requests INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    changed_files TEXT NOT NULL DEFAULT '[]',
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_role_status ON tasks (role, status);
+"""
+
+# Task states, following the A2A task lifecycle
+DISPATCHED = "submitted"
+WORKING = "working"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELED = "canceled"  # stopped at its deadline or budget
+UNFINISHED = (DISPATCHED, WORKING)
+
+class RunJournal:
+    """Durable record of every A2A task dispatched for a project.
+
+    Clients record what they dispatched (and which checklist items it
+    covers) before sending it, servers record the result, token spend and
+    changed files when they finish. After a crash, clients resend
+    unfinished tasks with the same id and servers answer finished ones
+    from the journal instead of running the model again.
+    """
+
+    def __init__(self, project_path):
+        self.db_file = os.path.join(project_path, ".a2a", JOURNAL_DB_NAME)
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _upsert(self, task_id, role, status, prompt=None, items=None):
+        now = time.time()
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16] if prompt else None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO tasks (task_id, role, status, items, prompt, prompt_hash, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(task_id) DO UPDATE SET status = excluded.status, updated = excluded.updated",
+                (task_id, role, status, json.dumps(items or []), prompt, prompt_hash, now, now),
+            )
+
+    def record_dispatch(self, task_id, role, items, prompt):
+        """Record a task a client is about to send, with the checklist items it covers."""
+        self._upsert(task_id, role, DISPATCHED, prompt, items)
+
+    def mark_working(self, task_id, role, prompt=None):
+        """Record that a server started working on a task."""
+        self._upsert(task_id, role, WORKING, prompt)
+
+    def record_result(self, task_id, status, result=None, usage=None, changed_files=None):
+        """Record the outcome of a task, with its token spend and changed files if known."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = ?, result = COALESCE(?, result), "
+                "requests = requests + ?, input_tokens = input_tokens + ?, output_tokens = output_tokens + ?, "
+                "changed_files = CASE WHEN ? IS NULL THEN changed_files ELSE ? END, updated = ? "
+                "WHERE task_id = ?",
+                (
+                    status, result,
+                    usage.requests if usage else 0,
+                    (usage.request_tokens or 0) if usage else 0,
+                    (usage.response_tokens or 0) if usage else 0,
+                    None if changed_files is None else 1, json.dumps(sorted(changed_files or [])),
+                    time.time(), task_id,
+                ),
+            )
+
+    def get(self, task_id):
+        """Return a task record as a dict, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return _row_to_dict(row)
+
+    def unfinished(self, role):
+        """Return the oldest task for a role that was dispatched but never finished."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM tasks WHERE role = ? AND status IN (?, ?) ORDER BY created LIMIT 1",
+                (role, *UNFINISHED),
+            ).fetchone()
+        return _row_to_dict(row)
+
+    def in_flight(self, since):
+        """Return the unfinished tasks of every role updated at or after since (epoch seconds)."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM tasks WHERE status IN (?, ?) AND updated >= ? ORDER BY created",
+                (*UNFINISHED, since),
+            ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def tasks(self, role=None):
+        """Return all task records, optionally for one role, oldest first."""
+        with self._connect() as conn:
+            if role is None:
+                rows = conn.execute("SELECT * FROM tasks ORDER BY created").fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM tasks WHERE role = ? ORDER BY created", (role,)).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+def _row_to_dict(row):
+    if row is None:
+        return None
+    record = dict(row)
+    record["items"] = json.loads(record["items"])
+    record["changed_files"] = json.loads(record["changed_files"])
+    return record
+
+def changed_files_from_messages(messages, project_path=None):
+    """Collect the paths touched by file-writing tool calls in a run."""
+    changed = set()
+    for message in messages:
+        if not isinstance(message, ModelResponse):
+            continue
+        for part in message.parts:
+            if not isinstance(part, ToolCallPart) or part.tool_name not in WRITE_TOOLS:
+                continue
+            path = part.args_as_dict().get(WRITE_TOOLS[part.tool_name])
+            if not path:
+                continue
+            if project_path and os.path.isabs(path):
+                path = os.path.relpath(path, project_path)
+            changed.add(path)
+    return changed
+
+# Tasks currently running in this server process. A resent task id (from a
+# restarted client) waits for the running copy instead of starting another.
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+def claim_task(task_id):
+    """Claim a task id for this process.
+
+    Returns (True, event) if the caller should run the task and set the
+    event when done, or (False, event) if it is already running here.
+    """
+    with _in_flight_lock:
+        if task_id in _in_flight:
+            return False, _in_flight[task_id]
+        event = threading.Event()
+        _in_flight[task_id] = event
+        return True, event
+
+def release_task(task_id):
+    """Mark a claimed task as finished and wake up anyone waiting for it."""
+    with _in_flight_lock:
+        event = _in_flight.pop(task_id, None)
+    if event is not None:
+        event.set()
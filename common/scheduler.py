@@ -0,0 +1,107 @@
+import asyncio
+import os
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+# Task runs the host executes at once, over all projects and per project
+MAX_RUNNING_TASKS = int(os.getenv("HOST_MAX_RUNNING_TASKS", "8"))
+PROJECT_MAX_RUNNING_TASKS = int(os.getenv("PROJECT_MAX_RUNNING_TASKS", "2"))
+
+class ProjectScheduler:
+    """Fair scheduler for task runs across projects.
+
+    Every project has its own FIFO queue. Runs are started round-robin over
+    the projects with work waiting, within a global limit and a per-project
+    quota, so a project with a long backlog can't starve the others. Within a
+    project, two runs of the same lane (role) never overlap since they share
+    one conversation history. Must only be used from one event loop.
+    """
+
+    def __init__(self, max_running=MAX_RUNNING_TASKS, project_quota=PROJECT_MAX_RUNNING_TASKS):
+        self.max_running = max_running
+        self.project_quota = project_quota
+        self._queues = OrderedDict()  # project -> deque of (lane, future)
+        self._running = {}  # project -> set of lanes
+        self._total_running = 0
+
+    @asynccontextmanager
+    async def slot(self, project, lane):
+        """Wait for this project's turn, then hold a run slot for the block."""
+        future = asyncio.get_running_loop().create_future()
+        if project not in self._queues:
+            # Projects are kept least recently served first, a new one hasn't been served yet
+            self._queues[project] = deque()
+            self._queues.move_to_end(project, last=False)
+        self._queues[project].append((lane, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(project, lane)
+            else:
+                self._discard(project, future)
+            raise
+        try:
+            yield
+        finally:
+            self._release(project, lane)
+
+    def queued(self, project):
+        """Number of runs of a project waiting for a slot."""
+        return len(self._queues.get(project, ()))
+
+    def active_projects(self):
+        """Projects with runs running or waiting."""
+        return set(self._queues) | {project for project, lanes in self._running.items() if lanes}
+
+    def stats(self):
+        """Running and queued runs per project."""
+        return {
+            project: {"running": sorted(self._running.get(project, ())), "queued": self.queued(project)}
+            for project in sorted(self.active_projects())
+        }
+
+    def _dispatch(self):
+        progressed = True
+        while progressed and self._total_running < self.max_running:
+            progressed = False
+            for project in list(self._queues):
+                if self._total_running >= self.max_running:
+                    break
+                lanes = self._running.setdefault(project, set())
+                if len(lanes) >= self.project_quota:
+                    continue
+                queue = self._queues[project]
+                for lane, future in list(queue):
+                    if future.done():
+                        # Cancelled while waiting
+                        queue.remove((lane, future))
+                    elif lane not in lanes:
+                        queue.remove((lane, future))
+                        lanes.add(lane)
+                        self._total_running += 1
+                        future.set_result(None)
+                        # The next grant goes to the next project in line
+                        self._queues.move_to_end(project)
+                        progressed = True
+                        break
+                if not queue:
+                    del self._queues[project]
+
+    def _release(self, project, lane):
+        self._running[project].discard(lane)
+        if not self._running[project]:
+            del self._running[project]
+        self._total_running -= 1
+        self._dispatch()
+
+    def _discard(self, project, future):
+        queue = self._queues.get(project)
+        if queue is None:
+            return
+        for item in list(queue):
+            if item[1] is future:
+                queue.remove(item)
+        if not queue:
+            del self._queues[project]
@@ -0,0 +1,299 @@
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from common.context_pack import CACHE_DIR_NAME, IGNORED_DIRS
+
+# Files we never index (binaries, lockfiles, media)
+SKIPPED_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".ico", ".webp", ".bmp", ".svg", ".pdf", ".zip", ".gz", ".tar",
+    ".woff", ".woff2", ".ttf", ".eot", ".mp3", ".mp4", ".mov", ".so", ".dll", ".exe", ".pyc", ".db",
+    ".sqlite", ".lock", ".map",
+}
+SKIPPED_FILES = {"package-lock.json", "yarn.lock", "pnpm-lock.yaml"}
+MAX_FILE_BYTES = 512 * 1024
+
+# Chunking and ranking parameters
+CHUNK_LINES = 40
+BM25_K1 = 1.2
+BM25_B = 0.75
+DEFAULT_TOP_K = 5
+MAX_SNIPPET_LINES = 20
+
+# Don't walk the tree more often than this when several queries arrive together
+MIN_REFRESH_INTERVAL = 2.0
+# Writing the index to disk is the slow part on large trees, so batch it up
+MIN_SAVE_INTERVAL = 30.0
+
+INDEX_FILE_NAME = "search_index.json"
+INDEX_VERSION = 1
+
+TOKEN_PATTERN = re.compile(r'[A-Za-z][A-Za-z0-9]*|\d+')
+CAMEL_PATTERN = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+def tokenize(text):
+    """Split text into lowercase terms, also breaking camelCase and snake_case identifiers."""
+    terms = []
+    for word in TOKEN_PATTERN.findall(text):
+        lowered = word.lower()
+        terms.append(lowered)
+        parts = CAMEL_PATTERN.findall(word)
+        if len(parts) > 1:
+            terms.extend(part.lower() for part in parts)
+    return terms
+
+def iter_project_files(project_path):
+    """Yield (relative path, stat result) for every indexable file in the project."""
+    stack = [project_path]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            name = entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if name not in IGNORED_DIRS and not name.startswith('.'):
+                        stack.append(entry.path)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                if name in SKIPPED_FILES or os.path.splitext(name)[1].lower() in SKIPPED_EXTENSIONS:
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if stat.st_size > MAX_FILE_BYTES:
+                continue
+            yield os.path.relpath(entry.path, project_path), stat
+
+class ProjectIndex:
+    """Incrementally updated BM25 index over the files of one project.
+
+    Files are split into fixed-size line chunks. Only files whose mtime or
+    size changed since the last refresh are re-read, and the postings are
+    persisted under .a2a/ so a restarted server doesn't re-tokenize
+    everything.
+    """
+
+    def __init__(self, project_path):
+        self.project_path = os.path.abspath(project_path)
+        self.index_file = os.path.join(self.project_path, CACHE_DIR_NAME, INDEX_FILE_NAME)
+        self.files = {}      # rel path -> {"mtime", "size", "chunks": [chunk ids], "terms": [terms]}
+        self.chunks = {}     # chunk id -> [rel path, start line, end line, length]
+        self.postings = {}   # term -> {chunk id: term frequency}
+        self.total_length = 0
+        self.next_chunk_id = 0
+        self.last_refresh = 0.0
+        self.last_save = time.monotonic()
+        self.dirty = False
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, 'r') as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_VERSION:
+                return
+            self.files = data["files"]
+            self.chunks = {int(k): v for k, v in data["chunks"].items()}
+            self.postings = {term: {int(k): tf for k, tf in docs.items()} for term, docs in data["postings"].items()}
+            self.total_length = sum(chunk[3] for chunk in self.chunks.values())
+            self.next_chunk_id = max(self.chunks, default=-1) + 1
+        except (OSError, ValueError, KeyError):
+            self.files, self.chunks, self.postings = {}, {}, {}
+            self.total_length, self.next_chunk_id = 0, 0
+
+    def _save(self):
+        data = {
+            "version": INDEX_VERSION,
+            "files": self.files,
+            "chunks": self.chunks,
+            "postings": self.postings,
+        }
+        tmp_file = self.index_file + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            with open(tmp_file, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_file, self.index_file)
+        except OSError:
+            pass
+
+    def _add_file(self, rel_path, stat):
+        try:
+            with open(os.path.join(self.project_path, rel_path), 'r', encoding='utf-8') as f:
+                lines = f.read().split('\n')
+        except (OSError, UnicodeDecodeError):
+            # Remember unreadable files too, so they aren't retried on every refresh
+            self.files[rel_path] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "chunks": [], "terms": []}
+            return
+        path_terms = tokenize(rel_path)
+        chunk_ids = []
+        file_terms = set()
+        for start in range(0, max(len(lines), 1), CHUNK_LINES):
+            block = lines[start:start + CHUNK_LINES]
+            terms = Counter(tokenize("\n".join(block)))
+            # The file path is part of every chunk so "auth routes" finds routes/auth.js
+            terms.update(path_terms)
+            length = sum(terms.values())
+            chunk_id = self.next_chunk_id
+            self.next_chunk_id += 1
+            self.chunks[chunk_id] = [rel_path, start + 1, start + len(block), length]
+            self.total_length += length
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[chunk_id] = tf
+            file_terms.update(terms)
+            chunk_ids.append(chunk_id)
+        self.files[rel_path] = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "chunks": chunk_ids,
+            # Kept so a changed file can be removed without scanning every posting list
+            "terms": sorted(file_terms),
+        }
+
+    def refresh(self, force=False):
+        """Re-index files whose mtime or size changed and drop deleted ones."""
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self.last_refresh < MIN_REFRESH_INTERVAL:
+                return 0
+            self.last_refresh = now
+            seen = set()
+            changed = []
+            for rel_path, stat in iter_project_files(self.project_path):
+                seen.add(rel_path)
+                known = self.files.get(rel_path)
+                if known is None or known["mtime"] != stat.st_mtime_ns or known["size"] != stat.st_size:
+                    changed.append((rel_path, stat))
+            deleted = [rel_path for rel_path in self.files if rel_path not in seen]
+            if changed or deleted:
+                self._remove_files(deleted + [rel_path for rel_path, _ in changed])
+                for rel_path, stat in changed:
+                    self._add_file(rel_path, stat)
+                self.dirty = True
+            # The first build is always persisted, later updates at most every MIN_SAVE_INTERVAL
+            if self.dirty and (not os.path.exists(self.index_file) or now - self.last_save >= MIN_SAVE_INTERVAL):
+                self._save()
+                self.dirty = False
+                self.last_save = now
+            return len(changed) + len(deleted)
+
+    def _remove_files(self, rel_paths):
+        """Drop every chunk of the given files from the postings."""
+        for rel_path in rel_paths:
+            entry = self.files.pop(rel_path, None)
+            if entry is None:
+                continue
+            dead = set()
+            for chunk_id in entry["chunks"]:
+                chunk = self.chunks.pop(chunk_id, None)
+                if chunk is not None:
+                    self.total_length -= chunk[3]
+                    dead.add(chunk_id)
+            for term in entry["terms"]:
+                docs = self.postings.get(term)
+                if docs is None:
+                    continue
+                for chunk_id in dead.intersection(docs):
+                    del docs[chunk_id]
+                if not docs:
+                    del self.postings[term]
+
+    def search(self, query, top_k=DEFAULT_TOP_K):
+        """Return the top_k chunks for the query ranked by BM25."""
+        self.refresh()
+        with self.lock:
+            chunk_count = len(self.chunks)
+            if not chunk_count:
+                return []
+            avg_length = self.total_length / chunk_count
+            scores = Counter()
+            for term in set(tokenize(query)):
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (chunk_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for chunk_id, tf in docs.items():
+                    length = self.chunks[chunk_id][3]
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[chunk_id] += idf * tf * (BM25_K1 + 1) / norm
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            return [
+                {"path": self.chunks[chunk_id][0], "start": self.chunks[chunk_id][1],
+                 "end": self.chunks[chunk_id][2], "score": round(score, 3)}
+                for chunk_id, score in best
+            ]
+
+    def snippet(self, result, max_lines=MAX_SNIPPET_LINES):
+        """Read the lines of a search result back from disk."""
+        try:
+            with open(os.path.join(self.project_path, result["path"]), 'r', encoding='utf-8') as f:
+                lines = f.read().split('\n')
+        except (OSError, UnicodeDecodeError):
+            return ""
+        block = lines[result["start"] - 1:result["end"]]
+        if len(block) > max_lines:
+            block = block[:max_lines] + ["..."]
+        return "\n".join(block)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(project_path):
+    """Return the shared index for a project, creating it on first use."""
+    key = os.path.abspath(project_path)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = ProjectIndex(key)
+        return _indexes[key]
+
+def format_search_results(index, results):
+    """Render search results as markdown snippets for a prompt or tool reply."""
+    blocks = []
+    for result in results:
+        blocks.append(f"--- {result['path']} (lines {result['start']}-{result['end']})\n{index.snippet(result)}")
+    return "\n\n".join(blocks)
+
+def relevant_snippets(project_path, query, top_k=DEFAULT_TOP_K, exclude=("plan.md", "tasks.md")):
+    """Return the top_k snippets relevant to a query, formatted for a prompt.
+
+    plan.md and tasks.md are excluded by default since the context pack
+    already summarizes them.
+    """
+    index = get_index(project_path)
+    results = [result for result in index.search(query, top_k + len(exclude)) if result["path"] not in exclude][:top_k]
+    if not results:
+        return ""
+    return format_search_results(index, results)
+
+def search_project(ctx, query: str, top_k: int = DEFAULT_TOP_K) -> str:
+    """Search the project files for code relevant to a query.
+
+    Much faster than listing directories and reading files one by one. Returns
+    the best matching file snippets with their paths and line numbers.
+
+    Args:
+        query: Keywords describing what you are looking for (e.g. "login form validation").
+        top_k: Maximum number of snippets to return.
+    """
+    index = get_index(ctx.deps)
+    results = index.search(query, top_k)
+    if not results:
+        return "No matching files found."
+    return format_search_results(index, results)
+
+def register_search_tool(agent):
+    """Expose search_project as a tool on an agent whose deps are the project path."""
+    agent.tool(search_project)
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from common.context_pack import CACHE_DIR_NAME
+from common.search_index import iter_project_files
+
+# Content snapshots of a project, taken before and after every task to know
+# what the task changed. A snapshot maps each project file (the ones the
+# search index sees) to a hash of its content. The latest one is kept in
+# .a2a/snapshot.json with the mtime and size of every file, so the next
+# snapshot only re-hashes files whose mtime or size changed.
+#
+# Each role also keeps in .a2a/snapshot-<role>.json the project as its last
+# task left it plus that task's change set, so its next prompt can say what
+# changed since then instead of the agent listing and re-reading the tree.
+# Tasks of different roles running at the same time on a project see each
+# other's changes in their change sets.
+MANIFEST_FILE_NAME = "snapshot.json"
+ROLE_FILE_NAME = "snapshot-{role}.json"
+
+# Files listed per kind of change in the prompt summary
+MAX_SUMMARY_FILES = 25
+
+CHANGE_KINDS = ("added", "modified", "deleted")
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+def _lock(project_path):
+    with _locks_guard:
+        return _locks.setdefault(project_path, threading.Lock())
+
+def _state_file(project_path, name):
+    return os.path.join(project_path, CACHE_DIR_NAME, name)
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp_file, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_file, path)
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def take_snapshot(project_path):
+    """Hash the project's files, reusing the manifest for unchanged ones. Returns {relative path: hash}."""
+    manifest_file = _state_file(project_path, MANIFEST_FILE_NAME)
+    with _lock(project_path):
+        previous = _read_json(manifest_file)
+        manifest = {}
+        for rel_path, stat in iter_project_files(project_path):
+            cached = previous.get(rel_path)
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                manifest[rel_path] = cached
+                continue
+            try:
+                manifest[rel_path] = [stat.st_mtime_ns, stat.st_size, _hash_file(os.path.join(project_path, rel_path))]
+            except OSError:
+                continue
+        if manifest != previous:
+            _write_json(manifest_file, manifest)
+    return {rel_path: entry[2] for rel_path, entry in manifest.items()}
+
+def diff_snapshots(before, after):
+    """Change set between two snapshots: {"added", "modified", "deleted"}, each a sorted list of paths."""
+    return {
+        "added": sorted(path for path in after if path not in before),
+        "modified": sorted(path for path in after if path in before and before[path] != after[path]),
+        "deleted": sorted(path for path in before if path not in after),
+    }
+
+def change_count(changes):
+    return sum(len(changes.get(kind, [])) for kind in CHANGE_KINDS)
+
+def record_task_changes(project_path, role, task_id, snapshot, changes):
+    """Remember the project as a role's task left it, and what the task changed."""
+    _write_json(_state_file(project_path, ROLE_FILE_NAME.format(role=role)),
+                {"task_id": task_id, "finished": time.time(), "files": snapshot, "changes": changes})
+
+def _describe(changes):
+    parts = []
+    for kind in CHANGE_KINDS:
+        paths = changes.get(kind, [])
+        if paths:
+            listed = ", ".join(paths[:MAX_SUMMARY_FILES])
+            if len(paths) > MAX_SUMMARY_FILES:
+                listed += f" and {len(paths) - MAX_SUMMARY_FILES} more"
+            parts.append(f"{kind}: {listed}")
+    return "; ".join(parts)
+
+def changes_summary(project_path, role):
+    """Prompt section on what the role's last task changed and what changed after it, or "".
+
+    Compares against the manifest, so take_snapshot must have run at the start of the task.
+    """
+    last = _read_json(_state_file(project_path, ROLE_FILE_NAME.format(role=role)))
+    if not last:
+        return ""
+    current = {rel_path: entry[2] for rel_path, entry in _read_json(_state_file(project_path, MANIFEST_FILE_NAME)).items()}
+    lines = []
+    if change_count(last["changes"]):
+        lines.append(f"- Your last task {_describe(last['changes'])}")
+    else:
+        lines.append("- Your last task changed no files")
+    since = diff_snapshots(last["files"], current)
+    if change_count(since):
+        lines.append(f"- Since then (other agents or by hand) {_describe(since)}")
+    return "### Changed since your last task\n" + "\n".join(lines)
@@ -0,0 +1,33 @@
+import threading
+
+from common.logs import current_log_context
+
+# Live events of running tasks, for clients subscribed through tasks/sendSubscribe.
+# Events are published from inside a task's run, whose log context carries
+# its task id (see common/logs.py), and go to that task's subscribers only;
+# queued tasks of the same project and role don't see them.
+_subscribers = {}
+_lock = threading.Lock()
+
+def subscribe(task_id, events):
+    """Send the events of a task's run to a queue until unsubscribed."""
+    with _lock:
+        _subscribers.setdefault(task_id, []).append(events)
+
+def unsubscribe(task_id, events):
+    with _lock:
+        subscribers = _subscribers.get(task_id, [])
+        subscribers[:] = [s for s in subscribers if s is not events]
+        if not subscribers:
+            _subscribers.pop(task_id, None)
+
+def publish(name, data, task_id=None):
+    """Publish structured data as an A2A artifact update to the subscribers of a task (the current one by default)."""
+    task_id = task_id or current_log_context().get("task_id")
+    with _lock:
+        subscribers = list(_subscribers.get(task_id, []))
+    for events in subscribers:
+        events.put({
+            "id": task_id,
+            "artifact": {"name": name, "parts": [{"type": "data", "data": data}], "append": True},
+        })
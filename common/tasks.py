@@ -0,0 +1,326 @@
+import asyncio
+import difflib
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Markdown patterns used by the planner when it writes tasks.md
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+TASK_PATTERN = re.compile(r'^(\s*)[-*] \[([ xX])\]\s?(.*)$')
+
+# Section headings that belong to each specialist agent
+ROLE_SECTION_PATTERNS = {
+    "frontend": re.compile(r'(?:Frontend|Front[- ]?end|UI|User Interface)', re.IGNORECASE),
+    "backend": re.compile(r'(?:Backend|Back[- ]?end|Server|API)', re.IGNORECASE),
+}
+
+# Skill a task needs, from its section: the role's own skill under a role
+# section, infrastructure for everything else (setup, tooling, deployment)
+INFRASTRUCTURE_SKILL = "infrastructure"
+
+# Status changes are appended to this journal and folded into tasks.md in batches
+STATE_DIR_NAME = ".a2a"
+JOURNAL_FILE_NAME = "tasks.journal"
+LOCK_FILE_NAME = "tasks.lock"
+COMPACT_EVERY = 20
+
+def _state_path(project_path, name):
+    return os.path.join(project_path, STATE_DIR_NAME, name)
+
+@contextmanager
+def task_lock(project_path):
+    """Hold the project's advisory tasks.md lock (shared by all agent processes)."""
+    lock_file = _state_path(project_path, LOCK_FILE_NAME)
+    os.makedirs(os.path.dirname(lock_file), exist_ok=True)
+    with open(lock_file, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _read_markdown(project_path):
+    tasks_file = os.path.join(project_path, 'tasks.md')
+    if not os.path.exists(tasks_file):
+        return ""
+    with open(tasks_file, 'r') as f:
+        return f.read()
+
+def _read_journal(project_path):
+    journal_file = _state_path(project_path, JOURNAL_FILE_NAME)
+    if not os.path.exists(journal_file):
+        return []
+    entries = []
+    with open(journal_file, 'r') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # A torn last line from a crashed writer, the earlier entries still count
+                continue
+    return entries
+
+def _apply_journal(content, entries):
+    """Apply journal entries (latest wins) to tasks.md content."""
+    if not entries:
+        return content
+    # (section, text) -> (position, done); entries without a section match the text under any heading
+    latest = {}
+    for position, entry in enumerate(entries):
+        latest[(entry.get("section"), entry["task"])] = (position, entry["done"])
+    lines = content.split('\n')
+    section = ""
+    for i, line in enumerate(lines):
+        heading = HEADING_PATTERN.match(line)
+        if heading:
+            section = heading.group(2).strip()
+            continue
+        match = TASK_PATTERN.match(line)
+        if not match:
+            continue
+        text = match.group(3).strip()
+        found = [state for state in (latest.get((section, text)), latest.get((None, text))) if state]
+        if not found:
+            continue
+        done = max(found)[1]
+        mark = "x" if done else " "
+        lines[i] = f"{match.group(1)}{line.lstrip()[0]} [{mark}] {match.group(3)}"
+    return "\n".join(lines)
+
+def read_tasks_file(project_path):
+    """Return the current content of tasks.md with pending journal entries applied.
+
+    Returns an empty string if tasks.md doesn't exist.
+    """
+    return _apply_journal(_read_markdown(project_path), _read_journal(project_path))
+
+def parse_tasks(content):
+    """Parse tasks.md content into a list of task dicts.
+
+    Each task records the heading it lives under, its text, whether it is
+    checked and the line number it was found on.
+    """
+    tasks = []
+    section = ""
+    for line_no, line in enumerate(content.split('\n')):
+        heading = HEADING_PATTERN.match(line)
+        if heading:
+            section = heading.group(2).strip()
+            continue
+        match = TASK_PATTERN.match(line)
+        if match:
+            tasks.append({
+                "section": section,
+                "text": match.group(3).strip(),
+                "done": match.group(2) in ("x", "X"),
+                "line": line_no,
+            })
+    return tasks
+
+def section_matches_role(section, role):
+    """Check whether a tasks.md heading belongs to the given role."""
+    pattern = ROLE_SECTION_PATTERNS.get(role)
+    if pattern is None:
+        return False
+    return bool(pattern.match(section))
+
+def tasks_for_role(tasks, role):
+    """Filter parsed tasks down to the ones under the role's sections."""
+    return [task for task in tasks if section_matches_role(task["section"], role)]
+
+def task_skill(section):
+    """Skill needed for the tasks under a tasks.md heading."""
+    for role in ROLE_SECTION_PATTERNS:
+        if section_matches_role(section, role):
+            return role
+    return INFRASTRUCTURE_SKILL
+
+def requested_tasks(text):
+    """Extract the task texts listed as bullets in a task message."""
+    requested = []
+    for line in text.split('\n'):
+        match = re.match(r'^\s*[-*]\s+(?:\[[ xX]\]\s*)?(.+)$', line)
+        if match:
+            requested.append(match.group(1).strip())
+    return requested
+
+def pending_among(project_path, texts):
+    """Return the subset of the given task texts that are still unchecked in tasks.md."""
+    pending = {task["text"] for task in parse_tasks(read_tasks_file(project_path)) if not task["done"]}
+    return [text for text in texts if text in pending]
+
+def find_task(tasks, text, section=None):
+    """Find a task by its text: exact match first, then case-insensitive, then a unique substring."""
+    candidates = [task for task in tasks if section is None or task["section"] == section]
+    wanted = text.strip()
+    for matches in (
+        [task for task in candidates if task["text"] == wanted],
+        [task for task in candidates if task["text"].lower() == wanted.lower()],
+        [task for task in candidates if wanted.lower() in task["text"].lower()],
+    ):
+        if len(matches) == 1:
+            return matches[0]
+        if len(matches) > 1 and matches[0]["text"] == wanted:
+            # The same text under several headings, only a section can tell them apart
+            return matches[0] if len({task["section"] for task in matches}) == 1 else None
+    return None
+
+def compact_task_journal(project_path):
+    """Fold the journal into tasks.md with an atomic rename and clear it."""
+    with task_lock(project_path):
+        _compact_locked(project_path)
+
+def _compact_locked(project_path):
+    entries = _read_journal(project_path)
+    if not entries:
+        return
+    tasks_file = os.path.join(project_path, 'tasks.md')
+    content = _apply_journal(_read_markdown(project_path), entries)
+    tmp_file = tasks_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, tasks_file)
+    # Entries are absolute states, so a crash before this point just re-applies them
+    open(_state_path(project_path, JOURNAL_FILE_NAME), 'w').close()
+
+def set_task_status(project_path, task, done=True, agent=None, section=None):
+    """Set one task's checkbox without rewriting tasks.md.
+
+    The change is appended to the status journal under the project lock;
+    the journal is compacted into tasks.md every COMPACT_EVERY entries.
+    Returns the matched task dict, or None if no task matches.
+    """
+    with task_lock(project_path):
+        tasks = parse_tasks(read_tasks_file(project_path))
+        match = find_task(tasks, task, section)
+        if match is None:
+            return None
+        entry = {"section": match["section"], "task": match["text"], "done": bool(done), "agent": agent, "ts": time.time()}
+        journal_file = _state_path(project_path, JOURNAL_FILE_NAME)
+        with open(journal_file, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+        if len(_read_journal(project_path)) >= COMPACT_EVERY:
+            _compact_locked(project_path)
+        return dict(match, done=bool(done))
+
+def append_task(project_path, section, text):
+    """Add an unchecked task at the end of a tasks.md section, creating the section if needed.
+
+    Returns False if the section already has a task with that text.
+    """
+    with task_lock(project_path):
+        # Fold pending status changes in first so the rewrite doesn't lose them
+        _compact_locked(project_path)
+        lines = _read_markdown(project_path).rstrip('\n').split('\n')
+        current = None
+        insert_at = None
+        for i, line in enumerate(lines):
+            heading = HEADING_PATTERN.match(line)
+            if heading:
+                current = heading.group(2).strip()
+                if current == section:
+                    insert_at = i + 1
+                continue
+            match = TASK_PATTERN.match(line)
+            if match and current == section:
+                if match.group(3).strip() == text.strip():
+                    return False
+                insert_at = i + 1
+        if insert_at is None:
+            lines += ["", f"## {section}", ""]
+            insert_at = len(lines)
+        lines.insert(insert_at, f"- [ ] {text.strip()}")
+        tasks_file = os.path.join(project_path, 'tasks.md')
+        tmp_file = tasks_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, tasks_file)
+        return True
+
+def register_emit_task_tool(agent, on_emit=None):
+    """Expose emit_task on the planner, whose deps are the project path.
+
+    on_emit(project_path, event) is called for every new task so it can be
+    streamed to the dispatcher while the planner is still writing.
+    """
+
+    # Async so on_emit runs in the context of the task's run (pydantic_ai runs sync tools
+    # in an executor, without it), where common/task_events.py finds the task id
+    async def emit_task(ctx, role: str, task: str, early: bool = False) -> str:
+        """Add one task to tasks.md under the Frontend, Backend or Infrastructure Tasks section.
+
+        Emit tasks one at a time as you plan them instead of writing tasks.md yourself.
+
+        Args:
+            role: "frontend" or "backend", the agent that will implement the task, or
+                "infrastructure" for setup, tooling and deployment tasks either agent can take.
+            task: A specific, actionable task description.
+            early: True for tasks that can start right away, before the rest of the
+                plan is written (project scaffolding, dependency installation).
+        """
+        role = role.strip().lower()
+        roles = [*ROLE_SECTION_PATTERNS, INFRASTRUCTURE_SKILL]
+        if role not in roles:
+            return f"Unknown role '{role}', use one of: {', '.join(roles)}"
+        section = f"{role.capitalize()} Tasks"
+        if not await asyncio.to_thread(append_task, ctx.deps, section, task):
+            return f"Task '{task}' is already in tasks.md."
+        if on_emit is not None:
+            on_emit(ctx.deps, {"role": role, "section": section, "task": task.strip(), "early": bool(early)})
+        return f"Task added to {section}."
+
+    agent.tool(emit_task)
+
+def register_task_tool(agent, role, skills):
+    """Expose update_task_status on an agent whose deps are the project path.
+
+    A task is looked up under the sections of the agent's skills, most
+    preferred first, and updated in the section it was found in, so a text
+    repeated under another role's heading is left alone.
+    """
+
+    def update_task_status(ctx, task: str, done: bool = True) -> str:
+        """Mark a task in tasks.md as completed (or not completed).
+
+        Always use this instead of editing the checkboxes in tasks.md yourself,
+        other agents are updating the same file at the same time.
+
+        Args:
+            task: The task text as it appears in tasks.md (without the checkbox).
+            done: True to mark it completed, False to mark it pending again.
+        """
+        tasks = parse_tasks(read_tasks_file(ctx.deps))
+        match = None
+        for skill in skills:
+            found = find_task([t for t in tasks if task_skill(t["section"]) == skill], task)
+            if found is not None:
+                match = set_task_status(ctx.deps, found["text"], done, agent=role, section=found["section"])
+                break
+        if match is None:
+            texts = [t["text"] for t in tasks if task_skill(t["section"]) in skills]
+            close = difflib.get_close_matches(task, texts, n=3, cutoff=0.4)
+            hint = f" Did you mean: {'; '.join(close)}" if close else ""
+            return f"No task matching '{task}' found in tasks.md.{hint}"
+        return f"Task '{match['text']}' marked as {'completed' if done else 'pending'}."
+
+    agent.tool(update_task_status)
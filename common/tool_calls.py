@@ -0,0 +1,203 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+import weakref
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+
+from common.utils import log_message
+from common.logs import log_event
+
+# The tool calls of one model turn run concurrently (pydantic_ai starts them
+# all at once). To keep that safe and make it pay off:
+#   - calls touching the same path are ordered by a lock per path, in the
+#     order the model asked for them, so a write never races another write
+#     or a read of the same file
+#   - with Desktop Commander, filesystem calls are spread over the MCP
+#     sessions of the project (see MCPSessionPool), since one stdio session
+#     answers its requests one at a time; commands and process tools stay on
+#     the first session, whose processes they refer to
+# Every model run logs the time its tools took against the wall time they spanned.
+
+# Most Desktop Commander sessions per project. A project starts with one and opens another
+# only when a filesystem call finds all of them busy. Each session is an npx/node process
+# (tens of MB) kept while the project's sessions are (up to HOST_MAX_PROJECT_SESSIONS
+# projects), so 1 keeps memory lowest and more speed up models that read many files at once.
+MCP_SESSIONS_PER_PROJECT = int(os.getenv("HOST_MCP_SESSIONS_PER_PROJECT", "3"))
+
+# Filesystem tools (Desktop Commander names, mirrored by common/native_tools.py)
+READ_TOOLS = {"read_file", "read_multiple_files", "list_directory", "search_files", "search_code", "get_file_info"}
+WRITE_TOOLS = {"write_file", "edit_block", "create_directory", "move_file"}
+
+# Arguments of the filesystem tools that name a path, or a list of paths
+PATH_ARGUMENTS = ("path", "file_path", "source", "destination", "paths")
+
+_path_locks = weakref.WeakValueDictionary()  # (loop, real path) -> asyncio.Lock
+_timer = contextvars.ContextVar("tool_timer", default=None)
+
+def call_paths(project_path, tool_name, arguments):
+    """Real paths a filesystem tool call touches, sorted; empty for other tools."""
+    if tool_name not in READ_TOOLS and tool_name not in WRITE_TOOLS:
+        return []
+    paths = set()
+    for name in PATH_ARGUMENTS:
+        value = arguments.get(name)
+        for path in (value if isinstance(value, list) else [value]):
+            if isinstance(path, str) and path:
+                path = os.path.expanduser(path)
+                paths.add(os.path.realpath(os.path.join(project_path or "", path)))
+    return sorted(paths)
+
+def _path_lock(path):
+    # Locks are bound to the event loop they are used on
+    key = (asyncio.get_running_loop(), path)
+    lock = _path_locks.get(key)
+    if lock is None:
+        lock = _path_locks[key] = asyncio.Lock()
+    return lock
+
+class ToolTimer:
+    """Start and end times of the tool calls of one model run."""
+
+    def __init__(self):
+        self.spans = []
+
+    def summary(self):
+        """{"tool_calls", "tool_ms", "wall_ms", "saved_ms"}: time spent in tools, the wall time
+        it spanned, and the difference that running them concurrently saved."""
+        busy = sum(end - start for start, end in self.spans)
+        wall = 0.0
+        covered = None
+        for start, end in sorted(self.spans):
+            if covered is None or start > covered:
+                wall += end - start
+                covered = end
+            elif end > covered:
+                wall += end - covered
+                covered = end
+        return {"tool_calls": len(self.spans), "tool_ms": round(busy * 1000), "wall_ms": round(wall * 1000),
+                "saved_ms": round((busy - wall) * 1000)}
+
+@contextmanager
+def timed_tools(role):
+    """Time the tool calls made inside the block (one model run) and log the summary."""
+    timer = ToolTimer()
+    token = _timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _timer.reset(token)
+        if timer.spans:
+            summary = timer.summary()
+            log_message(f"Tools: {summary['tool_calls']} call(s), {summary['tool_ms'] / 1000:.1f}s of tool time in "
+                        f"{summary['wall_ms'] / 1000:.1f}s ({summary['saved_ms'] / 1000:.1f}s saved by running them "
+                        f"concurrently)", role, event="tools", **summary)
+
+def log_tool_calls(messages):
+    """Emit a (sampled) tool_call event for every tool call the model made in a run. Returns how many."""
+    count = 0
+    for message in messages:
+        if not isinstance(message, ModelResponse):
+            continue
+        for part in message.parts:
+            if isinstance(part, ToolCallPart):
+                log_event("tool_call", f"Tool call {part.tool_name}", tool=part.tool_name)
+                count += 1
+    return count
+
+@asynccontextmanager
+async def tool_call(project_path, tool_name, arguments):
+    """Hold the path locks a tool call needs and time it for the current run."""
+    async with AsyncExitStack() as stack:
+        # Always in sorted order, so calls sharing several paths can't deadlock
+        for path in call_paths(project_path, tool_name, arguments):
+            await stack.enter_async_context(_path_lock(path))
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            timer = _timer.get()
+            if timer is not None:
+                timer.spans.append((started, time.perf_counter()))
+
+def ordered_tool(tool):
+    """Wrap a native tool (ctx.deps being the project path) so its calls go through tool_call."""
+    @functools.wraps(tool)
+    async def run(ctx, **arguments):
+        async with tool_call(ctx.deps, tool.__name__, arguments):
+            return await tool(ctx, **arguments)
+    return run
+
+class MCPSessionPool:
+    """MCP sessions of one project, used by its agents as a single MCP server.
+
+    Starts with one session and opens more, up to limit, while filesystem
+    calls find all of them busy. Filesystem calls go to the least busy
+    session, everything else to the first one. The tool list is fetched once
+    from the first session, so a long command running there doesn't hold up
+    the other calls.
+    """
+
+    def __init__(self, project_path, make_server, limit):
+        self.project_path = project_path
+        self.make_server = make_server
+        self.limit = max(1, limit)
+        self.servers = [make_server()]
+        self.in_flight = [0]
+        self.is_running = False
+        self._tools = None
+        self._opening = 0
+        self._extra = []
+
+    async def __aenter__(self):
+        self._stack = AsyncExitStack()
+        await self._stack.enter_async_context(self.servers[0])
+        self._closing = asyncio.Event()
+        self.is_running = True
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.is_running = False
+        self._closing.set()
+        await asyncio.gather(*self._extra, return_exceptions=True)
+        await self._stack.aclose()
+
+    async def _extra_session(self):
+        # Each extra session is entered and left in a task of its own, as the MCP client requires
+        server = self.make_server()
+        opened = False
+        try:
+            async with server:
+                self._opening -= 1
+                opened = True
+                self.servers.append(server)
+                self.in_flight.append(0)
+                await self._closing.wait()
+        except Exception as e:
+            log_message(f"Extra Desktop Commander session for {self.project_path} failed: {e}", "AgentHost")
+        finally:
+            if not opened:
+                self._opening -= 1
+
+    async def list_tools(self):
+        if self._tools is None:
+            self._tools = await self.servers[0].list_tools()
+        return self._tools
+
+    async def call_tool(self, tool_name, arguments):
+        index = 0
+        if tool_name in READ_TOOLS or tool_name in WRITE_TOOLS:
+            index = min(range(len(self.servers)), key=lambda i: self.in_flight[i])
+            # Every session is busy: open another one for the calls that come next
+            if self.in_flight[index] and self.is_running and len(self.servers) + self._opening < self.limit:
+                self._opening += 1
+                self._extra.append(asyncio.create_task(self._extra_session()))
+        self.in_flight[index] += 1
+        try:
+            async with tool_call(self.project_path, tool_name, arguments):
+                return await self.servers[index].call_tool(tool_name, arguments)
+        finally:
+            self.in_flight[index] -= 1
@@ -1,9 +1,15 @@
+import json
 import requests
 import uuid
 import time
 import os
 import sys
-from datetime import datetime
+from urllib.parse import urljoin
+
+from common.logs import log
+
+# Characters of an agent's reply sent inline in the task status, the rest is fetched from the reply artifact
+REPLY_PREVIEW_CHARS = int(os.getenv("REPLY_PREVIEW_CHARS", "2000"))
 
 def get_agent_card(base_url):
     """Fetch the agent card from the specified server."""
@@ -18,13 +24,9 @@ def get_agent_card(base_url):
         print(f"Error: Could not connect to the agent at {base_url}.")
         return None
 
-def send_task_to_agent(base_url, task_prompt, task_id=None):
-    """Send a task to an agent and return the response."""
-    if task_id is None:
-        task_id = str(uuid.uuid4())
-    
+def _task_payload(task_prompt, task_id, project, budget):
     task_payload = {
-        "id": task_id,
+        "id": task_id or str(uuid.uuid4()),
         "message": {
             "role": "user",
             "parts": [
@@ -32,16 +34,50 @@ def send_task_to_agent(base_url, task_prompt, task_id=None):
             ]
         }
     }
+    task_payload["metadata"] = budget.metadata()
+    if project is not None:
+        task_payload["metadata"]["project"] = os.path.abspath(project)
+    return task_payload
+
+def send_task_to_agent(base_url, task_prompt, task_id=None, project=None, budget=None, receiver=None):
+    """Send a task to an agent and return the response.
+
+    The project path travels in the task metadata, agents serving several
+    projects queue and isolate work by it. So does the task's deadline and
+    token/tool-call budget (a TaskBudget, TASK_TIMEOUT etc. by default),
+    which the agent enforces; what the task used is charged to the budget.
+    With a PushReceiver (see common/push.py) the agent answers right away and
+    the result is awaited on the receiver instead of the open connection.
+    """
+    from common.budget import TaskBudget
+
+    if budget is None:
+        budget = TaskBudget.from_env()
+    task_payload = _task_payload(task_prompt, task_id, project, budget)
+    if receiver is not None:
+        task_payload["pushNotification"] = receiver.expect(task_payload["id"])
     
     try:
         tasks_send_url = f"{base_url}/tasks/send"
-        response = requests.post(tasks_send_url, json=task_payload, timeout=300)  # 5-minute timeout
+        response = requests.post(tasks_send_url, json=task_payload, timeout=budget.http_timeout())
         
         if response.status_code != 200:
             print(f"Task request failed: {response.status_code}, {response.text}")
             return None
         
-        return response.json()
+        task_response = resolve_artifacts(base_url, response.json())
+        if receiver is not None and task_response.get("status", {}).get("state") == "submitted":
+            event = receiver.wait(task_payload["id"], budget.http_timeout())
+            if event is None:
+                print(f"Error: No result pushed for task {task_payload['id']} before its deadline.")
+                return None
+            task_response = resolve_artifacts(base_url, {key: event[key] for key in ("id", "status", "artifacts", "metadata")
+                                                         if key in event})
+        budget.charge_metadata(task_response.get("metadata"))
+        if task_response.get("status", {}).get("state") == "canceled":
+            reason = status_text(task_response)
+            print(f"Task {task_payload['id']} was stopped by the agent. {reason}")
+        return task_response
     except requests.exceptions.ConnectionError:
         print(f"Error: Lost connection to the agent at {base_url}.")
         return None
@@ -49,28 +85,87 @@ def send_task_to_agent(base_url, task_prompt, task_id=None):
         print(f"Error: Request to the agent at {base_url} timed out.")
         return None
 
+def stream_task_to_agent(base_url, task_prompt, task_id=None, project=None, budget=None):
+    """Send a task with tasks/sendSubscribe and yield its events as they arrive.
+
+    The last event has "final": True and carries the task's status and reply.
+    Yields nothing if the agent can't be reached. Budgets work as in send_task_to_agent.
+    """
+    from common.budget import TaskBudget
+
+    if budget is None:
+        budget = TaskBudget.from_env()
+    task_payload = _task_payload(task_prompt, task_id, project, budget)
+    try:
+        with requests.post(f"{base_url}/tasks/sendSubscribe", json=task_payload, stream=True,
+                           timeout=(10, budget.http_timeout())) as response:
+            if response.status_code != 200:
+                print(f"Task request failed: {response.status_code}, {response.text}")
+                return
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data:"):
+                    event = json.loads(line[len("data:"):].strip())
+                    if event.get("final"):
+                        resolve_artifacts(base_url, event)
+                        budget.charge_metadata(event.get("metadata"))
+                    yield event
+    except requests.exceptions.ConnectionError:
+        print(f"Error: Lost connection to the agent at {base_url}.")
+    except requests.exceptions.Timeout:
+        print(f"Error: Request to the agent at {base_url} timed out.")
+
+def resolve_artifacts(base_url, task_response):
+    """Make the artifact URIs of a task response absolute, relative to the agent's base URL."""
+    for artifact in (task_response or {}).get("artifacts", []):
+        for part in artifact.get("parts", []):
+            if "file" in part and "uri" in part["file"]:
+                part["file"]["uri"] = urljoin(base_url.rstrip("/") + "/", part["file"]["uri"])
+    return task_response
+
+def fetch_artifact(task_response, name):
+    """Download an artifact of a task response by name. Returns its text, or None."""
+    for artifact in (task_response or {}).get("artifacts", []):
+        if artifact.get("name") != name:
+            continue
+        for part in artifact.get("parts", []):
+            if "text" in part:
+                return part["text"]
+            if "file" in part:
+                try:
+                    response = requests.get(part["file"]["uri"], timeout=30)
+                except requests.exceptions.RequestException as e:
+                    print(f"Error: Could not fetch artifact {name}: {e}")
+                    return None
+                if response.status_code == 200:
+                    return response.text
+                print(f"Failed to fetch artifact {name}: {response.status_code}")
+    return None
+
+def status_text(task_response):
+    """Text of the status message of a task response (for long replies, only its start)."""
+    message = (task_response or {}).get("status", {}).get("message") or {}
+    return "".join(part.get("text", "") for part in message.get("parts", []))
+
 def extract_agent_reply(task_response):
-    """Extract the text reply from an agent's task response."""
+    """Extract the text reply from an agent's task response.
+
+    Fetches the reply artifact when the status only carries the start of it.
+    """
     if not task_response:
         return None
-        
+
     if task_response.get("status", {}).get("state") == "completed":
-        messages = task_response.get("messages", [])
-        if messages:
-            agent_message = messages[-1]  # last message (from agent)
-            # Extract text from the agent's message parts
-            agent_reply_text = "".join(part.get("text", "") for part in agent_message.get("parts", []))
-            return agent_reply_text
-    
+        reply = status_text(task_response)
+        for artifact in task_response.get("artifacts", []):
+            if artifact.get("name") == "reply" and artifact.get("metadata", {}).get("size", 0) > len(reply.encode('utf-8')):
+                return fetch_artifact(task_response, "reply")
+        return reply
+
     return None
 
-def log_message(message, agent_name=None):
-    """Log a message with timestamp and agent name."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    prefix = f"[{timestamp}]"
-    if agent_name:
-        prefix += f" [{agent_name}]"
-    print(f"{prefix} {message}")
+def log_message(message, agent_name=None, **fields):
+    """Log a message with timestamp and agent name, plus any structured fields (see common/logs.py)."""
+    log(message, agent_name, **fields)
 
 def ensure_file_exists(filepath, default_content=""):
     """Ensure a file exists, creating it with default content if it doesn't."""
@@ -80,3 +175,34 @@ def ensure_file_exists(filepath, default_content=""):
             os.makedirs(directory)
         with open(filepath, 'w') as f:
             f.write(default_content)
+
+def estimate_tokens(text):
+    """Roughly estimate the number of tokens in a piece of text (~4 chars per token)."""
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+def describe_usage(usage):
+    """Format a pydantic_ai Usage object for logging."""
+    details = usage.details or {}
+    return (f"{usage.requests} model requests, {usage.request_tokens or 0} input tokens "
+            f"({details.get('cached_tokens', 0)} cached), {usage.response_tokens or 0} output tokens")
+
+def make_task_response(task_id, response_text, state="completed", metadata=None, artifacts=None):
+    """Build an A2A task response with (the start of) the agent's reply.
+
+    The task prompt isn't echoed back. Long replies and other results travel
+    as artifact references (see common/artifacts.py).
+    """
+    response = {
+        "id": task_id,
+        "status": {
+            "state": state,
+            "message": {"role": "agent", "parts": [{"type": "text", "text": response_text[:REPLY_PREVIEW_CHARS]}]},
+        },
+    }
+    if artifacts:
+        response["artifacts"] = artifacts
+    if metadata:
+        response["metadata"] = metadata
+    return response
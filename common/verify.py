@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import signal
+import threading
+
+from common.utils import log_message
+from common.context_pack import CACHE_DIR_NAME
+from common.search_index import iter_project_files
+from common.tasks import append_task, parse_tasks, read_tasks_file
+from common.native_tools import load_policy
+
+# Build-and-test stage run on the project after every implementation batch.
+# Each package (a directory with a package.json, or a Python project) gets
+# its checks run in a sandboxed subprocess; a check is only re-run when the
+# content of its inputs changed. Failures are added to tasks.md as fix tasks
+# for the role, so the next batch repairs them.
+VERIFY_ENABLED = os.getenv("VERIFY", "0").lower() in ("1", "true", "yes")
+
+# package.json scripts run as checks, in order, when the package defines them
+VERIFY_SCRIPTS = [s.strip() for s in os.getenv("VERIFY_SCRIPTS", "lint,build,test").split(",") if s.strip()]
+
+# Checks running at once over all projects, and the wall-clock and CPU limits of each
+VERIFY_WORKERS = int(os.getenv("VERIFY_WORKERS", "2"))
+VERIFY_TIMEOUT = int(os.getenv("VERIFY_TIMEOUT", "300"))
+VERIFY_CPU_SECONDS = int(os.getenv("VERIFY_CPU_SECONDS", "600"))
+
+# Directory names that tell which role a package belongs to. Other packages
+# (e.g. one package.json at the project root) are verified for both roles.
+ROLE_DIR_NAMES = {
+    "frontend": {"frontend", "client", "web", "ui"},
+    "backend": {"backend", "server", "api"},
+}
+
+# "npm init" writes this test script, it always fails
+NPM_PLACEHOLDER_TEST = "no test specified"
+
+CACHE_FILE_NAME = "verify.json"
+LOG_DIR_NAME = "verify"
+MAX_CACHED_OUTPUT_CHARS = 4000
+MAX_ERROR_LINES = 3
+ERROR_PATTERN = re.compile(r'error|failed|fail\b|cannot|not found|exception', re.IGNORECASE)
+
+# Environment variables not passed to the checks
+SECRET_PATTERN = re.compile(r'KEY|TOKEN|SECRET|PASSWORD|CREDENTIAL', re.IGNORECASE)
+
+_file_digests = {}  # absolute path -> (mtime_ns, size, sha256)
+_cache_lock = threading.Lock()
+_package_locks = {}
+_slots = {}
+
+def find_packages(project_path, role):
+    """Relative directories of the project's packages that the role is responsible for."""
+    packages = set()
+    for rel_path, _ in iter_project_files(project_path):
+        name = os.path.basename(rel_path)
+        if name == "package.json" or name in ("pyproject.toml", "requirements.txt"):
+            packages.add(os.path.dirname(rel_path))
+    owned = []
+    for package in sorted(packages):
+        parts = set(package.lower().split(os.sep)) if package else set()
+        owners = [r for r, names in ROLE_DIR_NAMES.items() if parts & names]
+        if not owners or role in owners:
+            owned.append(package)
+    return owned
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def package_checks(project_path, package):
+    """Checks of one package: [{"name", "command", "inputs"}], inputs None meaning the whole package."""
+    directory = os.path.join(project_path, package)
+    checks = []
+    if os.path.exists(os.path.join(directory, "package.json")):
+        scripts = _read_json(os.path.join(directory, "package.json")).get("scripts") or {}
+        checks.append({"name": "install", "command": "npm install --no-audit --no-fund",
+                       "inputs": ["package.json", "package-lock.json"]})
+        for script in VERIFY_SCRIPTS:
+            if script not in scripts or (script == "test" and NPM_PLACEHOLDER_TEST in scripts[script]):
+                continue
+            checks.append({"name": script, "command": f"npm run {script}", "inputs": None})
+    else:
+        checks.append({"name": "compile", "command": "python -m compileall -q .", "inputs": None})
+        if any(name.startswith("test") for name in os.listdir(directory)):
+            checks.append({"name": "test", "command": "python -m pytest -q", "inputs": None})
+    return checks
+
+def _file_digest(path, stat):
+    cached = _file_digests.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _file_digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+def content_digest(project_path, package, inputs=None):
+    """Hash of the content of a package's files (or only of the given input files)."""
+    directory = os.path.join(project_path, package)
+    digest = hashlib.sha256()
+    if inputs is None:
+        files = sorted(iter_project_files(directory))
+    else:
+        files = [(name, os.stat(os.path.join(directory, name))) for name in inputs
+                 if os.path.exists(os.path.join(directory, name))]
+    for rel_path, stat in files:
+        try:
+            digest.update(f"{rel_path}\0{_file_digest(os.path.join(directory, rel_path), stat)}\n".encode())
+        except OSError:
+            continue
+    return digest.hexdigest()
+
+def _cache_file(project_path):
+    return os.path.join(project_path, CACHE_DIR_NAME, CACHE_FILE_NAME)
+
+def _load_cache(project_path):
+    with _cache_lock:
+        return _read_json(_cache_file(project_path))
+
+def _store_result(project_path, key, result):
+    with _cache_lock:
+        cache = _read_json(_cache_file(project_path))
+        cache[key] = result
+        os.makedirs(os.path.dirname(_cache_file(project_path)), exist_ok=True)
+        tmp_file = _cache_file(project_path) + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, _cache_file(project_path))
+
+def _sandbox_env():
+    env = {name: value for name, value in os.environ.items() if not SECRET_PATTERN.search(name)}
+    env.update({"CI": "1", "FORCE_COLOR": "0", "NO_COLOR": "1"})
+    return env
+
+def _slot():
+    # Semaphores are bound to the event loop they are used on
+    loop = asyncio.get_running_loop()
+    if loop not in _slots:
+        _slots[loop] = asyncio.Semaphore(VERIFY_WORKERS)
+    return _slots[loop]
+
+def _package_lock(project_path, package):
+    # Packages shared by both roles are verified once, the other role then hits the cache
+    loop = asyncio.get_running_loop()
+    key = (loop, project_path, package)
+    if key not in _package_locks:
+        _package_locks[key] = asyncio.Lock()
+    return _package_locks[key]
+
+async def run_check(directory, command, timeout=VERIFY_TIMEOUT):
+    """Run a check command in its own process group without the secrets of this process.
+
+    Returns (exit code, output); the exit code is None if it timed out.
+    """
+    async with _slot():
+        process = await asyncio.create_subprocess_exec(
+            load_policy()["shell"], "-c", f"ulimit -t {VERIFY_CPU_SECONDS} -c 0 2>/dev/null; {command}",
+            cwd=directory, env=_sandbox_env(), stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, start_new_session=True,
+        )
+        try:
+            output, _ = await asyncio.wait_for(process.communicate(), timeout)
+            return process.returncode, output.decode('utf-8', errors='replace')
+        except asyncio.TimeoutError:
+            return None, f"Timed out after {timeout}s"
+        finally:
+            if process.returncode is None:
+                # Also stops whatever the command started (dev servers, watchers)
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+
+def error_excerpt(output):
+    """The first few lines of a check's output that look like errors."""
+    # npm echoes each script it runs as "> command", which isn't output of the check
+    lines = [line.strip() for line in output.splitlines() if line.strip() and not line.startswith(">")]
+    errors = [line for line in lines if ERROR_PATTERN.search(line)]
+    return errors[:MAX_ERROR_LINES] or lines[-MAX_ERROR_LINES:]
+
+def _write_log(project_path, package, name, output):
+    log_dir = os.path.join(project_path, CACHE_DIR_NAME, LOG_DIR_NAME)
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, f"{(package or 'root').replace(os.sep, '-')}-{name}.log")
+    with open(log_file, 'w') as f:
+        f.write(output)
+    return os.path.relpath(log_file, project_path)
+
+async def verify_package(project_path, role, package):
+    """Run the checks of one package, stopping at the first failure. Returns their results."""
+    results = []
+    async with _package_lock(project_path, package):
+        cache = await asyncio.to_thread(_load_cache, project_path)
+        for check in await asyncio.to_thread(package_checks, project_path, package):
+            key = f"{package or '.'}::{check['name']}"
+            digest = await asyncio.to_thread(content_digest, project_path, package, check["inputs"])
+            cached = cache.get(key)
+            if cached and cached["digest"] == digest:
+                result = dict(cached, cached=True)
+            else:
+                code, output = await run_check(os.path.join(project_path, package), check["command"])
+                if check["inputs"] is not None:
+                    # npm install writes package-lock.json, which is one of its own inputs
+                    digest = await asyncio.to_thread(content_digest, project_path, package, check["inputs"])
+                log_file = await asyncio.to_thread(_write_log, project_path, package, check["name"], output)
+                result = {"package": package or ".", "check": check["name"], "command": check["command"],
+                          "digest": digest, "ok": code == 0, "exit_code": code, "log": log_file,
+                          "errors": [] if code == 0 else error_excerpt(output),
+                          "output": output[-MAX_CACHED_OUTPUT_CHARS:]}
+                await asyncio.to_thread(_store_result, project_path, key, result)
+                result = dict(result, cached=False)
+            results.append(result)
+            if not result["ok"]:
+                break
+    return results
+
+def fix_task_text(result):
+    """tasks.md entry asking to fix a failed check, with its first error."""
+    error = result["errors"][0] if result["errors"] else f"exit code {result['exit_code']}"
+    return (f"Fix the failing `{result['command']}` in {result['package']}: {error[:200]} "
+            f"(full output in {result['log']})")
+
+def add_fix_tasks(project_path, role, results):
+    """Add a fix task for every failed check that doesn't have one pending yet. Returns how many were added."""
+    pending = [task["text"] for task in parse_tasks(read_tasks_file(project_path)) if not task["done"]]
+    added = 0
+    for result in results:
+        if result["ok"]:
+            continue
+        prefix = f"Fix the failing `{result['command']}` in {result['package']}:"
+        if any(text.startswith(prefix) for text in pending):
+            continue
+        if append_task(project_path, f"{role.capitalize()} Tasks", fix_task_text(result)):
+            added += 1
+    return added
+
+async def verify_project(project_path, role):
+    """Verify every package of a role concurrently and queue fix tasks for the failures.
+
+    Returns a report: {"passed", "failed", "cached", "fix_tasks", "checks"}.
+    """
+    packages = await asyncio.to_thread(find_packages, project_path, role)
+    per_package = await asyncio.gather(*(verify_package(project_path, role, package) for package in packages))
+    results = [result for package_results in per_package for result in package_results]
+    fix_tasks = await asyncio.to_thread(add_fix_tasks, project_path, role, results)
+    report = {
+        "passed": sum(result["ok"] for result in results),
+        "failed": sum(not result["ok"] for result in results),
+        "cached": sum(result["cached"] for result in results),
+        "fix_tasks": fix_tasks,
+        "checks": [{key: result[key] for key in ("package", "check", "ok", "cached", "errors", "log")} for result in results],
+    }
+    log_message(f"Verification: {report['passed']} passed, {report['failed']} failed, {report['cached']} cached, "
+                f"{fix_tasks} fix task(s) added", role, event="verification",
+                **{key: report[key] for key in ("passed", "failed", "cached", "fix_tasks")})
+    return report
@@ -0,0 +1,91 @@
+import os
+import time
+import uuid
+
+from common.utils import log_message
+from common.batching import plan_batch
+from common.run_journal import RunJournal
+from common.tasks import parse_tasks, read_tasks_file, task_lock, task_skill
+
+# The frontend and backend clients form a worker pool over tasks.md. Every
+# task needs the skill of its section (frontend, backend or infrastructure
+# for the sections of neither) and every agent advertises its skills on its
+# card, most preferred first. A worker takes the tasks of its first skill
+# and, once there are none left, steals the tasks needing its other skills,
+# so an idle agent helps a backlogged one and infrastructure tasks get done
+# by whichever agent is free. Workers claim a batch by recording its dispatch
+# in the run journal under the tasks.md lock; claimed tasks are skipped by
+# the others until the dispatch finishes.
+
+# A claim whose dispatch hasn't been updated for this long (a crashed client) is released
+CLAIM_TIMEOUT = float(os.getenv("WORK_CLAIM_TIMEOUT", "1800"))
+
+# Seconds an idle worker waits before looking again while others still hold its tasks. The wait
+# doubles every time nothing frees up, up to the maximum, and starts over once it claims a batch.
+CLAIM_POLL_SECONDS = float(os.getenv("WORK_CLAIM_POLL_SECONDS", "1"))
+CLAIM_POLL_MAX_SECONDS = float(os.getenv("WORK_CLAIM_POLL_MAX_SECONDS", "30"))
+
+def card_skills(card, role):
+    """Skill ids advertised on an agent card, most preferred first (the role itself for older cards)."""
+    skills = [skill["id"] for skill in (card or {}).get("skills", []) if skill.get("id")]
+    return skills or [role]
+
+def claimed_tasks(journal):
+    """Texts of the tasks covered by dispatches still in flight."""
+    return {item for record in journal.in_flight(time.time() - CLAIM_TIMEOUT) for item in record["items"]}
+
+def skill_queues(project_path):
+    """Pending tasks of tasks.md by the skill they need, each queue in file order."""
+    queues = {}
+    for task in parse_tasks(read_tasks_file(project_path)):
+        if not task["done"]:
+            queues.setdefault(task_skill(task["section"]), []).append(task)
+    return queues
+
+def claim_batch(project_path, role, skills, limit, make_prompt):
+    """Claim the next batch of tasks for a worker and record its dispatch.
+
+    The batch comes from the queue of the first skill with unclaimed tasks,
+    sized by limit (see common/batching.py). make_prompt(batch, skill)
+    builds the task message. Returns (task id, batch, prompt), or None if
+    there is nothing the worker can take right now.
+    """
+    journal = RunJournal(project_path)
+    with task_lock(project_path):
+        claimed = claimed_tasks(journal)
+        queues = skill_queues(project_path)
+        for skill in skills:
+            available = [task for task in queues.get(skill, []) if task["text"] not in claimed]
+            if not available:
+                continue
+            batch = plan_batch(available, limit)
+            task_id = str(uuid.uuid4())
+            prompt = make_prompt(batch, skill)
+            journal.record_dispatch(task_id, role, [task["text"] for task in batch], prompt)
+            break
+        else:
+            return None
+    if skill != skills[0]:
+        log_message(f"No {skills[0]} tasks left to take, took {len(batch)} {skill} task(s)", f"{role.capitalize()} Client",
+                    event="steal", skill=skill, tasks=len(batch))
+    return task_id, batch, prompt
+
+def pending_for_skills(project_path, skills):
+    """Number of unchecked tasks needing one of the skills, claimed or not."""
+    queues = skill_queues(project_path)
+    return sum(len(queues.get(skill, [])) for skill in skills)
+
+def wait_for_batch(project_path, role, skills, limit, make_prompt, agent_name):
+    """claim_batch that waits, backing off, while other workers hold the tasks left.
+
+    Returns None once no task the worker can take is pending.
+    """
+    wait = CLAIM_POLL_SECONDS
+    claim = claim_batch(project_path, role, skills, limit, make_prompt)
+    while claim is None and pending_for_skills(project_path, skills):
+        # Other agents hold the remaining tasks, they come back if those agents fail them
+        log_message(f"The remaining tasks are being worked on by other agents, waiting {wait:g}s...", agent_name)
+        time.sleep(wait)
+        wait = min(wait * 2, CLAIM_POLL_MAX_SECONDS)
+        claim = claim_batch(project_path, role, skills, limit, make_prompt)
+    return claim
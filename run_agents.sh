@@ -90,6 +90,9 @@ cleanup() {
     if [ ! -z "$BACKEND_PID" ]; then
         kill $BACKEND_PID 2>/dev/null
     fi
+    if [ ! -z "$HOST_PID" ]; then
+        kill $HOST_PID 2>/dev/null
+    fi
     exit 0
 }
 
@@ -111,20 +114,11 @@ case $choice in
         # Start all agents
         echo -e "${GREEN}Starting all agents...${NC}"
 
-        echo -e "${BLUE}Starting Planner Agent server...${NC}"
-        python agents/planner/server.py &
-        PLANNER_PID=$!
-        sleep 2
-
-        echo -e "${BLUE}Starting Frontend Agent server...${NC}"
-        python agents/frontend/server.py &
-        FRONTEND_PID=$!
-        sleep 2
-
-        echo -e "${BLUE}Starting Backend Agent server...${NC}"
-        python agents/backend/server.py &
-        BACKEND_PID=$!
-        sleep 2
+        # One host process serves the three roles on their usual ports
+        echo -e "${BLUE}Starting Planner, Frontend and Backend Agent servers...${NC}"
+        python agents/host.py --roles planner,frontend,backend &
+        HOST_PID=$!
+        sleep 4
 
         echo -e "${GREEN}All agent servers are running!${NC}"
         echo -e "${PURPLE}Now running Planner Agent client...${NC}"
@@ -207,15 +201,10 @@ case $choice in
         ;;
     5)
         # Start Frontend and Backend agents
-        echo -e "${BLUE}Starting Frontend Agent server...${NC}"
-        python agents/frontend/server.py &
-        FRONTEND_PID=$!
-        sleep 2
-
-        echo -e "${BLUE}Starting Backend Agent server...${NC}"
-        python agents/backend/server.py &
-        BACKEND_PID=$!
-        sleep 2
+        echo -e "${BLUE}Starting Frontend and Backend Agent servers...${NC}"
+        python agents/host.py --roles frontend,backend &
+        HOST_PID=$!
+        sleep 3
 
         # Ask for project path
         echo -e "${CYAN}Enter the path to your project (or leave empty to use the current directory):${NC}"
@@ -16,6 +16,7 @@ if not os.getenv("OPENAI_API_KEY"):
 
 from pydantic_ai.mcp import MCPServerStdio
 from pydantic_ai import Agent
+from common.models import model_for
 
 app = Flask(__name__)
 
@@ -26,7 +27,7 @@ desktop_commander = MCPServerStdio(
 )
 
 agent = Agent(
-    model="openai:gpt-4o-mini",
+    model=model_for("executor", "implement"),
     system_prompt="""You are a task execution agent that can create, read, and modify files.
     You have access to the Desktop Commander MCP which allows you to interact with the filesystem.
     When you complete tasks, you should mark them as done in the tasks.md file by changing "[ ]" to "[x]".
@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import host, native_tools
+from common.artifacts import store_artifact
+from common.run_journal import RunJournal
+
+def test_artifacts_are_served_only_for_journaled_projects_in_the_allowed_directories(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    allowed = tmp_path / "allowed"
+    monkeypatch.setattr(native_tools, "_policy", {"allowed": [os.path.realpath(allowed)], "blocked": [], "shell": "/bin/sh"})
+    served, unknown, outside = allowed / "served", allowed / "unknown", tmp_path / "outside"
+    for project in (served, unknown, outside):
+        project.mkdir(parents=True)
+        store_artifact(str(project), "task-1", "reply", "Done.")
+    RunJournal(str(served))
+    RunJournal(str(outside))
+
+    client = host.create_app(["backend"], "http://localhost").test_client()
+    def fetch(project):
+        return client.get("/backend/tasks/task-1/artifacts/reply", query_string={"project": str(project)})
+
+    response = fetch(served)
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == "Done."
+    assert fetch(unknown).status_code == 404
+    assert fetch(outside).status_code == 404
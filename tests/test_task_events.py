@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import FunctionModel
+
+from common import host
+from common.roles import build_agent
+
+def planner_model(messages, info):
+    """Emits one early task, then finishes."""
+    returned = [part for message in messages for part in message.parts if isinstance(part, ToolReturnPart)]
+    if not returned:
+        return ModelResponse(parts=[ToolCallPart("emit_task", {"role": "infrastructure", "task": "Init repo",
+                                                               "early": True})])
+    return ModelResponse(parts=[TextPart("Plan written.")])
+
+def test_streamed_planner_run_sends_emitted_tasks_before_final(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("TOOLSET_PLANNER", "native")
+    agent = build_agent("planner", [])
+
+    async def get_agent(role, project_path):
+        return agent
+    monkeypatch.setattr(host, "get_agent", get_agent)
+
+    client = host.create_app(["planner"], "http://localhost").test_client()
+    with agent.override(model=FunctionModel(planner_model)):
+        response = client.post("/planner/tasks/sendSubscribe", json={
+            "id": "plan-1",
+            "message": {"role": "user", "parts": [{"type": "text", "text": "PROJECT_DESCRIPTION: A todo app"}]},
+            "metadata": {"project": str(tmp_path)},
+        })
+        body = response.get_data(as_text=True)
+
+    events = [json.loads(line[len("data: "):]) for line in body.split("\n") if line.startswith("data: ")]
+    final = next(i for i, event in enumerate(events) if event.get("final"))
+    emitted = [i for i, event in enumerate(events) if event.get("artifact", {}).get("name") == "task"]
+    assert emitted and emitted[0] < final
+    assert events[emitted[0]]["id"] == "plan-1"
+    assert events[emitted[0]]["artifact"]["parts"][0]["data"]["task"] == "Init repo"
+    assert "- [ ] Init repo" in (tmp_path / "tasks.md").read_text()
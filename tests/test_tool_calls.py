@@ -0,0 +1,43 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.tool_calls import MCPSessionPool
+
+class FakeServer:
+    """Stands in for a Desktop Commander session, answering one call at a time."""
+
+    opened = 0
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        FakeServer.opened += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        FakeServer.opened -= 1
+
+    async def call_tool(self, tool_name, arguments):
+        async with self.lock:
+            await asyncio.sleep(0.05)
+            return arguments["path"]
+
+def test_session_pool_opens_extra_sessions_only_while_calls_queue_up(tmp_path):
+    async def run():
+        pool = MCPSessionPool(str(tmp_path), FakeServer, 3)
+        async with pool:
+            assert len(pool.servers) == 1
+            await pool.call_tool("read_file", {"path": "a"})
+            await asyncio.sleep(0)
+            assert len(pool.servers) == 1
+            await asyncio.gather(*(pool.call_tool("read_file", {"path": name}) for name in "abcdef"))
+            await asyncio.gather(*(pool.call_tool("read_file", {"path": name}) for name in "abcdef"))
+            assert len(pool.servers) == 3
+            assert FakeServer.opened == 3
+        assert FakeServer.opened == 0
+
+    asyncio.run(run())
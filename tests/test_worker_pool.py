@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import worker_pool
+
+def test_idle_worker_backs_off_until_it_claims_a_batch(monkeypatch):
+    claims = [None, None, None, ("task-1", [], "prompt")]
+    waits = []
+    monkeypatch.setattr(worker_pool, "claim_batch", lambda *args: claims.pop(0))
+    monkeypatch.setattr(worker_pool, "pending_for_skills", lambda project_path, skills: 1)
+    monkeypatch.setattr(worker_pool.time, "sleep", waits.append)
+    monkeypatch.setattr(worker_pool, "CLAIM_POLL_SECONDS", 1)
+    monkeypatch.setattr(worker_pool, "CLAIM_POLL_MAX_SECONDS", 3)
+
+    claim = worker_pool.wait_for_batch("/project", "backend", ["backend"], 4, None, "Backend Client")
+    assert claim == ("task-1", [], "prompt")
+    assert waits == [1, 2, 3]
+
+def test_worker_stops_waiting_when_nothing_is_pending(monkeypatch):
+    monkeypatch.setattr(worker_pool, "claim_batch", lambda *args: None)
+    monkeypatch.setattr(worker_pool, "pending_for_skills", lambda project_path, skills: 0)
+    assert worker_pool.wait_for_batch("/project", "backend", ["backend"], 4, None, "Backend Client") is None